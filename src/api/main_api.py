@@ -1,7 +1,87 @@
-from fastapi import FastAPI
-from api.routers import kpi_api, health_api
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from api.routers import kpi_api, health_api, metrics_api
+from services.model_cache import model_cache
+from services.offload import offloader
+from services.worker_state import worker_state
+from shared import metrics
 
-app = FastAPI(title="KPI Anomaly Detection")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    heartbeat = None
+    if worker_state.board is not None:
+        heartbeat = asyncio.create_task(worker_state.heartbeat())
+
+    # one inference pool per serving process, splitting the CPUs between them
+    serving_processes = worker_state.board.workers if worker_state.board else 1
+
+    # prefork workers inherit the models already warmed up by the parent
+    if model_cache.is_warm():
+        # no request has started a thread yet, the fork is safe right away
+        offloader.start(serving_processes)
+        yield
+    else:
+        # warm up in the background so /health and /health/ready answer while loading;
+        # the pool is forked from the loop afterwards so its processes share the models
+        loop = asyncio.get_running_loop()
+        warm_up = loop.run_in_executor(None, model_cache.warm_up)
+        start_pool = asyncio.create_task(
+            offloader.start_after(warm_up, serving_processes)
+        )
+        yield
+        await warm_up
+        start_pool.cancel()
+
+    if heartbeat is not None:
+        heartbeat.cancel()
+    offloader.shutdown()
+
+
+app = FastAPI(title="KPI Anomaly Detection", lifespan=lifespan)
 
 app.include_router(kpi_api.router)
 app.include_router(health_api.router)
+app.include_router(metrics_api.router)
+
+
+# health and metrics must answer even when the worker is saturated
+UNLIMITED_PREFIXES = ("/health", "/metrics")
+
+
+@app.middleware("http")
+async def limit_pending_requests(request: Request, call_next):
+    if request.url.path.startswith(UNLIMITED_PREFIXES):
+        return await call_next(request)
+
+    if not worker_state.try_acquire():
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "too many pending requests, retry later"},
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        worker_state.release()
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    if not metrics.is_enabled():
+        return await call_next(request)
+
+    started = time.perf_counter()
+    response = await call_next(request)
+    # label by route template so /kpi/detect/{kpi_name} is one series, not one per kpi
+    route = request.scope.get("route")
+    metrics.observe_request(
+        request.method,
+        getattr(route, "path", request.url.path),
+        response.status_code,
+        time.perf_counter() - started,
+    )
+    return response
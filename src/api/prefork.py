@@ -0,0 +1,159 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from api.main_api import app
+from logger.logger import get_logger
+from services.model_cache import model_cache
+from services.worker_state import WorkerBoard, worker_state
+
+log = get_logger()
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class PreforkServer:
+    """Serve the API from N forked workers sharing the parent's loaded models.
+
+    The parent warms every KPI model up once, freezes the heap so the garbage
+    collector does not touch (and copy) those pages in the children, binds the socket
+    and forks the workers. Model memory is then shared copy-on-write. Every worker
+    runs its own event loop on the shared socket and refuses requests with 429 once
+    `max_pending` are in flight; dead or hung workers are replaced.
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int | None = None,
+        max_pending: int = 8,
+        stale_after: float = 30.0,
+    ) -> None:
+        """
+        :param workers: number of worker processes, defaults to the CPU count.
+        :param max_pending: requests a worker accepts at once before answering 429.
+        :param stale_after: a worker whose heartbeat is older than this is restarted.
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("prefork serving needs os.fork (Linux/macOS)")
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.stale_after = stale_after
+        self.board = WorkerBoard(self.workers)
+        self._pids: dict[int, int] = {}
+        self._stopping = False
+
+    def _run_worker(self, slot: int, sock: socket.socket) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        worker_state.configure(
+            self.board, slot, self.max_pending, stale_after=self.stale_after
+        )
+        config = uvicorn.Config(app, log_config=None, access_log=False)
+        uvicorn.Server(config).run(sockets=[sock])
+
+    def _spawn(self, slot: int, sock: socket.socket) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(slot, sock)
+            except Exception:
+                log.exception(f"worker {slot} crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.board.reset(slot, pid)
+        self._pids[pid] = slot
+        log.info(f"worker {slot} started with pid {pid}")
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _supervise(self, sock: socket.socket) -> None:
+        while not self._stopping:
+            # replace workers that exited
+            while True:
+                try:
+                    pid, _ = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid = 0
+                if pid == 0:
+                    break
+                slot = self._pids.pop(pid, None)
+                if slot is not None and not self._stopping:
+                    log.warning(f"worker {slot} (pid {pid}) exited, restarting")
+                    self._spawn(slot, sock)
+
+            # kill workers whose event loop stopped beating, the loop above restarts them
+            for worker in self.board.snapshot(self.stale_after):
+                if not worker["healthy"] and worker["pid"] in self._pids:
+                    log.error(f"worker {worker['slot']} is not responding, killing it")
+                    os.kill(worker["pid"], signal.SIGKILL)
+            time.sleep(1)
+
+    def serve(self) -> None:
+        started = time.perf_counter()
+        model_cache.warm_up()
+        log.info(f"models loaded in {time.perf_counter() - started:.2f}s")
+
+        # move everything loaded so far out of the collector's reach; collections in
+        # the workers would otherwise write to (and copy) every shared page
+        gc.collect()
+        gc.freeze()
+
+        sock = _listen(self.host, self.port)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot, sock)
+        log.info(f"serving on {self.host}:{self.port} with {self.workers} workers")
+
+        try:
+            self._supervise(sock)
+        finally:
+            for pid in list(self._pids):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for pid in list(self._pids):
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+            sock.close()
+            log.info("all workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prefork KPI API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=8)
+    parser.add_argument("--stale-after", type=float, default=30.0)
+    args = parser.parse_args()
+
+    PreforkServer(
+        args.host, args.port, args.workers, args.max_pending, args.stale_after
+    ).serve()
+
+
+if __name__ == "__main__":
+    main()
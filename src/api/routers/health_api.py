@@ -1,8 +1,47 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from services.model_cache import model_cache
+from services.worker_state import worker_state
 
 router = APIRouter(prefix="/health", tags=["health"])
 
+# async handlers run on the event loop itself, so they answer even when the thread
+# pool and the inference processes are all busy
+
 
 @router.get("")
-def health_check():
+async def health_check():
     return {"status": "ok buddy"}
+
+
+@router.get("/ready")
+async def readiness_check():
+    """Ready once every KPI model has been warmed up and few enough failed to load.
+
+    503 while warming up, or with the failed KPIs and their errors when more of them
+    failed than KPI_READY_MAX_FAILED (a share, 0 by default) allows.
+    """
+    ready = model_cache.is_ready()
+    if ready:
+        status = "ready"
+    else:
+        status = "failed" if model_cache.is_warm() else "warming"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": status,
+            "failed": model_cache.failures(),
+            "kpis": model_cache.status(),
+        },
+    )
+
+
+@router.get("/workers")
+async def workers_check():
+    """State of every serving worker; 503 if any of them stopped beating."""
+    workers = worker_state.workers()
+    healthy = all(worker["healthy"] for worker in workers)
+    return JSONResponse(
+        status_code=200 if healthy else 503,
+        content={"status": "ok" if healthy else "degraded", "workers": workers},
+    )
@@ -1,29 +1,64 @@
 from pydantic import BaseModel
 from typing import List, Dict, Any
-from fastapi import APIRouter, Response, HTTPException
-from services.kpi_service import KPIService
-from services.exceptions import KPINotFoundError
+from fastapi import APIRouter, Header, Response, HTTPException
+from services.offload import offloader
+from services.exceptions import (
+    DeadlineExceededError,
+    InvalidKPIDataError,
+    KPINotFoundError,
+    RouteBusyError,
+)
 
 router = APIRouter(prefix="/kpi", tags=["kpi"])
-kpi_service = KPIService()
 
 
 class KPIData(BaseModel):
     data: List[Dict[str, Any]]
 
 
+def _http_error(e: Exception) -> HTTPException:
+    if isinstance(e, KPINotFoundError):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, InvalidKPIDataError):
+        return HTTPException(
+            status_code=422, detail={"message": str(e), "report": e.report}
+        )
+    if isinstance(e, RouteBusyError):
+        return HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": "1"}
+        )
+    return HTTPException(status_code=504, detail=str(e))
+
+
+# the model work runs in the offloader's process pool, the handlers only await it;
+# X-Request-Timeout (seconds) shortens the route's deadline for one request
 @router.post("/detect/{kpi_name}")
-def detect(kpi_name: str, payload: KPIData):
-    result = "detect_kpi"
+async def detect(
+    kpi_name: str,
+    payload: KPIData,
+    x_request_timeout: float | None = Header(default=None),
+):
+    try:
+        result = await offloader.detect(
+            kpi_name, payload.data, timeout=x_request_timeout
+        )
+    except (
+        KPINotFoundError,
+        InvalidKPIDataError,
+        RouteBusyError,
+        DeadlineExceededError,
+    ) as e:
+        raise _http_error(e)
     return {"result": result}
 
 
 @router.post("/train/{kpi_name}")
-def train(kpi_name: str):
+async def train(
+    kpi_name: str,
+    x_request_timeout: float | None = Header(default=None),
+):
     try:
-        kpi_service.run_train(kpi_name)
-        return Response(
-            content="train starts", status_code=200
-        )  # KPIService().run_train(kpi_name)
-    except KPINotFoundError as e:
-        return HTTPException(status_code=404, detail=str(e))
+        await offloader.train(kpi_name, timeout=x_request_timeout)
+        return Response(content="train starts", status_code=200)
+    except (KPINotFoundError, RouteBusyError, DeadlineExceededError) as e:
+        raise _http_error(e)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from shared.metrics import REGISTRY
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Iterable
+
+import joblib
+import pandas as pd
+
+from backtest.scoring import detection_scores, load_labels
+from data_sources.get_connector import get_connector
+from logger.logger import get_logger
+from models.base_model import BaseModel
+from models.get_model import get_model
+from shared.config_loader import get_config
+from shared.path_manager import PathManager
+from shared.split_data import expanding_windows, rolling_windows
+
+log = get_logger()
+
+
+def _measure(func, *args, **kwargs):
+    """Run `func` and return (result, wall seconds, peak traced MB)."""
+    already_tracing = tracemalloc.is_tracing()
+    if already_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+
+    return result, elapsed, peak / 2**20
+
+
+def _result_times(result: pd.DataFrame):
+    """Timestamps of a model's prediction frame, whatever the model calls them."""
+    for col in ("ds", "timestamp", "DATE_H"):
+        if col in result.columns:
+            return result[col]
+    return result.index
+
+
+def kpi_labels(kpi_name: str) -> pd.DataFrame | None:
+    """Labelled anomaly windows of a KPI, from `data.labels` in its config."""
+    labels_file = (get_config(kpi_name) or {}).get("data", {}).get("labels")
+    if not labels_file:
+        return None
+    return load_labels(PathManager().data_file(labels_file))
+
+
+def _model_key(model_factory: Callable, kpi_name: str):
+    """What the factory builds for a KPI, so fold caches follow model changes.
+
+    `get_model` builds whatever the KPI config names, so its model section (type and
+    params) is the key; any other factory is keyed by its qualified name.
+    """
+    if model_factory is get_model:
+        return (get_config(kpi_name) or {}).get("model", {})
+    return f"{model_factory.__module__}.{getattr(model_factory, '__qualname__', '')}"
+
+
+def _fold_cache_path(
+    cache_dir: Path,
+    kpi_name: str,
+    model_name: str,
+    model_key,
+    params: dict,
+    train: pd.DataFrame,
+    time_col: str,
+) -> Path:
+    times = train[time_col]
+    key = json.dumps(
+        {
+            "model": model_key,
+            "params": params,
+            "start": str(times.iloc[0]),
+            "end": str(times.iloc[-1]),
+            "rows": len(train),
+            "data": int(pd.util.hash_pandas_object(train, index=False).sum()),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return cache_dir / kpi_name / model_name / f"fold_{digest}.pkl"
+
+
+def _run_fold(task: dict) -> dict:
+    kpi_name = task["kpi_name"]
+    train: pd.DataFrame = task["train"]
+    test: pd.DataFrame = task["test"]
+    time_col = task["time_col"]
+
+    row = {
+        "kpi": kpi_name,
+        "model": task["model_name"],
+        "fold": task["fold"],
+        "train_start": train[time_col].iloc[0],
+        "train_end": train[time_col].iloc[-1],
+        "test_start": test[time_col].iloc[0],
+        "test_end": test[time_col].iloc[-1],
+        "train_rows": len(train),
+        "test_rows": len(test),
+    }
+
+    cache_path = None
+    if task["cache_dir"] is not None:
+        cache_path = _fold_cache_path(
+            task["cache_dir"],
+            kpi_name,
+            task["model_name"],
+            task["model_key"],
+            task["params"],
+            train,
+            time_col,
+        )
+
+    if cache_path is not None and cache_path.exists():
+        model: BaseModel = joblib.load(cache_path)
+        row.update(cached=True, fit_seconds=0.0, fit_peak_mb=0.0)
+    else:
+        model = task["model_factory"](kpi_name, **task["params"])
+        _, row["fit_seconds"], row["fit_peak_mb"] = _measure(model.fit, train)
+        row["cached"] = False
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            joblib.dump(model, cache_path)
+
+    result, row["predict_seconds"], row["predict_peak_mb"] = _measure(
+        model.predict, test
+    )
+    row["flagged"] = int((result["anomaly"] != 0).sum())
+    row.update(
+        detection_scores(_result_times(result), result["anomaly"], task["labels"])
+    )
+    return row
+
+
+def _folds(
+    data: pd.DataFrame,
+    train_size: pd.Timedelta,
+    test_size: pd.Timedelta,
+    step: pd.Timedelta | None,
+    expanding: bool,
+    time_col: str,
+) -> Iterable[tuple[pd.DataFrame, pd.DataFrame]]:
+    windows = expanding_windows if expanding else rolling_windows
+    return windows(data, train_size, test_size, step, split_col=time_col)
+
+
+def run_backtest(
+    kpi_names: list[str],
+    model_factory: Callable[..., BaseModel] = get_model,
+    train_size: pd.Timedelta = pd.Timedelta(days=90),
+    test_size: pd.Timedelta = pd.Timedelta(days=7),
+    step: pd.Timedelta | None = None,
+    expanding: bool = False,
+    time_col: str = "DATE_H",
+    model_params: dict | None = None,
+    data: dict[str, pd.DataFrame] | None = None,
+    labels: dict[str, pd.DataFrame] | None = None,
+    cache_dir: str | Path | bool | None = None,
+    max_workers: int | None = None,
+) -> pd.DataFrame:
+    """Rolling-origin backtest of a model over one or more KPIs.
+
+    Every fold of every KPI is an independent task, so folds and KPIs run together on a
+    process pool. Fitted models are cached per fold, keyed by the configured model, the
+    model parameters and a hash of the training window, so re-running a backtest only pays for prediction.
+
+    Args:
+        kpi_names (list[str]): KPIs to backtest.
+        model_factory (Callable): builds a fresh model, called as
+            `model_factory(kpi_name, **model_params)`. Defaults to `get_model`.
+        train_size (pd.Timedelta): train window length (initial length if expanding).
+        test_size (pd.Timedelta): test window length.
+        step (pd.Timedelta, optional): distance between fold cutoffs, defaults to `test_size`.
+        expanding (bool): grow the train window instead of rolling it.
+        time_col (str): timestamp column of the raw data.
+        model_params (dict, optional): keyword arguments for the model factory.
+        data (dict, optional): raw data per KPI; read with the KPI connector if missing.
+        labels (dict, optional): labelled anomaly windows per KPI; read from
+            `data.labels` in the KPI config if missing.
+        cache_dir (str | Path, optional): where fitted fold models are cached.
+            Defaults to `backtest/cache`; pass `False` to disable caching.
+        max_workers (int, optional): process pool size; 1 runs the folds inline.
+
+    Returns:
+        pd.DataFrame: one row per fold with timings, peak memory and detection scores.
+    """
+    model_params = model_params or {}
+    data = data or {}
+    labels = labels or {}
+    model_name = getattr(model_factory, "__name__", type(model_factory).__name__)
+
+    if cache_dir is None:
+        cache_dir = PathManager().get("backtest", "cache")
+    cache_dir = Path(cache_dir) if cache_dir else None
+
+    tasks = []
+    for kpi_name in kpi_names:
+        kpi_data = data.get(kpi_name)
+        if kpi_data is None:
+            kpi_data = get_connector(kpi_name).read(parse_dates=[time_col])
+        kpi_windows = labels[kpi_name] if kpi_name in labels else kpi_labels(kpi_name)
+        model_key = _model_key(model_factory, kpi_name)
+
+        for fold, (train, test) in enumerate(
+            _folds(kpi_data, train_size, test_size, step, expanding, time_col)
+        ):
+            tasks.append(
+                {
+                    "kpi_name": kpi_name,
+                    "model_name": model_name,
+                    "model_factory": model_factory,
+                    "model_key": model_key,
+                    "params": model_params,
+                    "fold": fold,
+                    "train": train,
+                    "test": test,
+                    "labels": kpi_windows,
+                    "time_col": time_col,
+                    "cache_dir": cache_dir,
+                }
+            )
+    log.info(f"backtest: {len(tasks)} folds over {len(kpi_names)} kpis")
+
+    rows = []
+    if max_workers == 1 or len(tasks) <= 1:
+        rows = [_run_fold(task) for task in tasks]
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_fold, task) for task in tasks]
+            for future in as_completed(futures):
+                rows.append(future.result())
+
+    result = pd.DataFrame(rows)
+    if not result.empty:
+        result = result.sort_values(["kpi", "fold"]).reset_index(drop=True)
+    return result
+
+
+def summarize(result: pd.DataFrame) -> pd.DataFrame:
+    """Average accuracy and cost per KPI and model."""
+    return result.groupby(["kpi", "model"]).agg(
+        folds=("fold", "count"),
+        precision=("precision", "mean"),
+        recall=("recall", "mean"),
+        f1=("f1", "mean"),
+        event_recall=("event_recall", "mean"),
+        fit_seconds=("fit_seconds", "mean"),
+        predict_seconds=("predict_seconds", "mean"),
+        fit_peak_mb=("fit_peak_mb", "max"),
+        predict_peak_mb=("predict_peak_mb", "max"),
+    )
+
+
+def main():
+    result = run_backtest(["kpi_a"], train_size=pd.Timedelta(days=60))
+    print(result)
+    print(summarize(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def load_labels(path: str | Path) -> pd.DataFrame:
+    """Load labelled anomaly windows.
+
+    The file is a csv with `start` and `end` columns; both ends are inclusive.
+    """
+    labels = pd.read_csv(path, parse_dates=["start", "end"])
+    return labels.sort_values("start").reset_index(drop=True)
+
+
+def _window_positions(times: np.ndarray, windows: pd.DataFrame) -> tuple:
+    """First and one-past-last positions of every window in the sorted `times`."""
+    starts = pd.DatetimeIndex(windows["start"]).as_unit("ns").asi8
+    ends = pd.DatetimeIndex(windows["end"]).as_unit("ns").asi8
+    return (
+        np.searchsorted(times, starts, side="left"),
+        np.searchsorted(times, ends, side="right"),
+    )
+
+
+def label_mask(times, windows: pd.DataFrame | None) -> np.ndarray:
+    """Mark every timestamp that falls inside one of the labelled windows.
+
+    Args:
+        times: sorted timestamps of the scored points.
+        windows (pd.DataFrame): labelled windows with `start` and `end` columns.
+
+    Returns:
+        np.ndarray: boolean mask aligned with `times`.
+    """
+    times = pd.DatetimeIndex(times).as_unit("ns").asi8
+    mask = np.zeros(len(times), dtype=bool)
+    if windows is None or windows.empty:
+        return mask
+
+    # +1 at the first point of every window, -1 after its last point
+    starts, ends = _window_positions(times, windows)
+    marks = np.zeros(len(times) + 1, dtype=np.int64)
+    np.add.at(marks, starts, 1)
+    np.add.at(marks, ends, -1)
+    return np.cumsum(marks[:-1]) > 0
+
+
+def detection_scores(times, flags, windows: pd.DataFrame | None) -> dict:
+    """Point-wise precision/recall/F1 of anomaly flags against labelled windows.
+
+    `event_recall` is the share of labelled windows (inside the scored range) that got
+    at least one flag.
+
+    Args:
+        times: sorted timestamps of the scored points.
+        flags: anomaly flags aligned with `times` (non-zero means anomaly).
+        windows (pd.DataFrame): labelled windows with `start` and `end` columns.
+    """
+    flags = np.asarray(flags) != 0
+    truth = label_mask(times, windows)
+
+    tp = int(np.count_nonzero(flags & truth))
+    fp = int(np.count_nonzero(flags & ~truth))
+    fn = int(np.count_nonzero(~flags & truth))
+
+    precision = tp / (tp + fp) if tp + fp else np.nan
+    recall = tp / (tp + fn) if tp + fn else np.nan
+    if tp:
+        f1 = 2 * precision * recall / (precision + recall)
+    else:
+        f1 = 0.0 if tp + fp + fn else np.nan
+
+    event_recall = np.nan
+    if windows is not None and not windows.empty and len(times):
+        starts, ends = _window_positions(
+            pd.DatetimeIndex(times).as_unit("ns").asi8, windows
+        )
+        in_range = ends > starts
+        if in_range.any():
+            flagged = np.concatenate(([0], np.cumsum(flags)))
+            hits = flagged[ends[in_range]] - flagged[starts[in_range]]
+            event_recall = float(np.mean(hits > 0))
+
+    return {
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "event_recall": event_recall,
+    }
+
+
+def sweep_scores(
+    times, flags: pd.DataFrame, windows: pd.DataFrame | None
+) -> pd.DataFrame:
+    """Point-wise precision/recall/F1 of many flag columns at once.
+
+    Every column of `flags` is one sensitivity setting (see
+    `shared.anomaly_rules.same_hour_sweep`); the counts of all columns come from one
+    matrix product with the label mask.
+
+    Args:
+        times: sorted timestamps of the scored points.
+        flags (pd.DataFrame): anomaly flag columns aligned with `times`.
+        windows (pd.DataFrame): labelled windows with `start` and `end` columns.
+
+    Returns:
+        pd.DataFrame: tp/fp/fn/precision/recall/f1, one row per flag column.
+    """
+    matrix = flags.to_numpy() != 0
+    truth = label_mask(times, windows)
+
+    tp = truth.astype(np.int64) @ matrix
+    flagged = matrix.sum(axis=0)
+    fp = flagged - tp
+    fn = int(truth.sum()) - tp
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), np.nan)
+        f1 = np.where(tp > 0, 2 * precision * recall / (precision + recall), 0.0)
+    f1 = np.where(tp + fp + fn > 0, f1, np.nan)
+
+    return pd.DataFrame(
+        {
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+        },
+        index=flags.columns,
+    )
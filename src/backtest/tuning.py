@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from prophet.diagnostics import generate_cutoffs
+
+from data_sources.get_connector import get_connector
+from logger.logger import get_logger
+from models.prophet_model import ProphetModel
+from shared.config_loader import set_model_params
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+# changepoint/seasonality priors and fourier orders searched by default
+DEFAULT_GRID = {
+    "changepoint_prior_scale": [0.01, 0.05, 0.5],
+    "seasonality_prior_scale": [1.0, 10.0],
+    "daily_seasonality": [4, 10],
+    "weekly_seasonality": [3, 10],
+}
+
+METRICS = ("rmse", "mae", "smape")
+
+# the prepared series, set once per worker process by `_init_worker`
+_series: pd.DataFrame | None = None
+
+
+def param_grid(grid: dict) -> list[dict]:
+    """Every combination of the grid's values, in a stable order."""
+    names = sorted(grid)
+    return [
+        dict(zip(names, values)) for values in itertools.product(*map(grid.get, names))
+    ]
+
+
+def data_hash(data: pd.DataFrame) -> str:
+    rows = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    return hashlib.sha256(rows.tobytes()).hexdigest()[:16]
+
+
+def _fold_cache_path(
+    cache_dir: Path,
+    kpi_name: str,
+    digest: str,
+    params: dict,
+    cutoff: pd.Timestamp,
+    horizon: pd.Timedelta,
+) -> Path:
+    key = json.dumps(
+        {"params": params, "cutoff": str(cutoff), "horizon": str(horizon)},
+        sort_keys=True,
+        default=str,
+    )
+    fold = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return cache_dir / kpi_name / digest / f"fold_{fold}.json"
+
+
+def _init_worker(series: pd.DataFrame) -> None:
+    """Receive the series once per worker instead of once per fold."""
+    global _series
+    _series = series
+
+
+def _run_fold(task: dict) -> dict:
+    """Fit on the history up to the cutoff and score the following horizon."""
+    data = _series
+    cutoff, horizon = task["cutoff"], task["horizon"]
+    train = data[data["ds"] <= cutoff]
+    test = data[(data["ds"] > cutoff) & (data["ds"] <= cutoff + horizon)]
+
+    model = ProphetModel(task["kpi_name"], **task["params"])
+    model._add_holidays(train)
+    started = time.perf_counter()
+    model.model.fit(train)
+    fit_seconds = time.perf_counter() - started
+
+    yhat = model.model.predict(test[["ds"]])["yhat"].clip(lower=0).to_numpy()
+    y = test["y"].to_numpy()
+    error = y - yhat
+    with np.errstate(divide="ignore", invalid="ignore"):
+        smape = np.nanmean(2 * np.abs(error) / (np.abs(y) + np.abs(yhat)))
+    row = {
+        "params": task["params"],
+        "cutoff": str(cutoff),
+        "rmse": float(np.sqrt(np.mean(error**2))),
+        "mae": float(np.mean(np.abs(error))),
+        "smape": float(smape),
+        "fit_seconds": fit_seconds,
+    }
+
+    # written atomically, a search killed mid-write leaves no broken entry
+    cache_path = task["cache_path"]
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f".{cache_path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(row))
+        os.replace(tmp, cache_path)
+    return row
+
+
+def tune_prophet(
+    kpi_name: str,
+    data: pd.DataFrame | None = None,
+    grid: dict | None = None,
+    initial: pd.Timedelta = pd.Timedelta(days=60),
+    period: pd.Timedelta = pd.Timedelta(days=7),
+    horizon: pd.Timedelta = pd.Timedelta(days=7),
+    metric: str = "rmse",
+    cache_dir: str | Path | bool | None = None,
+    max_workers: int | None = None,
+    write_config: bool = True,
+) -> pd.DataFrame:
+    """Grid search of Prophet parameters with rolling-origin cross-validation.
+
+    Every (parameters, cutoff) fold is an independent task on a process pool. Fold
+    scores are cached on disk by KPI, hash of the data and parameters, so an
+    interrupted or repeated search only fits the folds it has not scored yet.
+
+    Args:
+        kpi_name (str): KPI to tune.
+        data (pd.DataFrame, optional): raw data, read with the KPI connector if missing.
+        grid (dict, optional): values per Prophet parameter, see DEFAULT_GRID.
+        initial (pd.Timedelta): history before the first cutoff.
+        period (pd.Timedelta): distance between cutoffs.
+        horizon (pd.Timedelta): forecast length scored after each cutoff.
+        metric (str): one of METRICS, averaged over the folds to rank parameters.
+        cache_dir (str | Path, optional): fold cache, `backtest/cache/tuning` by
+            default; pass `False` to disable it.
+        max_workers (int, optional): process pool size; 1 runs the folds inline.
+        write_config (bool): write the best parameters to `model.params` of the
+            KPI's config.yaml, where `get_model` picks them up.
+
+    Returns:
+        pd.DataFrame: one row per parameter set with the mean fold metrics, best first.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"unknown metric {metric}, expected one of {METRICS}")
+    if data is None:
+        data = get_connector(kpi_name).read(parse_dates=["DATE_H"])
+    # preprocessed once, the workers only slice it
+    series = ProphetModel(kpi_name)._pre_process(
+        data, date_col="timestamp", value_col="value"
+    )[["ds", "y"]]
+
+    if cache_dir is None:
+        cache_dir = PathManager().get("backtest", "cache", "tuning")
+    cache_dir = Path(cache_dir) if cache_dir else None
+    digest = data_hash(series)
+
+    cutoffs = generate_cutoffs(series, horizon, initial, period)
+    rows, tasks = [], []
+    for params in param_grid(grid or DEFAULT_GRID):
+        for cutoff in cutoffs:
+            cache_path = None
+            if cache_dir is not None:
+                cache_path = _fold_cache_path(
+                    cache_dir, kpi_name, digest, params, cutoff, horizon
+                )
+                if cache_path.exists():
+                    rows.append(json.loads(cache_path.read_text()))
+                    continue
+            tasks.append(
+                {
+                    "kpi_name": kpi_name,
+                    "params": params,
+                    "cutoff": cutoff,
+                    "horizon": horizon,
+                    "cache_path": cache_path,
+                }
+            )
+    log.info(
+        f"tuning {kpi_name}: {len(cutoffs)} cutoffs, {len(rows)} folds cached, "
+        f"{len(tasks)} to fit"
+    )
+
+    if max_workers == 1 or len(tasks) <= 1:
+        _init_worker(series)
+        rows.extend(_run_fold(task) for task in tasks)
+    else:
+        workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(series,)
+        ) as pool:
+            futures = [pool.submit(_run_fold, task) for task in tasks]
+            for future in as_completed(futures):
+                rows.append(future.result())
+
+    folds = pd.DataFrame(rows)
+    folds["key"] = folds["params"].map(
+        lambda params: json.dumps(params, sort_keys=True)
+    )
+    result = (
+        folds.groupby("key")
+        .agg(
+            params=("params", "first"),
+            folds=("cutoff", "count"),
+            **{name: (name, "mean") for name in METRICS},
+            fit_seconds=("fit_seconds", "mean"),
+        )
+        .sort_values(metric)
+        .reset_index(drop=True)
+    )
+
+    best = result["params"].iloc[0]
+    log.info(f"best parameters of {kpi_name} by {metric}: {best}")
+    if write_config:
+        set_model_params(kpi_name, best)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tune Prophet parameters of KPIs")
+    parser.add_argument("kpis", nargs="+")
+    parser.add_argument("--metric", default="rmse", choices=METRICS)
+    parser.add_argument("--initial-days", type=float, default=60)
+    parser.add_argument("--period-days", type=float, default=7)
+    parser.add_argument("--horizon-days", type=float, default=7)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="keep the configs")
+    args = parser.parse_args()
+
+    for kpi_name in args.kpis:
+        result = tune_prophet(
+            kpi_name,
+            initial=pd.Timedelta(days=args.initial_days),
+            period=pd.Timedelta(days=args.period_days),
+            horizon=pd.Timedelta(days=args.horizon_days),
+            metric=args.metric,
+            max_workers=args.max_workers,
+            write_config=not args.dry_run,
+        )
+        print(kpi_name)
+        print(result.head())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.run_benchmarks import RESULTS_DIR, SIZES, save_results, synthetic_hourly
+from shared.config_loader import get_config
+from shared.frame_backend import available_backends, get_backend
+from shared.path_manager import PathManager
+from shared.split_data import split_data
+
+# stages timed per backend; a lazy frame is collected at the end of every stage, so
+# each time includes the work the stage really triggers
+STAGES = ("read", "fill_range", "to_pandas", "pipeline")
+
+
+def largest_kpi_files(count: int = 3) -> list[Path]:
+    """The biggest csv files KPI configs read from, largest first."""
+    path_mgr = PathManager()
+    files = set()
+    for config_path in path_mgr.kpi_dir.glob("*/config.yaml"):
+        data = get_config(config_path.parent.name)["data"]
+        if data.get("data_type") == "csv":
+            path = Path(path_mgr.data_file(data["data_source"]))
+            if path.exists():
+                files.add(path)
+    return sorted(files, key=lambda p: p.stat().st_size, reverse=True)[:count]
+
+
+def synthetic_file(size: str = "10y") -> Path:
+    """A gappy hourly csv standing in for KPI files when there are none."""
+    data = synthetic_hourly(SIZES[size])
+    keep = np.random.default_rng(1).random(len(data)) > 0.01
+    path = Path(tempfile.mkdtemp(prefix="kpi_bench_")) / f"synthetic_{size}.csv"
+    data[keep].to_csv(path, index=False)
+    return path
+
+
+def _time(func, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_backend(name: str, path: Path, repeat: int = 3) -> list[dict]:
+    """Time every stage of the data path of one file on one backend.
+
+    Each stage starts from the collected output of the previous one; `pipeline` is
+    the whole path from the csv to the pandas train/test frames in one go, which is
+    where a lazy backend can fuse the stages.
+    """
+    backend = get_backend(name)
+    data = backend.collect(backend.read_csv(path))
+    filled = backend.collect(backend.fill_range(data))
+    split_date = backend.to_pandas(filled)["timestamp"].quantile(0.8).floor("h")
+
+    def pipeline():
+        # collected once, or a lazy backend would scan the csv again for each part
+        filled = backend.collect(backend.fill_range(backend.read_csv(path)))
+        return split_data(backend.to_pandas(filled), split_date)
+
+    runs = {
+        "read": lambda: backend.collect(backend.read_csv(path)),
+        "fill_range": lambda: backend.collect(backend.fill_range(data)),
+        "to_pandas": lambda: backend.to_pandas(filled),
+        "pipeline": pipeline,
+    }
+
+    results = []
+    for stage in STAGES:
+        timings = _time(runs[stage], repeat)
+        results.append(
+            {
+                "backend": name,
+                "file": path.name,
+                "bytes": path.stat().st_size,
+                "stage": stage,
+                "repeat": repeat,
+                "min": min(timings),
+                "median": statistics.median(timings),
+            }
+        )
+    return results
+
+
+def run_comparison(
+    files: list[Path] | None = None,
+    backends: list[str] | None = None,
+    repeat: int = 3,
+) -> dict:
+    """Compare the dataframe backends on the largest KPI files.
+
+    Args:
+        files (list[Path], optional): csv files to read, the largest KPI files (or a
+            synthetic ten year series when there are none) if not given.
+        backends (list[str], optional): backends to compare, every installed one if
+            not given.
+        repeat (int): timed runs per stage.
+    """
+    files = files or largest_kpi_files() or [synthetic_file()]
+    backends = backends or available_backends()
+
+    results = []
+    for path in files:
+        for name in backends:
+            for result in bench_backend(name, Path(path), repeat):
+                print(
+                    f"{result['file']:<24} {name:<7} {result['stage']:<11} "
+                    f"median {result['median']:.4f}s"
+                )
+                results.append(result)
+
+    versions = {"pandas": pd.__version__, "numpy": np.__version__}
+    for module in ("polars", "pyarrow"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **versions,
+        },
+        "results": results,
+    }
+
+
+def speedups(report: dict, baseline: str = "pandas") -> list[dict]:
+    """median(baseline) / median(backend) per file, stage and backend."""
+    base = {
+        (r["file"], r["stage"]): r["median"]
+        for r in report["results"]
+        if r["backend"] == baseline
+    }
+    return [
+        {**r, "speedup": base[(r["file"], r["stage"])] / r["median"]}
+        for r in report["results"]
+        if r["backend"] != baseline and (r["file"], r["stage"]) in base
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="compare the dataframe backends on the largest KPI files"
+    )
+    parser.add_argument("--files", nargs="+", help="csv files instead of KPI files")
+    parser.add_argument("--backends", nargs="+", help="backends to compare")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+
+    report = run_comparison(args.files, args.backends, args.repeat)
+    for row in speedups(report):
+        print(
+            f"{row['file']:<24} {row['backend']:<7} {row['stage']:<11} "
+            f"x{row['speedup']:.2f} vs pandas"
+        )
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = args.output or (
+        RESULTS_DIR / f"backends_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    print(f"results written to {save_results(report, path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from benchmarks.run_benchmarks import RESULTS_DIR
+from logger.logger import get_logger
+from models.get_model import get_model
+from shared.path_manager import PathManager
+from shared.synthetic_kpi import generate_series, write_kpi
+
+log = get_logger()
+
+PERCENTILES = (50, 95, 99)
+
+
+# ---- fixtures ---- #
+def prepare_kpis(
+    count: int = 2,
+    days: int = 60,
+    train_days: int = 50,
+    prefix: str = "loadtest",
+) -> dict[str, pd.DataFrame]:
+    """Write synthetic KPIs with a trained and saved model each.
+
+    Returns:
+        dict[str, pd.DataFrame]: the data of every KPI, to cut payloads from.
+    """
+    kpis = {}
+    for i in range(count):
+        kpi_name = f"{prefix}_{i}"
+        data, _ = generate_series(periods=24 * days, seed=i)
+        write_kpi(kpi_name, data)
+        model = get_model(kpi_name)
+        model.fit(data.iloc[: 24 * train_days])
+        model.save()
+        kpis[kpi_name] = data
+        log.info(f"load test kpi {kpi_name} ready")
+    return kpis
+
+
+def cleanup_kpis(kpi_names: list[str]) -> None:
+    path_mgr = PathManager()
+    for kpi_name in kpi_names:
+        shutil.rmtree(path_mgr.kpi_path(kpi_name), ignore_errors=True)
+        path_mgr.data_file(f"{kpi_name}.csv").unlink(missing_ok=True)
+        shutil.rmtree(path_mgr.data_dir / "result_cache" / kpi_name, ignore_errors=True)
+
+
+def payload_pool(
+    data: pd.DataFrame, window_hours: int, count: int, seed: int = 0
+) -> list[list[dict]]:
+    """`count` detect payloads, windows of `window_hours` at random offsets.
+
+    Distinct windows keep the result cache from answering every request.
+    """
+    rng = np.random.default_rng(seed)
+    last = len(data) - window_hours
+    payloads = []
+    for offset in rng.integers(0, max(last, 1), size=count):
+        window = data.iloc[offset : offset + window_hours]
+        payloads.append(
+            window.assign(DATE_H=window["DATE_H"].astype(str)).to_dict("records")
+        )
+    return payloads
+
+
+# ---- server ---- #
+def start_server(host: str, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    """Start the API with uvicorn on localhost and wait until /health answers."""
+    env = dict(os.environ, PYTHONPATH=str(PathManager().base_dir))
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api.main_api:app",
+            "--host",
+            host,
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=PathManager().base_dir,
+        env=env,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://{host}:{port}/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise TimeoutError(f"server on {host}:{port} did not start in {timeout}s")
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 300.0) -> dict:
+    """Wait until the API has warmed up its models, /health/ready is past "warming".
+
+    KPIs whose models failed to load only get a warning; their requests fail either
+    way, the others are served from the warmed-up path.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = (await client.get("/health/ready")).json()
+        if body["status"] != "warming":
+            if body["failed"]:
+                log.warning(f"models failed to load: {sorted(body['failed'])}")
+            return body
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"models were not warmed up in {timeout}s")
+
+
+# ---- load ---- #
+async def _send(client: httpx.AsyncClient, request: dict, scheduled: float) -> dict:
+    """Send one request; latency counts from when it was due, not when it was sent,
+    so a saturated server is not hidden by requests waiting to go out."""
+    try:
+        if request["endpoint"] == "detect":
+            response = await client.post(
+                f"/kpi/detect/{request['kpi']}", json={"data": request["payload"]}
+            )
+        else:
+            response = await client.post(f"/kpi/train/{request['kpi']}")
+        status, error = response.status_code, None
+    except httpx.HTTPError as e:
+        status, error = None, type(e).__name__
+    return {
+        "endpoint": request["endpoint"],
+        "status": status,
+        "error": error,
+        "latency": time.perf_counter() - scheduled,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    next_request,
+    concurrency: int = 8,
+    rate: float | None = None,
+    duration: float = 10.0,
+    max_requests: int | None = None,
+    seed: int = 0,
+) -> tuple[list[dict], float]:
+    """Send requests for `duration` seconds (or until `max_requests`).
+
+    Without `rate` the load is closed: `concurrency` clients send back to back. With
+    `rate` (requests/s) arrivals are Poisson and open, at most `concurrency` in flight.
+
+    Returns:
+        tuple[list[dict], float]: one record per request and the elapsed seconds.
+    """
+    records: list[dict] = []
+    started = time.perf_counter()
+    stop = started + duration
+    max_requests = max_requests or sys.maxsize
+
+    if rate is None:
+
+        async def client_loop():
+            while time.perf_counter() < stop and len(records) < max_requests:
+                records.append(await _send(client, next_request(), time.perf_counter()))
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    else:
+        rng = np.random.default_rng(seed)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def bounded(request: dict, scheduled: float):
+            async with slots:
+                records.append(await _send(client, request, scheduled))
+
+        tasks, due = [], started
+        while due < stop and len(tasks) < max_requests:
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            tasks.append(asyncio.create_task(bounded(next_request(), due)))
+            due += rng.exponential(1 / rate)
+        await asyncio.gather(*tasks)
+
+    return records, time.perf_counter() - started
+
+
+# ---- report ---- #
+def summarize(records: list[dict], elapsed: float) -> dict:
+    """Latency percentiles, throughput and error rate per endpoint and overall."""
+    frame = pd.DataFrame(records)
+    endpoints = {}
+    groups = [("all", frame)]
+    if not frame.empty:
+        groups += list(frame.groupby("endpoint", sort=True))
+    for endpoint, group in groups:
+        if group.empty:
+            continue
+        ok = group["status"].between(200, 299)
+        latency_ms = group["latency"].to_numpy() * 1000
+        statuses = group["status"].fillna(-1).astype(int).value_counts()
+        endpoints[endpoint] = {
+            "requests": len(group),
+            "ok": int(ok.sum()),
+            "errors": int((~ok).sum()),
+            "error_rate": float((~ok).mean()),
+            "throughput": float(ok.sum() / elapsed) if elapsed else 0.0,
+            "statuses": {
+                ("transport_error" if s == -1 else str(s)): int(n)
+                for s, n in statuses.items()
+            },
+            "latency_ms": {
+                **{f"p{p}": float(np.percentile(latency_ms, p)) for p in PERCENTILES},
+                "mean": float(latency_ms.mean()),
+                "max": float(latency_ms.max()),
+            },
+        }
+    return {"elapsed": elapsed, "endpoints": endpoints}
+
+
+def format_report(report: dict) -> str:
+    config = report["config"]
+    lines = [
+        f"load test: {config['mode']} mode, concurrency {config['concurrency']}, "
+        f"rate {config['rate'] or 'closed loop'}, {report['summary']['elapsed']:.1f}s",
+        f"{'endpoint':<8} {'reqs':>6} {'err%':>6} {'rps':>8} "
+        + " ".join(f"{f'p{p} ms':>9}" for p in PERCENTILES),
+    ]
+    for endpoint, stats in report["summary"]["endpoints"].items():
+        latency = stats["latency_ms"]
+        lines.append(
+            f"{endpoint:<8} {stats['requests']:>6} {stats['error_rate'] * 100:>6.1f} "
+            f"{stats['throughput']:>8.1f} "
+            + " ".join(f"{latency[f'p{p}']:>9.1f}" for p in PERCENTILES)
+        )
+    return "\n".join(lines)
+
+
+async def run_load_test(
+    kpis: dict[str, pd.DataFrame],
+    mode: str = "inprocess",
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    mix: dict | None = None,
+    concurrency: int = 8,
+    rate: float | None = None,
+    duration: float = 10.0,
+    max_requests: int | None = None,
+    window_hours: int = 24 * 7,
+    payloads: int = 32,
+    seed: int = 0,
+) -> dict:
+    """Drive the detect/train routes and report latency, throughput and errors.
+
+    Args:
+        kpis (dict): data per KPI to cut payloads from, see `prepare_kpis`.
+        mode (str): "inprocess" runs the app's lifespan (warm-up, inference pool)
+            and calls it through httpx's ASGI transport,
+            "http" starts uvicorn on `host:port` and goes through the network stack.
+        mix (dict): share of requests per endpoint, {"detect": 1.0} by default.
+        concurrency (int): clients (closed loop) or in-flight cap (open loop).
+        rate (float, optional): open-loop arrival rate in requests/s.
+        duration (float): seconds of load.
+        max_requests (int, optional): stop after this many requests.
+        window_hours (int): hours of data per detect payload.
+        payloads (int): distinct payloads per KPI.
+    """
+    mix = mix or {"detect": 1.0}
+    endpoints = list(mix)
+    weights = np.array([mix[e] for e in endpoints], dtype=float)
+    weights /= weights.sum()
+    pools = {
+        kpi: payload_pool(data, window_hours, payloads, seed)
+        for kpi, data in kpis.items()
+    }
+    kpi_names = list(pools)
+    rng = np.random.default_rng(seed)
+
+    def next_request() -> dict:
+        kpi = kpi_names[rng.integers(len(kpi_names))]
+        endpoint = endpoints[rng.choice(len(endpoints), p=weights)]
+        pool = pools[kpi]
+        return {
+            "endpoint": endpoint,
+            "kpi": kpi,
+            "payload": pool[rng.integers(len(pool))],
+        }
+
+    server = None
+    lifespan = contextlib.nullcontext()
+    if mode == "inprocess":
+        from api.main_api import app
+
+        # the ASGI transport does not run the lifespan; without it there is no
+        # warm-up and no inference pool, so requests would not take the served path
+        lifespan = app.router.lifespan_context(app)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    elif mode == "http":
+        server = start_server(host, port)
+        transport = None
+        base_url = f"http://{host}:{port}"
+    else:
+        raise ValueError(f"unknown mode {mode}, expected inprocess or http")
+
+    limits = httpx.Limits(max_connections=concurrency)
+    try:
+        async with lifespan, httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=None, limits=limits
+        ) as client:
+            await wait_ready(client)
+            records, elapsed = await drive(
+                client, next_request, concurrency, rate, duration, max_requests, seed
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return {
+        "meta": {"created": datetime.now().isoformat(timespec="seconds")},
+        "config": {
+            "mode": mode,
+            "kpis": kpi_names,
+            "mix": mix,
+            "concurrency": concurrency,
+            "rate": rate,
+            "duration": duration,
+            "window_hours": window_hours,
+        },
+        "summary": summarize(records, elapsed),
+    }
+
+
+def save_report(report: dict, path: str | Path | None = None) -> Path:
+    if path is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"load_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    path = Path(path)
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def _parse_mix(text: str) -> dict:
+    """Parse an endpoint mix like detect=0.9,train=0.1 into shares per endpoint."""
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, share = part.partition("=")
+        if endpoint not in ("detect", "train"):
+            raise argparse.ArgumentTypeError(f"unknown endpoint {endpoint}")
+        mix[endpoint] = float(share or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test the KPI API")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--kpis", nargs="+", help="existing kpis, else synthetic")
+    parser.add_argument("--synthetic-kpis", type=int, default=2)
+    parser.add_argument("--keep", action="store_true", help="keep synthetic kpis")
+    parser.add_argument("--mix", type=_parse_mix, default={"detect": 1.0})
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="open-loop requests per second")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--window-hours", type=int, default=24 * 7)
+    parser.add_argument("--output", help="json file to write the report to")
+    args = parser.parse_args()
+
+    if args.kpis:
+        from data_sources.get_connector import get_connector
+
+        kpis = {
+            kpi: get_connector(kpi).read(parse_dates=["DATE_H"]) for kpi in args.kpis
+        }
+    else:
+        kpis = prepare_kpis(args.synthetic_kpis)
+
+    try:
+        report = asyncio.run(
+            run_load_test(
+                kpis,
+                mode=args.mode,
+                host=args.host,
+                port=args.port,
+                mix=args.mix,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                duration=args.duration,
+                max_requests=args.requests,
+                window_hours=args.window_hours,
+            )
+        )
+    finally:
+        if not args.kpis and not args.keep:
+            cleanup_kpis(list(kpis))
+
+    print(format_report(report))
+    print(f"report written to {save_report(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from data_sources.csv_connector import CSVDataSource
+from models.hybrid_model import HybridAnomalyDetector
+from models.prophet_model import ProphetModel
+from models.stl_model import stl_arima_anomaly
+from shared.fill_range import fill_range
+from shared.path_manager import PathManager
+from shared.split_data import split_data
+from shared.synthetic_kpi import generate_series
+from shared.to_date import to_char, to_date
+
+RESULTS_DIR = PathManager().get("benchmarks", "results")
+
+# hourly series lengths the suite runs on
+SIZES = {
+    "1m": 24 * 30,
+    "1y": 24 * 365,
+    "10y": 24 * 365 * 10,
+}
+
+# model fits get slow quickly, so by default they stop at one year of data
+MODEL_SIZES = ("1m", "1y")
+
+
+def synthetic_hourly(periods: int, seed: int = 0) -> pd.DataFrame:
+    """Gap-free hourly KPI series in the DATE_H/CNT layout."""
+    data, _ = generate_series(start="2015-03-21", periods=periods, seed=seed)
+    return data
+
+
+class Case:
+    """One benchmark: `setup(rows)` builds the inputs, `run(state)` is what gets timed.
+
+    `teardown(state)`, when given, releases what the setup created (temp files, ...).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[int], object],
+        run: Callable[[object], object],
+        sizes: tuple = tuple(SIZES),
+        teardown: Callable[[object], object] | None = None,
+    ) -> None:
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.sizes = sizes
+        self.teardown = teardown
+
+
+# ---- setups ---- #
+def _csv_setup(rows: int):
+    tmp = tempfile.TemporaryDirectory(prefix="kpi_bench_")
+    path = Path(tmp.name) / "kpi.csv"
+    synthetic_hourly(rows).to_csv(path, index=False)
+    return CSVDataSource(path), tmp
+
+
+def _gappy_setup(rows: int) -> pd.DataFrame:
+    data = synthetic_hourly(rows)
+    keep = np.random.default_rng(1).random(len(data)) > 0.01
+    return data[keep].reset_index(drop=True)
+
+
+def _split_setup(rows: int):
+    data = synthetic_hourly(rows)
+    return data, data["DATE_H"].iloc[len(data) // 2]
+
+
+def _prophet_fitted_setup(rows: int):
+    data = synthetic_hourly(rows)
+    train, test = split_data(data, data["DATE_H"].iloc[-24 * 7], "DATE_H")
+    model = ProphetModel(kpi_name="benchmark")
+    model.fit(train)
+    return model, test
+
+
+def _hybrid_frame(rows: int) -> pd.DataFrame:
+    return synthetic_hourly(rows).rename(
+        columns={"DATE_H": "timestamp", "CNT": "value"}
+    )
+
+
+def _hybrid_fitted_setup(rows: int):
+    data = _hybrid_frame(rows)
+    train, test = split_data(data, data["timestamp"].iloc[-24 * 7])
+    model = HybridAnomalyDetector()
+    model.fit(train)
+    return model, test
+
+
+def _to_date_run(_):
+    for _ in range(1000):
+        to_date("1404-05-25 16:39:39", "yyyy-mm-dd hh24:mi:ss", "persian")
+
+
+def _to_char_run(_):
+    date = datetime(2025, 8, 16, 16, 39, 39)
+    for _ in range(1000):
+        to_char(date, "yyyy-mm-dd hh24:mi:ss", "persian")
+
+
+def _stl_setup(rows: int):
+    data = synthetic_hourly(rows)
+    return data, data["DATE_H"].iloc[-24 * 7]
+
+
+CASES = [
+    Case(
+        "csv_read",
+        _csv_setup,
+        lambda s: s[0].read(parse_dates=["DATE_H"]),
+        teardown=lambda s: s[1].cleanup(),
+    ),
+    Case("fill_range", _gappy_setup, fill_range),
+    Case("split_data", _split_setup, lambda s: split_data(s[0], s[1], "DATE_H")),
+    Case("to_date_x1000", lambda rows: None, _to_date_run, sizes=("1m",)),
+    Case("to_char_x1000", lambda rows: None, _to_char_run, sizes=("1m",)),
+    Case(
+        "prophet_pre_process",
+        synthetic_hourly,
+        lambda data: ProphetModel("benchmark")._pre_process(data, "timestamp", "value"),
+    ),
+    Case(
+        "prophet_fit",
+        synthetic_hourly,
+        lambda data: ProphetModel("benchmark").fit(data),
+        sizes=MODEL_SIZES,
+    ),
+    Case(
+        "prophet_predict",
+        _prophet_fitted_setup,
+        lambda s: s[0].predict(s[1]),
+        sizes=MODEL_SIZES,
+    ),
+    Case(
+        "hybrid_fit",
+        _hybrid_frame,
+        lambda data: HybridAnomalyDetector().fit(data),
+        sizes=MODEL_SIZES,
+    ),
+    Case(
+        "hybrid_predict",
+        _hybrid_fitted_setup,
+        lambda s: s[0].predict(df=s[1]),
+        sizes=MODEL_SIZES,
+    ),
+    Case(
+        "stl_arima_anomaly",
+        _stl_setup,
+        lambda s: stl_arima_anomaly(s[0], s[1]),
+        sizes=MODEL_SIZES,
+    ),
+]
+
+
+def run_case(case: Case, size: str, repeat: int) -> dict:
+    rows = SIZES[size]
+    state = case.setup(rows)
+    timings = []
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            case.run(state)
+            timings.append(time.perf_counter() - started)
+    finally:
+        if case.teardown is not None:
+            case.teardown(state)
+
+    return {
+        "name": case.name,
+        "size": size,
+        "rows": rows,
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+    }
+
+
+def run_suite(
+    sizes: list[str] | None = None,
+    only: list[str] | None = None,
+    repeat: int = 3,
+    all_sizes: bool = False,
+) -> dict:
+    """Run the selected benchmark cases and return the results with run metadata.
+
+    Args:
+        sizes (list[str], optional): series lengths to run, keys of `SIZES`.
+        only (list[str], optional): case names to run, all cases if not given.
+        repeat (int): timed runs per case and size.
+        all_sizes (bool): run every case on every size, ignoring its own limits.
+    """
+    sizes = sizes or list(SIZES)
+    results = []
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        for size in sizes:
+            if size not in (SIZES if all_sizes else case.sizes):
+                continue
+            result = run_case(case, size, repeat)
+            print(f"{case.name:<22} {size:>4} median {result['median']:.4f}s")
+            results.append(result)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def save_results(report: dict, path: str | Path | None = None) -> Path:
+    if path is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    path = Path(path)
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.2) -> list[dict]:
+    """Compare two reports case by case on the median time.
+
+    Returns:
+        list[dict]: one entry per case/size found in both reports, with the
+        current/baseline ratio and whether it is a regression beyond `tolerance`.
+    """
+    base = {(r["name"], r["size"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = base.get((result["name"], result["size"]))
+        if old is None or old["median"] == 0:
+            continue
+        ratio = result["median"] / old["median"]
+        rows.append(
+            {
+                "name": result["name"],
+                "size": result["size"],
+                "baseline": old["median"],
+                "current": result["median"],
+                "ratio": ratio,
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="benchmark the data and model hot paths"
+    )
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES))
+    parser.add_argument("--only", nargs="+", help="case names to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--all-sizes", action="store_true")
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--compare", help="baseline json to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.only, args.repeat, args.all_sizes)
+    path = save_results(report, args.output)
+    print(f"results written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = 0
+        for row in compare(baseline, report, args.tolerance):
+            mark = "REGRESSION" if row["regression"] else "ok"
+            regressions += row["regression"]
+            print(
+                f"{row['name']:<22} {row['size']:>4} "
+                f"{row['baseline']:.4f}s -> {row['current']:.4f}s "
+                f"x{row['ratio']:.2f} {mark}"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
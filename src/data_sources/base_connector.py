@@ -4,6 +4,45 @@ from pandas import DataFrame
 
 class BaseDataSource(ABC):
     @abstractmethod
-    def read(self, parse_dates: list = []) -> DataFrame:
-        """Read data and return as a DataFrame."""
+    def read(
+        self,
+        parse_dates: list = [],
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ) -> DataFrame:
+        """Read data and return as a DataFrame.
+
+        Connectors push the filters down to the source, so only the requested
+        window and columns are fetched.
+
+        Args:
+            parse_dates (list): columns to parse as datetimes.
+            start (datetime, optional): first timestamp to return (inclusive).
+            end (datetime, optional): timestamp to stop at (exclusive).
+            columns (list, optional): columns to return, all if not given.
+            time_col (str): timestamp column `start` and `end` apply to.
+        """
         pass
+
+    def scan(
+        self,
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ):
+        """Read data in the connector's dataframe backend (see shared.frame_backend).
+
+        Callers that hand the data to a model use this instead of `read`, so a lazy
+        backend is only materialised as pandas at the model boundary. Connectors
+        without a backend return `read`'s pandas frame.
+        """
+        return self.read(
+            parse_dates=[time_col],
+            start=start,
+            end=end,
+            columns=columns,
+            time_col=time_col,
+        )
@@ -1,14 +1,130 @@
 import pandas as pd
 from data_sources.base_connector import BaseDataSource
+from logger.logger import get_logger
+from shared.frame_backend import get_backend
+from shared.metrics import timed
+
+log = get_logger()
 
 
 class CSVDataSource(BaseDataSource):
-    def __init__(self, data_path) -> None:
+    def __init__(
+        self,
+        data_path,
+        kpi_name: str = "",
+        sorted_by_time: bool = False,
+        chunk_size: int = 100_000,
+        dtype: dict | None = None,
+        backend: str = "pandas",
+    ) -> None:
+        """
+        :param data_path: csv file to read.
+        :param kpi_name: KPI the data belongs to, used for metrics.
+        :param sorted_by_time: the file is sorted on the time column, so a windowed
+            read can stop at the first row past `end`. Every chunk read is checked and a
+            read that finds unsorted rows falls back to filtering every chunk.
+        :param chunk_size: rows parsed at a time by windowed reads.
+        :param dtype: column dtypes to parse with, e.g. {"CNT": "float32"}.
+        :param backend: dataframe backend `scan` reads with: pandas, polars or arrow.
+        """
         self.__data_path = data_path
+        self._kpi_name = kpi_name
+        self._sorted = sorted_by_time
+        self._chunk_size = chunk_size
+        self._dtype = dtype
+        self._backend = get_backend(backend)
+
+    @timed("read")
+    def read(
+        self,
+        parse_dates: list = [],
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ) -> pd.DataFrame:
+        if self._backend.name != "pandas":
+            return self._backend.to_pandas(self.scan(start, end, columns, time_col))
+
+        if start is None and end is None:
+            return pd.read_csv(
+                self.__data_path,
+                parse_dates=parse_dates,
+                usecols=columns,
+                dtype=self._dtype,
+            )
+
+        # the time column is needed for filtering even if it is not returned
+        usecols = None if columns is None else list(dict.fromkeys([*columns, time_col]))
+        parse = [
+            col
+            for col in dict.fromkeys([*parse_dates, time_col])
+            if usecols is None or col in usecols
+        ]
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+
+        parts = []
+        with pd.read_csv(
+            self.__data_path,
+            parse_dates=parse,
+            usecols=usecols,
+            chunksize=self._chunk_size,
+            dtype=self._dtype,
+        ) as reader:
+            trust_order, last = self._sorted, None
+            for chunk in reader:
+                times = chunk[time_col]
+                if trust_order and not (
+                    times.is_monotonic_increasing
+                    and (last is None or times.empty or times.iloc[0] >= last)
+                ):
+                    log.warning(
+                        f"{self.__data_path} is not sorted on {time_col}, "
+                        "filtering every chunk"
+                    )
+                    trust_order = False
+                if not times.empty:
+                    last = times.iloc[-1]
+
+                if trust_order and start is not None and times.iloc[-1] < start:
+                    continue
+
+                keep = pd.Series(True, index=chunk.index)
+                if start is not None:
+                    keep &= times >= start
+                if end is not None:
+                    keep &= times < end
+                parts.append(chunk[keep])
+
+                if trust_order and end is not None and times.iloc[-1] >= end:
+                    break
+
+        if parts:
+            data = pd.concat(parts, ignore_index=True)
+        else:
+            data = pd.read_csv(
+                self.__data_path,
+                parse_dates=parse,
+                usecols=usecols,
+                nrows=0,
+                dtype=self._dtype,
+            )
+        return data if columns is None else data[list(columns)]
 
-    def read(self, parse_dates: list = []) -> pd.DataFrame:
-        data = pd.read_csv(self.__data_path, parse_dates=parse_dates)
-        return data
+    def scan(
+        self,
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ):
+        if self._backend.name == "pandas":
+            return super().scan(start, end, columns, time_col)
+        # lazy for polars: nothing is read until the frame is collected
+        return self._backend.read_csv(
+            self.__data_path, time_col, start, end, columns, self._dtype
+        )
 
     def get_data_path(self):
         return self.__data_path
@@ -1,21 +1,45 @@
 from data_sources.base_connector import BaseDataSource
 from data_sources.csv_connector import CSVDataSource
+from data_sources.parquet_connector import ParquetDataSource
+from data_sources.series_store import SeriesStore, StoreDataSource
+from data_sources.sql_connector import sql_connector_from_config
 from shared.config_loader import get_config
 from shared.path_manager import PathManager
 
 
 def get_connector(kpi_name) -> BaseDataSource:
-    path_mgr = PathManager()
     config = get_config(kpi_name)
+    connector = _source_connector(kpi_name, config)
+
+    # `store: true` keeps a memory-mapped copy the source only appends new points to
+    if config["data"].get("store", False):
+        return StoreDataSource(
+            SeriesStore(kpi_name), upstream=connector, kpi_name=kpi_name
+        )
+    return connector
+
 
+def _source_connector(kpi_name, config) -> BaseDataSource:
+    path_mgr = PathManager()
     data_type = config["data"]["data_type"]
-    data_source = path_mgr.data_file(config["data"]["data_source"])
 
     if data_type == "csv":
-        csv_conn = CSVDataSource(data_source)
+        data_source = path_mgr.data_file(config["data"]["data_source"])
+        csv_conn = CSVDataSource(
+            data_source,
+            kpi_name,
+            sorted_by_time=config["data"].get("sorted", False),
+            dtype=config["data"].get("dtypes"),
+            backend=config["data"].get("backend", "pandas"),
+        )
         return csv_conn
-    elif data_type == "oracle":
-        return CSVDataSource("asghar")
+    elif data_type == "parquet":
+        data_source = path_mgr.data_file(config["data"]["data_source"])
+        return ParquetDataSource(data_source, kpi_name)
+    elif data_type in ("oracle", "sqlite", "sql"):
+        return sql_connector_from_config(kpi_name, config["data"])
+    elif data_type == "store":
+        return StoreDataSource(SeriesStore(kpi_name), kpi_name=kpi_name)
     else:
         return CSVDataSource("asghar")
 
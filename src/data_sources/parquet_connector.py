@@ -0,0 +1,66 @@
+import pandas as pd
+from data_sources.base_connector import BaseDataSource
+from shared.metrics import timed
+
+
+def _pyarrow_parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("parquet caches need pyarrow: pip install pyarrow") from e
+    return pq
+
+
+def write_parquet_cache(
+    data: pd.DataFrame,
+    path,
+    time_col: str = "DATE_H",
+    row_group_size: int = 24 * 30,
+) -> None:
+    """Write KPI data as a time-sorted parquet file with small row groups.
+
+    Each row group then covers one contiguous time range, so its min/max statistics
+    let windowed reads skip every group outside the window.
+    """
+    pq = _pyarrow_parquet()
+    import pyarrow as pa
+
+    data = data.sort_values(time_col)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    pq.write_table(table, path, row_group_size=row_group_size)
+
+
+class ParquetDataSource(BaseDataSource):
+    def __init__(self, data_path, kpi_name: str = "") -> None:
+        self.__data_path = data_path
+        self._kpi_name = kpi_name
+
+    @timed("read")
+    def read(
+        self,
+        parse_dates: list = [],
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ) -> pd.DataFrame:
+        pq = _pyarrow_parquet()
+
+        filters = []
+        if start is not None:
+            filters.append((time_col, ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append((time_col, "<", pd.Timestamp(end)))
+
+        # filters are checked against row group statistics before any data is read
+        table = pq.read_table(
+            self.__data_path, columns=columns, filters=filters or None
+        )
+        data = table.to_pandas()
+        for col in parse_dates:
+            if col in data.columns:
+                data[col] = pd.to_datetime(data[col])
+        return data
+
+    def get_data_path(self):
+        return self.__data_path
@@ -0,0 +1,413 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_sources.base_connector import BaseDataSource
+from logger.logger import get_logger
+from shared.file_lock import file_lock
+from shared.metrics import timed
+from shared.path_manager import PathManager
+from shared.rollups import AGGREGATES, rollup
+
+log = get_logger()
+
+# the files grow by at least this many points, so appends rarely resize them
+GROW_POINTS = 24 * 366
+
+# rollups kept next to the series: daily, and weekly starting Monday
+ROLLUP_PERIODS = {"D": pd.Timedelta(days=1), "W": pd.Timedelta(weeks=1)}
+# an empty period: sum and count 0, no mean/min/max
+EMPTY_ROLLUP = np.array([0.0, np.nan, np.nan, np.nan, 0.0])
+
+
+def _valid_mask(valid: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    bits = np.unpackbits(valid[lo >> 3 : (hi + 7) >> 3], bitorder="little")
+    return bits[lo & 7 : (lo & 7) + hi - lo].astype(bool)
+
+
+class SeriesStore:
+    """Append-only, memory-mapped hourly series of one KPI.
+
+    The values are a float64 file mapped into memory; the timestamp of point i is
+    `start + i * freq`, so no timestamps are stored. A bitmap (one bit per point)
+    marks which points hold data, gaps stay NaN and invalid. `meta.json` records the
+    start, frequency and length and is replaced atomically after the data is written,
+    so readers in other processes always map a complete prefix of the series and
+    share its pages through the OS cache instead of loading their own copy.
+
+    Daily and weekly rollups (sum/mean/min/max/count per period, see
+    shared.rollups) are kept in `rollup_<D|W>.f64`, one row per period. An append
+    only recomputes the periods its points fall into, so long-period models read a
+    few hundred rows instead of aggregating years of hourly points.
+    """
+
+    def __init__(
+        self,
+        kpi_name: str,
+        root: Path | None = None,
+        freq: str = "h",
+    ) -> None:
+        """
+        :param kpi_name: KPI the series belongs to.
+        :param root: directory of all stores, data/store by default.
+        :param freq: frequency of a new store (an existing one keeps its own).
+        """
+        self._kpi_name = kpi_name
+        self.dir = Path(root or PathManager().data_dir / "store") / kpi_name
+        self._freq = freq
+
+    # ---- metadata ---- #
+    @property
+    def _meta_path(self) -> Path:
+        return self.dir / "meta.json"
+
+    def meta(self) -> dict | None:
+        try:
+            return json.loads(self._meta_path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp = self.dir / f".meta.{uuid.uuid4().hex}.tmp"
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_path)
+
+    @property
+    def length(self) -> int:
+        meta = self.meta()
+        return meta["length"] if meta else 0
+
+    @property
+    def start(self) -> pd.Timestamp | None:
+        meta = self.meta()
+        return pd.Timestamp(meta["start"]) if meta else None
+
+    @property
+    def end(self) -> pd.Timestamp | None:
+        """Timestamp one step after the last stored point."""
+        meta = self.meta()
+        if not meta:
+            return None
+        return pd.Timestamp(meta["start"]) + meta["length"] * pd.Timedelta(
+            meta["freq_ns"], "ns"
+        )
+
+    # ---- mapping ---- #
+    def _map(self, meta: dict, mode: str = "r"):
+        length = meta["capacity"] if mode == "r+" else meta["length"]
+        if length == 0:
+            return np.empty(0), np.empty(0, dtype=np.uint8)
+        values = np.memmap(self.dir / "values.f64", np.float64, mode, shape=(length,))
+        valid = np.memmap(
+            self.dir / "valid.bits", np.uint8, mode, shape=((length + 7) // 8,)
+        )
+        return values, valid
+
+    def _grow(self, meta: dict, length: int) -> None:
+        """Make the files hold at least `length` points; new points are NaN/invalid."""
+        capacity = meta["capacity"]
+        if length <= capacity:
+            return
+        new_capacity = max(length, capacity + max(GROW_POINTS, capacity // 2))
+        with open(self.dir / "values.f64", "ab") as file:
+            np.full(new_capacity - capacity, np.nan).tofile(file)
+        with open(self.dir / "valid.bits", "ab") as file:
+            extra = (new_capacity + 7) // 8 - (capacity + 7) // 8
+            file.write(bytes(extra))
+        meta["capacity"] = new_capacity
+
+    # ---- writing ---- #
+    def _positions(self, meta: dict, times: pd.DatetimeIndex) -> np.ndarray:
+        offsets = times.as_unit("ns").asi8 - pd.Timestamp(meta["start"]).value
+        positions, remainder = np.divmod(offsets, meta["freq_ns"])
+        if remainder.any():
+            raise ValueError(f"timestamps not aligned to the {meta['freq']} grid")
+        if (positions < 0).any():
+            raise ValueError(f"{self._kpi_name} store starts at {meta['start']}")
+        return positions
+
+    def append(self, times, values) -> int:
+        """Write points into the series, extending it past its current end.
+
+        Points at or after the end are appended (missing steps become gaps), points
+        inside the series overwrite the stored value. NaN values mark gaps.
+
+        Returns:
+            int: the new length of the series.
+        """
+        times = pd.DatetimeIndex(times)
+        values = np.asarray(values, dtype=np.float64)
+        if len(times) == 0:
+            return self.length
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        # one writer at a time, readers never take the lock
+        with file_lock(self.dir / ".lock"):
+            meta = self.meta()
+            if meta is None:
+                freq_ns = pd.Timedelta(
+                    pd.tseries.frequencies.to_offset(self._freq)
+                ).value
+                meta = {
+                    "kpi": self._kpi_name,
+                    "start": str(times.min().floor(self._freq)),
+                    "freq": self._freq,
+                    "freq_ns": freq_ns,
+                    "length": 0,
+                    "capacity": 0,
+                }
+                open(self.dir / "values.f64", "wb").close()
+                open(self.dir / "valid.bits", "wb").close()
+
+            positions = self._positions(meta, times)
+            length = max(meta["length"], int(positions.max()) + 1)
+            self._grow(meta, length)
+
+            stored, valid = self._map(meta, "r+")
+            stored[positions] = values
+            ok = ~np.isnan(values)
+            masks = (1 << (positions & 7)).astype(np.uint8)
+            np.bitwise_or.at(valid, positions[ok] >> 3, masks[ok])
+            np.bitwise_and.at(valid, positions[~ok] >> 3, ~masks[~ok])
+            stored.flush()
+            valid.flush()
+            self._update_rollups(
+                meta, int(positions.min()), int(positions.max()), length, stored, valid
+            )
+            del stored, valid
+
+            # readers only see the new points once the meta says they exist
+            meta["length"] = length
+            self._write_meta(meta)
+        return length
+
+    def append_frame(
+        self, data: pd.DataFrame, time_col: str = "DATE_H", value_col: str = "CNT"
+    ) -> int:
+        return self.append(pd.to_datetime(data[time_col]), data[value_col])
+
+    # ---- rollups ---- #
+    def _rollup_path(self, freq: str) -> Path:
+        return self.dir / f"rollup_{freq}.f64"
+
+    @staticmethod
+    def _rollup_origin(meta: dict, freq: str) -> pd.Timestamp:
+        """Start of the store's first period: its first day, or that day's Monday."""
+        day = pd.Timestamp(meta["start"]).normalize()
+        return day - pd.Timedelta(days=day.dayofweek) if freq == "W" else day
+
+    def _update_rollups(
+        self,
+        meta: dict,
+        first: int,
+        last: int,
+        length: int,
+        stored: np.ndarray,
+        valid: np.ndarray,
+    ) -> None:
+        """Recompute the rollup rows of the periods points first..last fall into."""
+        rollups = meta.setdefault("rollups", {})
+        freq_ns = meta["freq_ns"]
+        if ROLLUP_PERIODS["D"].value % freq_ns:
+            # only series finer than a day roll up into days and weeks
+            return
+        start = pd.Timestamp(meta["start"]).value
+        for freq, period in ROLLUP_PERIODS.items():
+            origin = self._rollup_origin(meta, freq).value
+            lo_period = (start + first * freq_ns - origin) // period.value
+            hi_period = (start + last * freq_ns - origin) // period.value + 1
+            # all points of the affected periods, not only the appended ones
+            lo = max(-(-(origin + lo_period * period.value - start) // freq_ns), 0)
+            hi = min(-(-(origin + hi_period * period.value - start) // freq_ns), length)
+            mask = _valid_mask(valid, lo, hi)
+            points = pd.DataFrame(
+                {
+                    "DATE_H": pd.to_datetime(
+                        start + (lo + np.flatnonzero(mask)) * freq_ns
+                    ),
+                    "CNT": stored[lo:hi][mask],
+                }
+            )
+            periods = rollup(points, freq)
+
+            rows = max(rollups.get(freq, 0), hi_period)
+            path = self._rollup_path(freq)
+            stored_rows = (
+                path.stat().st_size // (8 * len(AGGREGATES)) if path.exists() else 0
+            )
+            if rows > stored_rows:
+                with open(path, "ab") as file:
+                    np.tile(EMPTY_ROLLUP, rows - stored_rows).tofile(file)
+            table = np.memmap(path, np.float64, "r+", shape=(rows, len(AGGREGATES)))
+            table[lo_period:hi_period] = EMPTY_ROLLUP
+            index = (periods.index.as_unit("ns").asi8 - origin) // period.value
+            table[index] = periods.to_numpy()
+            table.flush()
+            del table
+            rollups[freq] = int(rows)
+
+    def _build_rollups(self) -> None:
+        """Rollups of a store written before they were kept, from all its points."""
+        with file_lock(self.dir / ".lock"):
+            meta = self.meta()
+            if meta is None or meta["length"] == 0 or "rollups" in meta:
+                return
+            stored, valid = self._map(meta)
+            self._update_rollups(
+                meta, 0, meta["length"] - 1, meta["length"], stored, valid
+            )
+            del stored, valid
+            self._write_meta(meta)
+        log.info(f"rollups of the {self._kpi_name} store built")
+
+    def rollup(self, freq: str = "D", start=None, end=None) -> pd.DataFrame:
+        """Daily ("D") or weekly ("W") aggregates of the stored points.
+
+        Same layout as `shared.rollups.rollup`, read from the rows `append` keeps up
+        to date. Only periods that lie entirely within start <= t < end are returned,
+        so a training window never sees aggregates of later points; periods without
+        points are left out.
+        """
+        if freq not in ROLLUP_PERIODS:
+            raise ValueError(f"unsupported rollup frequency: {freq}")
+        meta = self.meta()
+        if meta is not None and meta["length"] and "rollups" not in meta:
+            self._build_rollups()
+            meta = self.meta()
+        rows = (meta or {}).get("rollups", {}).get(freq, 0)
+        if rows == 0:
+            return pd.DataFrame(
+                columns=AGGREGATES, index=pd.DatetimeIndex([], name="period")
+            )
+
+        period = ROLLUP_PERIODS[freq]
+        table = np.memmap(
+            self._rollup_path(freq), np.float64, "r", shape=(rows, len(AGGREGATES))
+        )
+        index = pd.date_range(
+            self._rollup_origin(meta, freq), periods=rows, freq=period, name="period"
+        )
+        data = pd.DataFrame(np.array(table), index=index, columns=AGGREGATES)
+        keep = data["count"].to_numpy() > 0
+        if start is not None:
+            keep &= index >= pd.Timestamp(start)
+        if end is not None:
+            keep &= index + period <= pd.Timestamp(end)
+        return data[keep]
+
+    @timed("store_sync")
+    def sync(
+        self,
+        source: BaseDataSource,
+        time_col: str = "DATE_H",
+        value_col: str = "CNT",
+    ) -> int:
+        """Append whatever the source has after the stored end."""
+        data = source.read(
+            parse_dates=[time_col],
+            start=self.end,
+            columns=[time_col, value_col],
+            time_col=time_col,
+        )
+        if data.empty:
+            return self.length
+        log.info(f"{len(data)} new points of {self._kpi_name} added to the store")
+        return self.append_frame(data, time_col, value_col)
+
+    # ---- reading ---- #
+    def _bounds(self, meta: dict, start, end) -> tuple[int, int]:
+        first = pd.Timestamp(meta["start"]).value
+        lo, hi = 0, meta["length"]
+        if start is not None:
+            lo = -(-(pd.Timestamp(start).value - first) // meta["freq_ns"])
+        if end is not None:
+            hi = -(-(pd.Timestamp(end).value - first) // meta["freq_ns"])
+        lo, hi = min(max(lo, 0), meta["length"]), min(max(hi, 0), meta["length"])
+        return lo, max(lo, hi)
+
+    def window(
+        self, start=None, end=None
+    ) -> tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+        """Points with start <= timestamp < end, without copying the values.
+
+        Returns:
+            tuple: the timestamps, a read-only view of the values (NaN in gaps) and
+            the validity mask.
+        """
+        meta = self.meta()
+        if meta is None:
+            return pd.DatetimeIndex([]), np.empty(0), np.empty(0, dtype=bool)
+        lo, hi = self._bounds(meta, start, end)
+        values, valid = self._map(meta)
+
+        times = pd.date_range(
+            pd.Timestamp(meta["start"]) + lo * pd.Timedelta(meta["freq_ns"], "ns"),
+            periods=hi - lo,
+            freq=meta["freq"],
+        )
+        return times, values[lo:hi], _valid_mask(valid, lo, hi)
+
+    def to_frame(
+        self,
+        start=None,
+        end=None,
+        time_col: str = "DATE_H",
+        value_col: str = "CNT",
+        keep_gaps: bool = False,
+    ) -> pd.DataFrame:
+        """The window as a raw KPI frame; gaps are left out unless `keep_gaps`."""
+        times, values, mask = self.window(start, end)
+        if not keep_gaps:
+            times, values = times[mask], values[mask]
+        return pd.DataFrame({time_col: times, value_col: np.array(values)})
+
+
+class StoreDataSource(BaseDataSource):
+    def __init__(
+        self,
+        store: SeriesStore,
+        upstream: BaseDataSource | None = None,
+        kpi_name: str = "",
+    ) -> None:
+        """
+        Read a KPI from its memory-mapped store.
+
+        :param store: the KPI's series store.
+        :param upstream: connector new points are synced from before every read.
+        :param kpi_name: KPI the data belongs to, used for metrics.
+        """
+        self._store = store
+        self._upstream = upstream
+        self._kpi_name = kpi_name
+
+    @timed("read")
+    def read(
+        self,
+        parse_dates: list = [],
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ) -> pd.DataFrame:
+        if self._upstream is not None:
+            self._store.sync(self._upstream, time_col=time_col)
+        data = self._store.to_frame(start, end, time_col=time_col)
+        return data if columns is None else data[columns]
+
+    def get_store(self) -> SeriesStore:
+        return self._store
+
+
+def main():
+    store = SeriesStore("kpi_a")
+    print(store.meta())
+    times, values, mask = store.window()
+    print(len(times), int(mask.sum()))
+
+
+if __name__ == "__main__":
+    main()
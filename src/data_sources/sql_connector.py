@@ -0,0 +1,292 @@
+import importlib
+import json
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from data_sources.base_connector import BaseDataSource
+from logger.logger import get_logger
+from shared.metrics import timed
+
+log = get_logger()
+
+# DB-API driver module used when the config does not name one
+DEFAULT_DRIVERS = {
+    "oracle": "oracledb",
+    "sqlite": "sqlite3",
+}
+
+
+class ConnectionPool:
+    """A small thread-safe pool of DB-API connections.
+
+    Connections are opened lazily up to `size` and handed back to the pool after use,
+    so repeated reads reuse the same sessions instead of reconnecting.
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        size: int = 4,
+        timeout: float = 30.0,
+        paramstyle: str = "named",
+    ):
+        self._connect = connect
+        self.paramstyle = paramstyle
+        self._size = size
+        self._timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self._size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self._timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no free connection after {self._timeout}s")
+
+    def _discard(self, conn) -> None:
+        with self._lock:
+            self._opened -= 1
+        try:
+            conn.close()
+        except Exception:
+            log.exception("failed to close a broken connection")
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            # the session may be unusable after a failed statement, don't reuse it
+            self._discard(conn)
+            raise
+        else:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(driver: str, connect_args: dict, size: int = 4) -> ConnectionPool:
+    """Process-wide pool for one driver and set of connection arguments."""
+    key = json.dumps([driver, connect_args], sort_keys=True, default=str)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            module = importlib.import_module(driver)
+            connect_args = dict(connect_args)
+            # passwords are never stored in the KPI config, only the env var holding it
+            password_env = connect_args.pop("password_env", None)
+            if password_env:
+                connect_args["password"] = os.environ[password_env]
+            if driver == "sqlite3":
+                # pooled connections are handed to whichever thread asks next
+                connect_args.setdefault("check_same_thread", False)
+            pool = ConnectionPool(
+                lambda: module.connect(**connect_args),
+                size,
+                paramstyle=getattr(module, "paramstyle", "named"),
+            )
+            _pools[key] = pool
+    return pool
+
+
+class SQLDataSource(BaseDataSource):
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        query: str,
+        params: dict | list | None = None,
+        chunk_size: int = 10000,
+        server_side: bool = False,
+        kpi_name: str = "",
+    ) -> None:
+        """
+        Read a KPI with a parameterized query over a pooled DB-API connection.
+
+        :param pool: connection pool to borrow a connection from.
+        :param query: query text, using the driver's paramstyle for parameters.
+        :param params: query parameters.
+        :param chunk_size: rows fetched per round trip.
+        :param server_side: open a named (server-side) cursor where the driver
+            supports it, so the result set is streamed instead of materialised.
+        :param kpi_name: KPI the data belongs to, used for metrics.
+        """
+        self._pool = pool
+        self._query = query
+        self._params = params or {}
+        self._chunk_size = chunk_size
+        self._server_side = server_side
+        self._kpi_name = kpi_name
+
+    def _cursor(self, conn):
+        if self._server_side:
+            try:
+                # psycopg style named cursors live on the server
+                return conn.cursor(name=f"kpi_read_{self._kpi_name or id(self)}")
+            except TypeError:
+                pass
+        cursor = conn.cursor()
+        cursor.arraysize = self._chunk_size
+        if hasattr(cursor, "prefetchrows"):
+            # oracledb: fill the first round trip as well
+            cursor.prefetchrows = self._chunk_size + 1
+        return cursor
+
+    def _fetch_columns(self, query: str, params) -> dict[str, np.ndarray]:
+        with self._pool.connection() as conn:
+            cursor = self._cursor(conn)
+            try:
+                cursor.execute(query, params)
+                names = [column[0] for column in cursor.description]
+                parts: list[list[np.ndarray]] = [[] for _ in names]
+                while True:
+                    rows = cursor.fetchmany(self._chunk_size)
+                    if not rows:
+                        break
+                    # transpose the chunk once and keep it column by column
+                    for part, values in zip(parts, zip(*rows)):
+                        part.append(np.asarray(values))
+            finally:
+                cursor.close()
+
+        return {
+            name: np.concatenate(part) if part else np.array([])
+            for name, part in zip(names, parts)
+        }
+
+    def _placeholder(self, name: str, params) -> str:
+        """Placeholder for an extra bind parameter in the driver's paramstyle."""
+        if isinstance(params, dict):
+            return f"%({name})s" if self._pool.paramstyle == "pyformat" else f":{name}"
+        # positional params in a named driver (oracledb) bind by position as :1, :2
+        if self._pool.paramstyle in ("numeric", "named"):
+            return f":{len(params) + 1}"
+        return "%s" if self._pool.paramstyle == "format" else "?"
+
+    def _bind(self, name: str, value, params):
+        placeholder = self._placeholder(name, params)
+        if isinstance(params, dict):
+            params[name] = value
+        else:
+            params.append(value)
+        return placeholder
+
+    def _pushdown(self, start, end, columns, time_col) -> tuple[str, dict | list]:
+        """Wrap the configured query so the database applies the window and columns."""
+        params = (
+            dict(self._params) if isinstance(self._params, dict) else list(self._params)
+        )
+        select = ", ".join(columns) if columns is not None else "*"
+
+        where = []
+        if start is not None:
+            value = pd.Timestamp(start).to_pydatetime()
+            where.append(f"{time_col} >= {self._bind('kpi_start', value, params)}")
+        if end is not None:
+            value = pd.Timestamp(end).to_pydatetime()
+            where.append(f"{time_col} < {self._bind('kpi_end', value, params)}")
+
+        query = f"select {select} from ({self._query}) kpi_src"
+        if where:
+            query += " where " + " and ".join(where)
+        return query, params
+
+    @timed("read")
+    def read(
+        self,
+        parse_dates: list = [],
+        start=None,
+        end=None,
+        columns: list | None = None,
+        time_col: str = "DATE_H",
+    ) -> pd.DataFrame:
+        if start is None and end is None and columns is None:
+            query, params = self._query, self._params
+        else:
+            query, params = self._pushdown(start, end, columns, time_col)
+
+        data = pd.DataFrame(self._fetch_columns(query, params))
+        for col in parse_dates:
+            if col in data.columns:
+                data[col] = pd.to_datetime(data[col])
+        return data
+
+
+def sql_connector_from_config(kpi_name: str, data_config: dict) -> SQLDataSource:
+    """Build a SQLDataSource from the `data` section of a KPI config."""
+    data_type = data_config["data_type"]
+    driver = data_config.get("driver", DEFAULT_DRIVERS.get(data_type))
+    if driver is None:
+        raise ValueError(f"no DB-API driver configured for data type {data_type}")
+
+    pool = get_pool(
+        driver, data_config.get("connect", {}), data_config.get("pool_size", 4)
+    )
+    return SQLDataSource(
+        pool,
+        data_config["query"],
+        params=data_config.get("params"),
+        chunk_size=data_config.get("chunk_size", 10000),
+        server_side=data_config.get("server_side", False),
+        kpi_name=kpi_name,
+    )
+
+
+def main():
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+
+    db_path = Path(tempfile.mkdtemp()) / "kpi.db"
+    hours = pd.date_range("2024-01-01", periods=24 * 30, freq="h")
+    with sqlite3.connect(db_path) as conn:
+        pd.DataFrame({"DATE_H": hours.astype(str), "CNT": range(len(hours))}).to_sql(
+            "kpi_a", conn, index=False
+        )
+
+    source = sql_connector_from_config(
+        "kpi_a",
+        {
+            "data_type": "sqlite",
+            "connect": {"database": str(db_path)},
+            "query": "select DATE_H, CNT from kpi_a where CNT >= :min_cnt",
+            "params": {"min_cnt": 10},
+            "chunk_size": 100,
+        },
+    )
+    print(source.read(parse_dates=["DATE_H"]).info())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from models.get_model import get_model
 from data_sources.get_connector import get_connector
-from shared.split_data import split_data
 from shared.to_date import to_date
 import pandas as pd
 from shared.plot_models import plot_forecast
@@ -23,10 +22,7 @@ def predict_kpi(
 
 def main():
     conn = get_connector(kpi_name)
-    data = conn.read(parse_dates=["DATE_H"])
-    _, test = split_data(
-        data, split_col="DATE_H", split_date=to_date("14040320", "yyyymmdd", "persian")
-    )
+    test = conn.scan(start=to_date("14040320", "yyyymmdd", "persian"))
     predict_kpi(kpi_name, test, True)
 
 
@@ -1,6 +1,5 @@
 from models.get_model import get_model
 from data_sources.get_connector import get_connector
-from shared.split_data import split_data
 from shared.to_date import to_date
 import pandas as pd
 
@@ -21,10 +20,8 @@ def train_kpi(kpi_name: str, save_flag: bool = False) -> None:
         data_conn = get_connector(
             kpi_name,
         )
-        data = data_conn.read(parse_dates=["DATE_H"])
-        train, _ = split_data(
-            data, to_date("14040601", "yyyymmdd", "persian"), "DATE_H"
-        )
+        # only the training window is fetched, as pandas only when the model gets it
+        train = data_conn.scan(end=to_date("14040601", "yyyymmdd", "persian"))
     except:
         raise Exception("the connection is out of access!")
     else:
@@ -1,9 +1,34 @@
 from abc import ABC, abstractmethod
+from functools import wraps
 from pandas import DataFrame
+from shared.frame_backend import as_pandas
+
+
+def _pandas_input(method):
+    @wraps(method)
+    def wrapper(self, input_data, *args, **kwargs):
+        return method(self, as_pandas(input_data), *args, **kwargs)
+
+    return wrapper
 
 
 class BaseModel(ABC):
-    """interface for models"""
+    """interface for models
+
+    `fit` and `predict` get pandas: polars and arrow frames (see shared.frame_backend)
+    are converted here, unless the model sets `native_frames` and pre-processes them
+    in their own backend.
+    """
+
+    native_frames = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.native_frames:
+            return
+        for name in ("fit", "predict"):
+            if name in cls.__dict__:
+                setattr(cls, name, _pandas_input(cls.__dict__[name]))
 
     @abstractmethod
     def fit(
@@ -20,6 +45,7 @@ class BaseModel(ABC):
         input_data,
         date_col: str = "timestamp",
         value_col: str = "value",
+        validate: bool = True,
     ) -> DataFrame:
         pass
 
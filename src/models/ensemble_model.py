@@ -0,0 +1,419 @@
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from logger.logger import get_logger
+from models.base_model import BaseModel
+from models.hybrid_model import HybridAnomalyDetector
+from models.isolation_forest_model import FEATURE_COLS, isolation_features
+from models.model_store import ModelStore
+from models.prophet_model import ProphetModel
+from models.stl_model import fit_stl_arima, forecast_stl_arima
+from shared import metrics
+from shared.anomaly_rules import same_hour_zscore
+from shared.frame_backend import backend_of
+from shared.lean import HOUR_NS, epoch_ns, fill_hours
+from shared.metrics import record_anomalies, timed
+from shared.validation import validate_kpi_data
+
+log = get_logger()
+
+
+def prepare(
+    input_data: pd.DataFrame,
+    time_col: str = "DATE_H",
+    value_col: str = "CNT",
+    validate: bool = True,
+) -> pd.DataFrame:
+    """Raw KPI data as the sorted, zero-filled hourly ds/y frame all members share.
+
+    Same grid as `fill_range` + `ProphetModel._pre_process`, built in one numpy pass.
+    Polars and arrow frames are validated and filled in their own backend. With
+    `validate=False` the caller has already validated the input.
+    """
+    if not isinstance(input_data, pd.DataFrame):
+        backend = backend_of(input_data)
+        input_data = backend.collect(input_data)
+        if validate:
+            backend.validate(input_data, time_col, value_col)
+        data = backend.to_pandas(backend.fill_range(input_data, time_col, value_col))
+        return pd.DataFrame(
+            {"ds": data["timestamp"], "y": data["value"].astype(np.float64)}
+        )
+
+    if validate:
+        validate_kpi_data(input_data, time_col, value_col)
+    times = epoch_ns(input_data[time_col])
+    values = input_data[value_col].to_numpy(dtype=np.float64)
+    start, grid = fill_hours(times, values, dtype="float64")
+    ds = pd.DatetimeIndex(start + np.arange(len(grid), dtype=np.int64) * HOUR_NS)
+    return pd.DataFrame({"ds": ds, "y": grid}, copy=False)
+
+
+class Member(ABC):
+    """One detector of the ensemble, fitted and scored on the shared ds/y frame.
+
+    `score` returns a severity per row: the member's own score divided by its own
+    threshold, so 1 is the decision boundary of every member and severities can be
+    compared and averaged. NaN marks rows the member cannot score.
+    """
+
+    @abstractmethod
+    def fit(self, data: pd.DataFrame) -> None:
+        pass
+
+    @abstractmethod
+    def score(self, data: pd.DataFrame) -> np.ndarray:
+        pass
+
+
+class ProphetMember(Member):
+    """Prophet forecast, |z| of the residual against the same hour > 2.5."""
+
+    def __init__(self, kpi_name: str, threshold: float = 2.5, **kwargs) -> None:
+        self._kpi_name = kpi_name
+        self._threshold = threshold
+        self._kwargs = kwargs
+        self.model = None
+
+    def fit(self, data: pd.DataFrame) -> None:
+        model = ProphetModel(self._kpi_name, **self._kwargs)
+        model._add_holidays(data)
+        model.model.fit(data[["ds", "y"]])
+        self.model = model.model
+
+    def score(self, data: pd.DataFrame) -> np.ndarray:
+        forecast = self.model.predict(data[["ds"]])
+        residual = data["y"].to_numpy() - forecast["yhat"].clip(lower=0).to_numpy()
+        zscore, history = same_hour_zscore(
+            pd.DataFrame({"ds": data["ds"], "residual": residual}),
+            window=10,
+            min_periods=3,
+        )
+        severity = np.abs(zscore.to_numpy()) / self._threshold
+        return np.where(history.to_numpy() >= 3, severity, np.nan)
+
+
+class HybridMember(Member):
+    """ARIMA forecast, |residual| / MAD > 3 (see HybridAnomalyDetector)."""
+
+    def __init__(self, threshold: float = 3.0, **kwargs) -> None:
+        self._threshold = threshold
+        # the shared frame is validated and filled already
+        self.detector = HybridAnomalyDetector(validate=False, **kwargs)
+
+    @staticmethod
+    def _frame(data: pd.DataFrame) -> pd.DataFrame:
+        return data.rename(columns={"ds": "timestamp", "y": "value"})
+
+    def fit(self, data: pd.DataFrame) -> None:
+        self.detector.fit(self._frame(data))
+
+    def score(self, data: pd.DataFrame) -> np.ndarray:
+        result = self.detector.predict(df=self._frame(data))
+        return result["score"].to_numpy(dtype=float) / self._threshold
+
+
+class IsolationForestMember(Member):
+    """Isolation Forest on lag, rolling and calendar features.
+
+    The severity is 1 on the forest's decision boundary and grows by one for every
+    standard deviation (of the training decisions) below it.
+    """
+
+    def __init__(self, contamination: float = 0.05, random_state: int = 42) -> None:
+        self.forest = IsolationForest(
+            contamination=contamination, random_state=random_state
+        )
+        self._spread = 1.0
+
+    @staticmethod
+    def _features(data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        features = isolation_features(
+            data.rename(columns={"ds": "DATE_H", "y": "CNT"})
+        )[FEATURE_COLS].to_numpy(dtype=float)
+        return features, ~np.isnan(features).any(axis=1)
+
+    def fit(self, data: pd.DataFrame) -> None:
+        features, valid = self._features(data)
+        self.forest.fit(features[valid])
+        self._spread = float(self.forest.decision_function(features[valid]).std())
+
+    def score(self, data: pd.DataFrame) -> np.ndarray:
+        features, valid = self._features(data)
+        severity = np.full(len(data), np.nan)
+        if valid.any():
+            decision = self.forest.decision_function(features[valid])
+            severity[valid] = np.maximum(1 - decision / (self._spread or 1.0), 0)
+        return severity
+
+
+class STLMember(Member):
+    """STL + ARIMA forecast past the training data, |residual| / training std > 4.
+
+    Only rows after the last training hour can be scored.
+    """
+
+    def __init__(self, arima_order=(1, 0, 1), threshold_sigma: float = 4.0) -> None:
+        self._arima_order = tuple(arima_order)
+        self._threshold = threshold_sigma
+        self.fitted = None
+
+    def fit(self, data: pd.DataFrame) -> None:
+        self.fitted = fit_stl_arima(
+            data.rename(columns={"ds": "DATE_H", "y": "CNT"}), self._arima_order
+        )
+
+    def score(self, data: pd.DataFrame) -> np.ndarray:
+        steps = (epoch_ns(data["ds"]) - self.fitted["end"].value) // HOUR_NS
+        ahead = steps >= 1
+        severity = np.full(len(data), np.nan)
+        if ahead.any():
+            fitted = forecast_stl_arima(self.fitted, int(steps.max()))
+            residual = data["y"].to_numpy()[ahead] - fitted[steps[ahead] - 1]
+            # the training residuals' spread, the scored batch may be a single row
+            scale = self.fitted["resid_std"] or 1.0
+            severity[ahead] = np.abs(residual / scale) / self._threshold
+        return severity
+
+
+MEMBERS = {
+    "prophet": ProphetMember,
+    "hybrid": HybridMember,
+    "iforest": IsolationForestMember,
+    "stl": STLMember,
+}
+
+
+def _fit_member(member: Member, data: pd.DataFrame) -> tuple:
+    """Fit in a worker; the member is sent back, a process pool fits a copy."""
+    started = time.perf_counter()
+    member.fit(data)
+    return member, time.perf_counter() - started
+
+
+def _score_member(member: Member, data: pd.DataFrame) -> tuple:
+    started = time.perf_counter()
+    severity = member.score(data)
+    return severity, time.perf_counter() - started
+
+
+def combine_votes(severity: np.ndarray, min_votes: int) -> tuple:
+    """Flag rows where at least `min_votes` members are past their threshold.
+
+    Args:
+        severity (np.ndarray): (rows, members) severities, NaN counts as no vote.
+
+    Returns:
+        tuple: votes per row and the 0/1 anomaly flags.
+    """
+    votes = (np.nan_to_num(severity, nan=0.0) > 1).sum(axis=1)
+    return votes, (votes >= min_votes).astype(int)
+
+
+def fuse_scores(severity: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Weighted mean severity per row over the members that scored it."""
+    scored = ~np.isnan(severity)
+    total = (np.where(scored, severity, 0) * weights).sum(axis=1)
+    weight = (scored * weights).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(weight > 0, total / weight, np.nan)
+
+
+class EnsembleModel(BaseModel):
+    """Several detectors run concurrently on one shared pre-processing.
+
+    The input is turned into the hourly ds/y frame once and handed to every member;
+    members fit and score in parallel on a thread (or process) pool. Their severities
+    are combined by voting (`combine="vote"`, at least `min_votes` members flag a row)
+    or by score fusion (`combine="score"`, the weighted mean severity exceeds
+    `threshold`). A member still running after `timeout` seconds is left out of that
+    prediction instead of delaying it; `report` holds every member's status and
+    latency of the last fit or predict.
+    """
+
+    # prepare validates and fills polars and arrow frames in their own backend
+    native_frames = True
+
+    def __init__(
+        self,
+        kpi_name: str,
+        members: list | tuple = ("prophet", "hybrid", "iforest"),
+        combine: str = "vote",
+        min_votes: int | None = None,
+        weights: dict | None = None,
+        threshold: float = 1.0,
+        timeout: float | None = None,
+        executor: str = "thread",
+        max_workers: int | None = None,
+        member_params: dict | None = None,
+    ) -> None:
+        """
+        :param members: names of the members, see MEMBERS.
+        :param combine: "vote" or "score".
+        :param min_votes: votes needed to flag a row, a majority of the members that
+            answered by default.
+        :param weights: weight per member name for score fusion, 1 by default.
+        :param threshold: fused severity above which a row is flagged.
+        :param timeout: seconds a prediction waits for its members.
+        :param executor: "thread" or "process"; processes pickle the members and
+            the data for every call, worth it only for CPU-bound members.
+        :param max_workers: pool size, one worker per member by default.
+        :param member_params: keyword arguments per member name.
+        """
+        unknown = set(members) - set(MEMBERS)
+        if unknown:
+            raise ValueError(f"unknown ensemble members: {sorted(unknown)}")
+        if combine not in ("vote", "score"):
+            raise ValueError(f"unknown combine mode: {combine}")
+        self._kpi_name = kpi_name
+        self._combine = combine
+        self._min_votes = min_votes
+        self._weights = weights or {}
+        self._threshold = threshold
+        self._timeout = timeout
+        self._executor = executor
+        self._max_workers = max_workers
+        member_params = member_params or {}
+        self.members: dict[str, Member] = {}
+        for name in members:
+            params = dict(member_params.get(name) or {})
+            if name == "prophet":
+                params["kpi_name"] = kpi_name
+            self.members[name] = MEMBERS[name](**params)
+        self.report: dict[str, dict] = {}
+        self.version: str | None = None
+
+    def _pool(self):
+        workers = self._max_workers or len(self.members)
+        if self._executor == "process":
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def _run(self, func, data: pd.DataFrame, timeout: float | None) -> dict:
+        """Run `func(member, data)` for every member; results of the ones in time."""
+        pool = self._pool()
+        futures = {
+            pool.submit(func, member, data): name
+            for name, member in self.members.items()
+        }
+        started = time.perf_counter()
+        done, _ = wait(futures, timeout=timeout)
+        # late members keep running in the background, nothing waits for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        results, self.report = {}, {}
+        for future, name in futures.items():
+            if future not in done:
+                seconds = time.perf_counter() - started
+                self.report[name] = {"status": "timeout", "seconds": round(seconds, 3)}
+                log.warning(f"{self._kpi_name} member {name} timed out")
+                continue
+            try:
+                result, seconds = future.result()
+            except Exception as e:
+                self.report[name] = {"status": "error", "error": repr(e)}
+                log.exception(f"{self._kpi_name} member {name} failed")
+                continue
+            results[name] = result
+            self.report[name] = {"status": "ok", "seconds": round(seconds, 3)}
+            if metrics.is_enabled():
+                metrics.STAGE_SECONDS.observe(seconds, f"member_{name}", self._kpi_name)
+        log.info(f"{self._kpi_name} ensemble members: {self.report}")
+        return results
+
+    @timed("fit")
+    def fit(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+    ):
+        data = prepare(input_data)
+        log.info("data processed for training.")
+        fitted = self._run(_fit_member, data, timeout=None)
+        if not fitted:
+            raise RuntimeError(
+                f"no ensemble member of {self._kpi_name} could be fitted"
+            )
+        # members that failed to fit are left out of the ensemble
+        self.members = fitted
+        log.warning(f"ensemble fitted with {sorted(fitted)}!")
+
+    @timed("predict")
+    def predict(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+        validate: bool = True,
+    ) -> pd.DataFrame:
+        """Score the input with every member and combine their severities.
+
+        Adds a `<member>_score` column per member that answered in time, `votes`,
+        the fused `score` and `anomaly`; `data.attrs["members"]` is the report.
+        """
+        data = prepare(input_data, validate=validate)
+        log.info("data processed for predicting.")
+        scores = self._run(_score_member, data, timeout=self._timeout)
+        if not scores:
+            raise RuntimeError(f"no ensemble member of {self._kpi_name} answered")
+
+        names = list(scores)
+        severity = np.column_stack([scores[name] for name in names])
+        for i, name in enumerate(names):
+            data[f"{name}_score"] = severity[:, i]
+
+        weights = np.array([self._weights.get(name, 1.0) for name in names])
+        data["score"] = fuse_scores(severity, weights)
+        min_votes = self._min_votes or len(names) // 2 + 1
+        data["votes"], vote_flags = combine_votes(severity, min_votes)
+        if self._combine == "vote":
+            data["anomaly"] = vote_flags
+        else:
+            data["anomaly"] = (data["score"].to_numpy() > self._threshold).astype(int)
+
+        data.attrs["members"] = self.report
+        record_anomalies(self._kpi_name, data["anomaly"])
+        log.info("prediction completed.")
+        return data
+
+    def save(
+        self,
+    ) -> None:
+        self.version = ModelStore(self._kpi_name, "ensemble").publish(self.members)
+        log.info(f"ensemble members {sorted(self.members)} saved")
+
+    @timed("load")
+    def load(
+        self,
+    ):
+        try:
+            self.members, self.version = ModelStore(self._kpi_name, "ensemble").load()
+        except Exception as e:
+            log.exception("failed to load ensemble!")
+            raise e
+        log.info(f"ensemble version {self.version} loaded successfully")
+
+    def get_model(self):
+        return self.members
+
+
+def main():
+    from shared.synthetic_kpi import generate_series
+
+    data, _ = generate_series(periods=24 * 60, seed=0)
+    train, test = data.iloc[: 24 * 45], data.iloc[24 * 45 :]
+    model = EnsembleModel("kpi_a", members=("prophet", "hybrid", "iforest", "stl"))
+    model.fit(train)
+    result = model.predict(test)
+    print(model.report)
+    print(result["anomaly"].sum(), "anomalies")
+
+
+if __name__ == "__main__":
+    main()
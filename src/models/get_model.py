@@ -1,5 +1,7 @@
 from models.base_model import BaseModel
+from models.ensemble_model import EnsembleModel
 from models.prophet_model import ProphetModel
+from models.segmented_model import SegmentedModel
 from shared.config_loader import get_config
 from shared.path_manager import PathManager
 
@@ -9,10 +11,30 @@ def get_model(kpi_name, **kwargs) -> BaseModel:
     config = get_config(kpi_name)
 
     model_type = config["model"]["model"]
-
-    if model_type == "prophet":
-        model = ProphetModel(kpi_name=kpi_name, **kwargs)
+    segment_col = config["data"].get("segment_col")
+    # tuned Prophet parameters (see backtest.tuning), explicit kwargs win
+    params = {**(config["model"].get("params") or {}), **kwargs}
+
+    if segment_col:
+        # one model per segment value, fitted in parallel
+        return SegmentedModel(
+            kpi_name=kpi_name,
+            segment_col=segment_col,
+            max_workers=config["model"].get("max_workers"),
+            **params,
+        )
+    elif model_type == "prophet":
+        model = ProphetModel(
+            kpi_name=kpi_name,
+            lean=config["model"].get("lean", False),
+            # retrain from the previous saved fit (see ProphetModel.fit)
+            warm_start=config["model"].get("warm_start", False),
+            **params,
+        )
         return model
+    elif model_type == "ensemble":
+        # members, combine, min_votes, weights, timeout, ... (see EnsembleModel)
+        return EnsembleModel(kpi_name=kpi_name, **config["model"].get("ensemble", {}))
     elif model_type == "something":
         return ProphetModel(kpi_name=kpi_name, **kwargs)
     else:
@@ -3,28 +3,58 @@ from shared.split_data import split_data
 from shared.to_date import to_date
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
 from statsmodels.tsa.arima.model import ARIMA
 from sklearn.ensemble import IsolationForest
 import joblib
+from shared.anomaly_rules import flag_name, threshold_flags
+from shared.metrics import timed
+from shared.plot_models import forecast_figure
+from shared.validation import validate_kpi_data
 
 
 class HybridAnomalyDetector:
-    def __init__(self, arima_order=(1, 0, 0), contamination=0.05, random_state=42):
-        """Hybrid ARIMA + Isolation Forest anomaly detector."""
+    def __init__(
+        self,
+        arima_order=(1, 0, 0),
+        contamination=0.05,
+        random_state=42,
+        freq="h",
+        allow_negative=False,
+        validate=True,
+    ):
+        """Hybrid ARIMA + Isolation Forest anomaly detector.
+
+        :param freq: expected spacing of the timestamps.
+        :param allow_negative: accept negative values (KPIs that are not counts).
+        :param validate: validate the input of fit and predict; False when the caller
+            already did.
+        """
         self.arima_order = arima_order
         self.contamination = contamination
         self.random_state = random_state
+        self.freq = freq
+        self.allow_negative = allow_negative
+        self.validate = validate
         self.arima_model = None
         self.iforest_model = None
 
+    def _validate(self, df):
+        if self.validate:
+            validate_kpi_data(
+                df,
+                time_col="timestamp",
+                value_col="value",
+                freq=self.freq,
+                allow_negative=self.allow_negative,
+            )
+
+    @timed("fit")
     def fit(self, df):
         """
         Fit ARIMA + Isolation Forest on training data.
         :param df: DataFrame with columns ['timestamp', 'value']
         """
-        if not {"timestamp", "value"}.issubset(df.columns):
-            raise ValueError("DataFrame must contain 'timestamp' and 'value' columns.")
+        self._validate(df)
 
         # Ensure timestamp is datetime and sorted
         df = df.copy()
@@ -44,12 +74,18 @@ class HybridAnomalyDetector:
         )
         self.iforest_model.fit(residuals.values.reshape(-1, 1))
 
-    def predict(self, timestamp=None, value=None, df=None) -> pd.DataFrame:
+    @timed("predict")
+    def predict(
+        self, timestamp=None, value=None, df=None, thresholds: list | None = None
+    ) -> pd.DataFrame:
         """
         Predict anomaly status for:
           1. A single record (timestamp, value)
           2. A DataFrame with 'timestamp' and 'value' columns
 
+        For a DataFrame, `score` is |residual| / MAD and every value in `thresholds`
+        adds an `anomaly_t<threshold>` column flagging score > threshold.
+
         Returns:
           - dict (for single record)
           - DataFrame with expected, residual, anomaly (for batch)
@@ -78,12 +114,8 @@ class HybridAnomalyDetector:
 
         # --- Case 2: batch dataframe ---
         else:
-            if not {"timestamp", "value"}.issubset(df.columns):
-                raise ValueError(
-                    "DataFrame must contain 'timestamp' and 'value' columns."
-                )
+            self._validate(df)
 
-                """Predict anomalies for a given dataframe with timestamp, value"""
         # Copy and prepare
         df = df.copy()
         df["timestamp"] = pd.to_datetime(df["timestamp"])
@@ -101,17 +133,21 @@ class HybridAnomalyDetector:
         # Residuals
         residuals = df["value"] - forecasts
 
-        # Simple threshold rule
+        # Simple threshold rule: |residual| > 3 x MAD, kept as a raw MAD score
         mad = np.median(np.abs(residuals - np.median(residuals)))
-        threshold = 3 * mad
-
-        anomalies = (np.abs(residuals) > threshold).astype(int)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.abs(residuals.to_numpy()) / mad
 
         # Return appended dataframe
         result = df.copy()
         result["forecast"] = forecasts
         result["residual"] = residuals
-        result["anomaly"] = anomalies
+        result["score"] = score
+        result["anomaly"] = (score > 3).astype(int)
+        if thresholds:
+            flags = threshold_flags(score, thresholds)
+            for i, t in enumerate(thresholds):
+                result[flag_name(t)] = flags[:, i].astype(int)
         return result
 
     def save(self, path):
@@ -123,7 +159,11 @@ class HybridAnomalyDetector:
         self.arima_model, self.iforest_model = joblib.load(path)
 
     def plot_results(
-        self, df: pd.DataFrame, title: str = "Forecast vs Actual with Anomalies"
+        self,
+        df: pd.DataFrame,
+        title: str = "Forecast vs Actual with Anomalies",
+        max_points: int | None = 2000,
+        show: bool = True,
     ):
         """
         Plot actual values, forecasts, thresholds (as grey band), and anomalies with Plotly.
@@ -138,73 +178,43 @@ class HybridAnomalyDetector:
             - 'anomaly' (0/1 flag)
         title : str
             Title of the chart
+        max_points : int, optional
+            Points drawn per line, anomalies are always drawn.
+        show : bool
+            Open the figure; set False to only build it (e.g. for export).
         """
-        fig = go.Figure()
-
-        # Actual values
-        fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=df["value"],
-                mode="lines+markers",
-                name="Actual",
-                line=dict(color="blue"),
-            )
-        )
-
-        # Forecast values
-        fig.add_trace(
-            go.Scatter(
-                x=df.index,
-                y=df["forecast"],
-                mode="lines",
-                name="Forecast",
-                line=dict(color="green", dash="dash"),
-            )
-        )
-
         # Thresholds (MAD-based)
-        mad = np.median(np.abs(df["residual"] - np.median(df["residual"])))
-        threshold = 3 * mad if mad > 0 else 3 * df["residual"].std()
-
-        upper = df["forecast"] + threshold
-        lower = df["forecast"] - threshold
-
-        # Grey shaded area for threshold band
-        fig.add_trace(
-            go.Scatter(
-                x=list(df.index) + list(df.index[::-1]),
-                y=list(upper) + list(lower[::-1]),
-                fill="toself",
-                fillcolor="rgba(128,128,128,0.2)",  # semi-transparent grey
-                line=dict(color="rgba(255,255,255,0)"),  # no border line
-                hoverinfo="skip",
-                showlegend=True,
-                name="Threshold Band",
-            )
+        residual = df["residual"].to_numpy(dtype=float)
+        mad = np.nanmedian(np.abs(residual - np.nanmedian(residual)))
+        threshold = 3 * mad if mad > 0 else 3 * np.nanstd(residual, ddof=1)
+
+        forecast = df["forecast"].to_numpy(dtype=float)
+        plot_data = pd.DataFrame(
+            {
+                "value": df["value"].to_numpy(),
+                "forecast": forecast,
+                "upper": forecast + threshold,
+                "lower": forecast - threshold,
+                "anomaly": df["anomaly"].to_numpy(),
+            },
+            index=df.index,
         )
-
-        # Anomalies (red dots)
-        anomalies = df[df["anomaly"] == 1]
-        fig.add_trace(
-            go.Scatter(
-                x=anomalies.index,
-                y=anomalies["value"],
-                mode="markers",
-                name="Anomalies",
-                marker=dict(color="red", size=10, symbol="circle"),
-            )
-        )
-
-        fig.update_layout(
+        fig = forecast_figure(
+            plot_data,
+            timestamp_col=None,
+            value_col="value",
+            pred_col="forecast",
+            upper_col="upper",
+            lower_col="lower",
             title=title,
-            xaxis_title="Timestamp",
-            yaxis_title="Value",
-            template="plotly_white",
-            legend=dict(x=0, y=1.1, orientation="h"),
+            max_points=max_points,
+            band_name="Threshold Band",
         )
+        fig.update_layout(xaxis_title="Timestamp")
 
-        fig.show()
+        if show:
+            fig.show()
+        return fig
 
 
 def main():
@@ -219,7 +229,6 @@ def main():
     model.fit(train)
     result = model.predict(df=test)
     print(result.head())
-    result.sort_index(inplace=True)
     model.plot_results(result)
 
 
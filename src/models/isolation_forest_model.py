@@ -1,11 +1,37 @@
 import pandas as pd
 from sklearn.ensemble import IsolationForest
-from shared.plotting import plot_kpi_anomalies
-from data_sources.get_connector import get_connector
 
+# features the Isolation Forest is trained on
+FEATURE_COLS = [
+    "CNT",
+    "lag1",
+    "lag24",
+    "roll_mean_24",
+    "roll_std_24",
+    "hour",
+    "dow",
+]
 
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+
+def isolation_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the calendar, lag and rolling features to time-sorted DATE_H/CNT data.
+
+    The first rows, whose lags or rolling windows are incomplete, hold NaN.
+    """
+    df = df.copy()
+
+    # Calendar features
+    df["hour"] = df["DATE_H"].dt.hour
+    df["dow"] = df["DATE_H"].dt.dayofweek
+
+    # Lag features
+    df["lag1"] = df["CNT"].shift(1)
+    df["lag24"] = df["CNT"].shift(24)
+
+    # Rolling statistics
+    df["roll_mean_24"] = df["CNT"].rolling(24).mean()
+    df["roll_std_24"] = df["CNT"].rolling(24).std()
+    return df
 
 
 def isolation_forest_anomaly_features(df: pd.DataFrame):
@@ -29,18 +55,7 @@ def isolation_forest_anomaly_features(df: pd.DataFrame):
     df = df.copy()
     df["DATE_H"] = pd.to_datetime(df["DATE_H"])
     df = df.sort_values("DATE_H").reset_index(drop=True)
-
-    # Calendar features
-    df["hour"] = df["DATE_H"].dt.hour
-    df["dow"] = df["DATE_H"].dt.dayofweek
-
-    # Lag features
-    df["lag1"] = df["CNT"].shift(1)
-    df["lag24"] = df["CNT"].shift(24)
-
-    # Rolling statistics
-    df["roll_mean_24"] = df["CNT"].rolling(24).mean()
-    df["roll_std_24"] = df["CNT"].rolling(24).std()
+    df = isolation_features(df)
 
     # Drop first few rows with NaNs
     df = df.dropna().reset_index(drop=True)
@@ -51,15 +66,7 @@ def isolation_forest_anomaly_features(df: pd.DataFrame):
     df.loc[split_idx + 1 :, "set"] = "test"
 
     # Features for model
-    feature_cols = [
-        "CNT",
-        "lag1",
-        "lag24",
-        "roll_mean_24",
-        "roll_std_24",
-        "hour",
-        "dow",
-    ]
+    feature_cols = FEATURE_COLS
     train_data = df.loc[df["set"] == "train", feature_cols]
     test_data = df.loc[df["set"] == "test", feature_cols]
 
@@ -75,6 +82,9 @@ def isolation_forest_anomaly_features(df: pd.DataFrame):
 
 
 def main():
+    from shared.plotting import plot_kpi_anomalies
+    from data_sources.get_connector import get_connector
+
     # Example
     conn = get_connector("kpi_a")
     df = conn.read()
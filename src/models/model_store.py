@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import joblib
+
+from logger.logger import get_logger
+from shared.file_lock import file_lock
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+MANIFEST = "manifest.json"
+LEGACY_LATEST = "model_latest.pkl"
+
+# called as hook(kpi_name, model_type, version) after every publish in this process
+_publish_hooks: list = []
+
+
+def on_publish(hook) -> None:
+    """Register a callback run whenever a new latest version is published."""
+    _publish_hooks.append(hook)
+
+
+def store_stamp(kpi_name: str, path_mgr: PathManager | None = None) -> tuple:
+    """Identity of the manifests (and legacy latest files) of every model type of a KPI.
+
+    A publish replaces the manifest, so the stamp changes whichever process published;
+    comparing stamps costs a few stat calls instead of reading any model.
+    """
+    kpi_dir = (path_mgr or PathManager()).kpi_path(kpi_name)
+    stamp = []
+    for name in (MANIFEST, LEGACY_LATEST):
+        for path in kpi_dir.glob(f"*/{name}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            stamp.append((path.parent.name, name, stat.st_ino, stat.st_mtime_ns))
+    return tuple(sorted(stamp))
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write to a temp file next to `path`, then rename it over `path`."""
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+class ModelStore:
+    """Versioned model artifacts of one KPI with a manifest and a latest pointer.
+
+    Artifacts are written under a temporary name and renamed into place, so readers
+    only ever see complete files. The manifest indexes every version and names the
+    latest one; it is replaced atomically, so listing and loading never scan the
+    directory. Identical artifacts (same content hash) are stored once.
+    """
+
+    def __init__(
+        self,
+        kpi_name: str,
+        model_type: str = "prophet",
+        keep_last: int | None = 10,
+        max_age_days: int | None = None,
+        path_mgr: PathManager | None = None,
+    ) -> None:
+        """
+        :param kpi_name: KPI the models belong to.
+        :param model_type: sub directory of the KPI holding the models.
+        :param keep_last: versions kept by retention, None keeps all.
+        :param max_age_days: versions older than this are removed by retention.
+        """
+        self._kpi_name = kpi_name
+        self._model_type = model_type
+        self.dir = (path_mgr or PathManager()).kpi_path(kpi_name) / model_type
+        self.keep_last = keep_last
+        self.max_age_days = max_age_days
+
+    # ---- manifest ---- #
+    @property
+    def manifest_path(self) -> Path:
+        return self.dir / MANIFEST
+
+    def _read_manifest(self) -> dict:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return {"latest": None, "versions": []}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2))
+
+    def _lock(self):
+        return file_lock(self.dir / ".lock")
+
+    # ---- reading ---- #
+    def versions(self) -> list[dict]:
+        return self._read_manifest()["versions"]
+
+    def latest(self) -> dict | None:
+        manifest = self._read_manifest()
+        for entry in manifest["versions"]:
+            if entry["version"] == manifest["latest"]:
+                return entry
+        return None
+
+    def load(self, version: str | None = None) -> tuple[object, str]:
+        """Load a version (the latest by default).
+
+        Returns:
+            tuple[object, str]: the model and its version.
+        """
+        for attempt in range(2):
+            manifest = self._read_manifest()
+            wanted = version or manifest["latest"]
+            entry = next(
+                (e for e in manifest["versions"] if e["version"] == wanted), None
+            )
+            if entry is None:
+                break
+            try:
+                return joblib.load(self.dir / entry["file"]), entry["version"]
+            except FileNotFoundError:
+                # pruned between reading the manifest and opening the file, retry once
+                if attempt:
+                    raise
+
+        legacy = self.dir / LEGACY_LATEST
+        if version is None and legacy.exists():
+            log.warning(f"{self._kpi_name} has no manifest, loading {legacy.name}")
+            return joblib.load(legacy), "legacy"
+        raise FileNotFoundError(f"no model version {wanted} in {self.dir}")
+
+    # ---- writing ---- #
+    def publish(self, model) -> str:
+        """Store `model` as a new version and make it the latest.
+
+        Returns:
+            str: the published version (an existing one if the content is identical).
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f".model_{uuid.uuid4().hex}.tmp"
+        try:
+            joblib.dump(model, tmp)
+            sha256 = _file_hash(tmp)
+
+            with self._lock():
+                manifest = self._read_manifest()
+                entry = next(
+                    (e for e in manifest["versions"] if e["sha256"] == sha256), None
+                )
+                if entry is None:
+                    version = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{sha256[:8]}"
+                    entry = {
+                        "version": version,
+                        "file": f"model_{version}.pkl",
+                        "sha256": sha256,
+                        "size": tmp.stat().st_size,
+                        "created": datetime.now().isoformat(timespec="seconds"),
+                    }
+                    os.replace(tmp, self.dir / entry["file"])
+                    manifest["versions"].append(entry)
+                else:
+                    log.info(
+                        f"identical to version {entry['version']}, not stored again"
+                    )
+
+                manifest["latest"] = entry["version"]
+                removed = self._apply_retention(manifest)
+                self._write_manifest(manifest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        # files are removed only once the manifest no longer points to them
+        for file in removed:
+            (self.dir / file).unlink(missing_ok=True)
+        log.info(f"model version {entry['version']} published in {self.dir}")
+        for hook in _publish_hooks:
+            try:
+                hook(self._kpi_name, self._model_type, entry["version"])
+            except Exception:
+                # the version is published, a failing listener must not undo that
+                log.exception(f"publish hook {hook} failed")
+        return entry["version"]
+
+    def _apply_retention(self, manifest: dict) -> list[str]:
+        keep = manifest["versions"]
+        if self.max_age_days is not None:
+            oldest = datetime.now() - timedelta(days=self.max_age_days)
+            keep = [e for e in keep if datetime.fromisoformat(e["created"]) >= oldest]
+        if self.keep_last is not None:
+            keep = keep[-self.keep_last :]
+
+        latest = [e for e in manifest["versions"] if e["version"] == manifest["latest"]]
+        if latest and latest[0] not in keep:
+            keep = keep + latest
+
+        removed = [e["file"] for e in manifest["versions"] if e not in keep]
+        manifest["versions"] = keep
+        return removed
+
+    def prune(self) -> list[str]:
+        """Apply the retention policy now; returns the removed files."""
+        with self._lock():
+            manifest = self._read_manifest()
+            removed = self._apply_retention(manifest)
+            self._write_manifest(manifest)
+        for file in removed:
+            (self.dir / file).unlink(missing_ok=True)
+        return removed
+
+
+def main():
+    store = ModelStore("kpi_a")
+    print(store.versions())
+
+
+if __name__ == "__main__":
+    main()
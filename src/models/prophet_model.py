@@ -1,45 +1,171 @@
-from sys import exception
 from prophet import Prophet
+from prophet.make_holidays import make_holidays_df
 from prophet.plot import plot_weekly
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+import time
 import matplotlib.pyplot as plt
-import joblib
-import shutil
-from datetime import datetime
 from models.base_model import BaseModel
+from models.model_store import ModelStore
 from shared.path_manager import PathManager
 from data_sources.get_connector import get_connector
-from shared.split_data import split_data
+from shared.split_data import split_data, slice_window
 from shared.to_date import to_date
 from shared.plot_models import plot_forecast as mplot
 from shared.fill_range import fill_range
+from shared.anomaly_rules import same_hour_sweep, same_hour_zscore
+from shared.residual_state import ResidualState
+from shared.lean import HOUR_NS, StagePeaks, epoch_ns, fill_hours
+from shared.metrics import timed, record_anomalies
+from shared.frame_backend import as_pandas, backend_of
+from shared.validation import validate_kpi_data
 from logger.logger import get_logger
 import os
 from logger.logger import get_logger
 
-
 log = get_logger()
 
+# rows per Prophet predict call in lean mode
+LEAN_PREDICT_ROWS = 24 * 30
+
+
+@lru_cache(maxsize=32)
+def country_holidays(country: str, first_year: int, last_year: int) -> pd.DataFrame:
+    """Holiday frame of a country, built once per year range and reused between fits."""
+    return make_holidays_df(list(range(first_year, last_year + 1)), country)
+
+
+def warm_start_params(model: Prophet) -> dict:
+    """Initial Stan values taken from a fitted model (MAP or mean of MCMC samples)."""
+    params = {}
+    for name in ["k", "m", "sigma_obs"]:
+        values = model.params[name]
+        params[name] = values[0][0] if model.mcmc_samples == 0 else np.mean(values)
+    for name in ["delta", "beta"]:
+        values = model.params[name]
+        params[name] = values[0] if model.mcmc_samples == 0 else np.mean(values, axis=0)
+    return params
+
 
 class ProphetModel(BaseModel):
-    def __init__(self, kpi_name, **kwargs) -> None:
+    # _pre_process validates and fills polars and arrow frames in their own backend
+    native_frames = True
+
+    def __init__(
+        self, kpi_name, lean: bool = False, warm_start: bool = False, **kwargs
+    ) -> None:
+        """
+        Args:
+            kpi_name (str): KPI the model belongs to.
+            lean (bool): memory-lean pre-processing: float32 values on an int64 epoch
+                grid allocated once, sorted once, no object columns.
+            warm_start (bool): default of `fit`'s warm_start (`model.warm_start` in
+                the KPI config).
+            kwargs: passed to Prophet. A `holidays` frame is kept next to the IR
+                holidays.
+        """
         self.model = Prophet(**kwargs)
+        self._user_holidays = kwargs.get("holidays")
+        self._warm_start = warm_start
         self._kpi_name: str = kpi_name
+        self._kwargs = kwargs
+        self.version: str | None = None
+        self._lean = lean
+        # per-stage peak memory, traced when KPI_TRACE_MEMORY=1
+        self.stage_peaks = StagePeaks()
 
+    @timed("fit")
     def fit(
         self,
         input_data,
         date_col: str = "timestamp",
         value_col: str = "value",
+        warm_start: bool | None = None,
+        window: pd.Timedelta | None = None,
+        previous_model: Prophet | None = None,
     ):
+        """Fit the model, optionally starting from the previous saved fit.
 
+        Args:
+            input_data (pd.DataFrame): raw KPI data.
+            warm_start (bool, optional): initialise the optimiser from the parameters
+                of the latest saved model; falls back to a cold fit if there is none
+                or if its parameters do not match the new model's shape. Defaults to
+                the model's `warm_start`.
+            window (pd.Timedelta, optional): only fit on this much recent history.
+            previous_model (Prophet, optional): fitted model to warm start from
+                instead of the latest saved one.
+        """
         data = self._pre_process(input_data, date_col=date_col, value_col=value_col)
+        if window is not None:
+            data = slice_window(data, start=data["ds"].max() - window, split_col="ds")
         log.info("data processed for training.")
-        self.model.add_country_holidays("IR")
-        log.info("country holidays added to the model")
-        self.model.fit(data)
+
+        self._add_holidays(data)
+
+        init = None
+        if self._warm_start if warm_start is None else warm_start:
+            previous_model = previous_model or self._latest_model()
+            init = previous_model and warm_start_params(previous_model)
+
+        if init is None:
+            self.model.fit(data)
+        else:
+            try:
+                self.model.fit(data, init=init)
+            except Exception:
+                # e.g. a different set of holidays or seasonalities changes beta's size
+                log.warning("warm start failed, fitting from scratch")
+                self.model = Prophet(**self._kwargs)
+                self._add_holidays(data)
+                self.model.fit(data)
         log.warning("model fitted!")
 
+    def _holidays(self, first_year: int, last_year: int) -> pd.DataFrame:
+        holidays = country_holidays("IR", first_year, last_year)
+        if self._user_holidays is not None:
+            holidays = pd.concat([self._user_holidays, holidays], ignore_index=True)
+        # saved with the model, user holidays can reach further than the IR ones
+        self.model.ir_holidays_until = last_year
+        return holidays
+
+    def _add_holidays(self, data: pd.DataFrame) -> None:
+        # the cached holiday frame replaces add_country_holidays("IR"), which rebuilt
+        # it on every fit; one extra year covers predictions past the training data
+        self.model.holidays = self._holidays(
+            data["ds"].min().year, data["ds"].max().year + 1
+        )
+        log.info("country holidays added to the model")
+
+    def _cover_holidays(self, data: pd.DataFrame) -> None:
+        """Add the IR holidays of predicted years past the ones the model has.
+
+        Prophet builds holiday features from `holidays` at predict time as well, so
+        the same holidays of later years can be added to a fitted model.
+        """
+        holidays = self.model.holidays
+        if holidays is None:
+            return
+        covered = getattr(
+            self.model, "ir_holidays_until", pd.to_datetime(holidays["ds"]).max().year
+        )
+        last_year = data["ds"].max().year
+        if last_year > covered:
+            log.info(f"IR holidays of {self._kpi_name} extended to {last_year}")
+            later = country_holidays("IR", covered + 1, last_year)
+            self.model.holidays = pd.concat([holidays, later], ignore_index=True)
+            self.model.ir_holidays_until = last_year
+
+    def _latest_model(self) -> Prophet | None:
+        previous = ProphetModel(self._kpi_name)
+        try:
+            previous.load()
+        except Exception:
+            log.warning(f"no previous model for {self._kpi_name}, cold start")
+            return None
+        return previous.get_model()
+
     def predict_v1(
         self,
         input_data,
@@ -47,6 +173,7 @@ class ProphetModel(BaseModel):
         value_col: str = "value",
     ) -> pd.DataFrame:
         data = self._pre_process(input_data, date_col=date_col, value_col=value_col)
+        self._cover_holidays(data)
         forecast = self.model.predict(data)
         data["yhat"] = forecast["yhat"].clip(lower=0)
         data["yhat_lower"] = forecast["yhat_lower"].clip(lower=0)
@@ -62,54 +189,159 @@ class ProphetModel(BaseModel):
 
         return data
 
-    def predict(
+    def _forecast(
         self,
         input_data: pd.DataFrame,
         date_col: str = "timestamp",
         value_col: str = "value",
+        validate: bool = True,
     ) -> pd.DataFrame:
-        data = self._pre_process(input_data, date_col=date_col, value_col=value_col)
+        """Pre-process the input and add the forecast, its bounds and the residual."""
+        with self.stage_peaks.stage("pre_process"):
+            data = self._pre_process(
+                input_data, date_col=date_col, value_col=value_col, validate=validate
+            )
         log.info("data processed for predicting.")
 
-        forecast = self.model.predict(data)
-        data["yhat"] = forecast["yhat"].clip(lower=0)
-        data["yhat_lower"] = forecast["yhat_lower"].clip(lower=0)
-        data["yhat_upper"] = forecast["yhat_upper"].clip(lower=0)
-        data["residual"] = data["y"] - forecast["yhat"].clip(lower=0)
+        with self.stage_peaks.stage("forecast"):
+            self._cover_holidays(data)
+            if self._lean:
+                # Prophet's uncertainty sampling allocates rows x samples matrices,
+                # predicting a month at a time bounds that peak
+                forecast = pd.concat(
+                    [
+                        self.model.predict(data.iloc[i : i + LEAN_PREDICT_ROWS])
+                        for i in range(0, len(data), LEAN_PREDICT_ROWS)
+                    ],
+                    ignore_index=True,
+                )
+            else:
+                forecast = self.model.predict(data)
+            yhat = forecast["yhat"].clip(lower=0).to_numpy()
+            data["yhat"] = yhat
+            data["yhat_lower"] = forecast["yhat_lower"].clip(lower=0).to_numpy()
+            data["yhat_upper"] = forecast["yhat_upper"].clip(lower=0).to_numpy()
+            data["residual"] = data["y"].to_numpy() - yhat
+            del forecast
+
+        if self._lean:
+            # small ints instead of a column of Python date objects
+            data["hour"] = data["ds"].dt.hour.astype(np.int8)
+        else:
+            data["hour"] = data["ds"].dt.hour
+            data["date"] = data["ds"].dt.date
+        return data
+
+    @timed("predict")
+    def predict(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+        windows: list | None = None,
+        thresholds: list | None = None,
+        validate: bool = True,
+    ) -> pd.DataFrame:
+        """Forecast the input and flag anomalies.
 
-        data["hour"] = data["ds"].dt.hour
-        data["date"] = data["ds"].dt.date
+        Args:
+            input_data (pd.DataFrame): raw KPI data.
+            windows (list, optional): same-hour history lengths to also evaluate.
+            thresholds (list, optional): z-score thresholds to also evaluate; every
+                (window, threshold) pair gets an `anomaly_w<window>_t<threshold>`
+                column, all computed in one pass.
+            validate (bool): validate the input; False when the caller already did.
+        """
+        data = self._forecast(
+            input_data, date_col=date_col, value_col=value_col, validate=validate
+        )
 
-        N = 10
-        anomalies = []
+        with self.stage_peaks.stage("score"):
+            # |z| > 2.5 against the same hour of the past 10 days, with at least 3 days
+            zscore, history = same_hour_zscore(data, window=10, min_periods=3)
+            data["zscore"] = zscore
+            data["anomaly"] = ((zscore.abs() > 2.5) & (history >= 3)).astype(
+                np.int8 if self._lean else int
+            )
+            if windows or thresholds:
+                sweep = same_hour_sweep(data, windows or [10], thresholds or [2.5])
+                data = pd.concat([data, sweep], axis=1)
+        record_anomalies(self._kpi_name, data["anomaly"])
+        if self.stage_peaks.enabled:
+            log.info(
+                f"{self._kpi_name} peak memory per stage: {self.stage_peaks.report()}"
+            )
+        log.info("prediction completed.")
+        return data
 
-        for idx, row in data.iterrows():
-            hour = row["hour"]
-            date = row["date"]
+    def seed_state(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+        period: str = "day",
+        window: int = 10,
+    ) -> ResidualState:
+        """Build and save the streaming residual state from recent history.
 
-            # Get same-hour values from past N days
-            mask = (data["hour"] == hour) & (data["date"] < date)
-            past_values: pd.Series = data["residual"].loc[mask].tail(N)
+        Each bucket keeps only its last `window` residuals, so the last `window` days
+        (weeks for period="week") of history are enough.
+        """
+        data = self._forecast(input_data, date_col=date_col, value_col=value_col)
+        state = ResidualState(self._kpi_name, window=window, period=period)
+        with ResidualState.lock(self._kpi_name, period=period):
+            state.seed(data["ds"], data["residual"]).save()
+        log.info(f"residual state of {self._kpi_name} seeded from {len(data)} rows")
+        return state
 
-            if len(past_values) >= 3:  # need enough data
-                mean = past_values.mean()
-                std = past_values.std()
+    @timed("predict")
+    def predict_stream(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+        period: str = "day",
+        threshold: float = 2.5,
+    ) -> pd.DataFrame:
+        """Score new points against the saved residual state instead of their history.
 
-                z_score = (row["residual"] - mean) / std if std > 0 else 0
-                anomalies.append(1 if abs(z_score) > 2.5 else 0)  # threshold
-            else:
-                anomalies.append(0)
+        The input only needs the new points; the state is updated and saved.
+        """
+        # the new points are few, and their timestamps are needed as pandas below
+        input_data = as_pandas(input_data)
+        data = self._forecast(input_data, date_col=date_col, value_col=value_col)
+        # fill_range pads the input to whole days; hours that have not arrived yet
+        # must not enter the state as zeros
+        data = data[data["ds"].isin(pd.to_datetime(input_data["DATE_H"]))]
+        data = data.reset_index(drop=True)
+        # concurrent scorers of the KPI would otherwise overwrite each other's updates
+        with ResidualState.lock(self._kpi_name, period=period):
+            state = ResidualState.load(self._kpi_name, period=period)
+            scores = state.anomalies(data["ds"], data["residual"], threshold=threshold)
+            state.save()
 
-        data["anomaly"] = anomalies
-        log.info("prediction completed.")
+        data["zscore"] = scores["zscore"].to_numpy()
+        data["anomaly"] = scores["anomaly"].to_numpy()
+        record_anomalies(self._kpi_name, data["anomaly"])
         return data
 
+    @timed("pre_process")
     def _pre_process(
         self,
         data: pd.DataFrame,
         date_col: str,
         value_col: str,
+        validate: bool = True,
     ) -> pd.DataFrame:
+        if not isinstance(data, pd.DataFrame):
+            return self._pre_process_native(data, validate=validate)
+
+        # bad input fails here, before fill_range or Prophet trip over it
+        if validate:
+            validate_kpi_data(data)
+        if self._lean:
+            return self._pre_process_lean(data)
+
         data = fill_range(data)
         data[date_col] = pd.to_datetime(data[date_col], format="%Y-%m-%d %H:%M:%S")
         data.rename(columns={date_col: "ds", value_col: "y"}, inplace=True)
@@ -117,30 +349,59 @@ class ProphetModel(BaseModel):
         data.reset_index(inplace=True, drop=True)
         return data
 
+    def _pre_process_native(
+        self,
+        data,
+        time_col: str = "DATE_H",
+        value_col: str = "CNT",
+        validate: bool = True,
+    ) -> pd.DataFrame:
+        """`_pre_process` of a polars or arrow frame (see shared.frame_backend).
+
+        Validation and gap-filling run in the frame's own backend; pandas is only
+        built from the filled grid. In lean mode the raw points are handed to
+        `_pre_process_lean` instead, which builds its own float32 grid.
+        """
+        backend = backend_of(data)
+        data = backend.collect(data)
+        if validate:
+            backend.validate(data, time_col, value_col)
+        if self._lean:
+            return self._pre_process_lean(backend.to_pandas(data), time_col, value_col)
+        data = backend.to_pandas(backend.fill_range(data, time_col, value_col))
+        return data.rename(columns={"timestamp": "ds", "value": "y"})
+
+    def _pre_process_lean(
+        self, data: pd.DataFrame, time_col: str = "DATE_H", value_col: str = "CNT"
+    ) -> pd.DataFrame:
+        """`fill_range` + `_pre_process` in one pass over numpy arrays.
+
+        The float32 grid is allocated once and becomes the `y` column as is; the
+        timestamps stay implied by the grid until the `ds` column is built.
+        """
+        times = epoch_ns(data[time_col])
+        values = data[value_col].to_numpy(dtype=np.float32)
+        start, grid = fill_hours(times, values)
+
+        ds = pd.DatetimeIndex(start + np.arange(len(grid), dtype=np.int64) * HOUR_NS)
+        return pd.DataFrame({"ds": ds, "y": grid}, copy=False)
+
     def save(
         self,
     ) -> None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        model_name = f"model_{timestamp}.pkl"
-        model_dir = PathManager().kpi_path(self._kpi_name) / "prophet" / model_name
-
-        joblib.dump(self.model, model_dir)
-        shutil.copy(model_dir, model_dir.parent / "model_latest.pkl")
-        log.info(f"model saved in {model_dir}")
+        self.version = ModelStore(self._kpi_name, "prophet").publish(self.model)
 
+    @timed("load")
     def load(
         self,
     ):
-        model_path = (
-            PathManager().kpi_path(self._kpi_name) / "prophet" / "model_latest.pkl"
-        )
         try:
-            model = joblib.load(model_path)
-            self.model = model
-            log.info("model loaded successfully")
+            self.model, self.version = ModelStore(self._kpi_name, "prophet").load()
+            log.info(f"model version {self.version} loaded successfully")
 
-        except exception as e:
+        except Exception as e:
             log.exception("failed to load model!")
+            raise e
 
     def get_model(self):
         return self.model
@@ -154,6 +415,55 @@ class ProphetModel(BaseModel):
         )
 
 
+def compare_warm_start(
+    kpi_name: str,
+    previous_data: pd.DataFrame,
+    data: pd.DataFrame,
+    window: pd.Timedelta | None = None,
+    **kwargs,
+) -> dict:
+    """Compare a cold fit with a fit warm-started from a fit on `previous_data`.
+
+    Returns:
+        dict: wall time of both fits and the drift of the warm fit from the cold one,
+        as the mean absolute difference of their in-sample forecasts (also relative
+        to the mean of y) and the largest absolute difference of their parameters.
+    """
+    previous = ProphetModel(kpi_name, **kwargs)
+    previous.fit(previous_data)
+
+    cold = ProphetModel(kpi_name, **kwargs)
+    started = time.perf_counter()
+    cold.fit(data, window=window)
+    cold_seconds = time.perf_counter() - started
+
+    warm = ProphetModel(kpi_name, **kwargs)
+    started = time.perf_counter()
+    warm.fit(data, warm_start=True, window=window, previous_model=previous.get_model())
+    warm_seconds = time.perf_counter() - started
+
+    history = cold.get_model().history
+    cold_yhat = cold.get_model().predict(history)["yhat"].to_numpy()
+    warm_yhat = warm.get_model().predict(history)["yhat"].to_numpy()
+    cold_params = warm_start_params(cold.get_model())
+    warm_params = warm_start_params(warm.get_model())
+
+    yhat_drift = float(np.mean(np.abs(cold_yhat - warm_yhat)))
+    return {
+        "cold_seconds": cold_seconds,
+        "warm_seconds": warm_seconds,
+        "speedup": cold_seconds / warm_seconds if warm_seconds else np.nan,
+        "yhat_drift": yhat_drift,
+        "yhat_drift_relative": yhat_drift / max(float(history["y"].abs().mean()), 1e-9),
+        "param_drift": {
+            name: float(
+                np.max(np.abs(np.asarray(cold_params[name]) - warm_params[name]))
+            )
+            for name in cold_params
+        },
+    }
+
+
 def main():
     model = ProphetModel(weekly_seasonality=100, kpi_name="sim_activation")
 
@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from logger.logger import get_logger
+from models.base_model import BaseModel
+from models.model_store import ModelStore
+from models.prophet_model import ProphetModel
+from shared.anomaly_rules import same_hour_anomalies
+from shared.metrics import record_anomalies, timed
+
+log = get_logger()
+
+
+def _fit_segment(task: tuple) -> tuple:
+    """Fit one segment's model in a worker process and send back the fitted Prophet."""
+    kpi_name, segment, data, kwargs = task
+    model = ProphetModel(kpi_name=kpi_name, **kwargs)
+    model.fit(data)
+    return segment, model.get_model()
+
+
+class SegmentedModel(BaseModel):
+    """One Prophet model per value of a segment column (region, cell, offer, ...).
+
+    The source is split once with a groupby, segments are fitted on a process pool and
+    all segment models are saved together in a single artifact indexed by segment.
+    """
+
+    def __init__(
+        self,
+        kpi_name: str,
+        segment_col: str,
+        time_col: str = "DATE_H",
+        value_col: str = "CNT",
+        max_workers: int | None = None,
+        **kwargs,
+    ) -> None:
+        self._kpi_name = kpi_name
+        self._segment_col = segment_col
+        self._time_col = time_col
+        self._value_col = value_col
+        self._max_workers = max_workers
+        self._kwargs = kwargs
+        self.models: dict = {}
+        self.version: str | None = None
+
+    def _segments(self, input_data: pd.DataFrame):
+        columns = [self._time_col, self._value_col]
+        for segment, data in input_data.groupby(self._segment_col, sort=True):
+            yield segment, data[columns]
+
+    @timed("fit")
+    def fit(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+    ):
+        tasks = [
+            (self._kpi_name, segment, data, self._kwargs)
+            for segment, data in self._segments(input_data)
+        ]
+        log.info(f"fitting {len(tasks)} segments of {self._kpi_name}")
+
+        if self._max_workers == 1 or len(tasks) <= 1:
+            self.models = dict(map(_fit_segment, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=self._max_workers) as pool:
+                self.models = dict(pool.map(_fit_segment, tasks))
+        log.warning(f"{len(self.models)} segment models fitted!")
+
+    def _segment_model(self, segment) -> ProphetModel:
+        model = ProphetModel(kpi_name=self._kpi_name)
+        model.model = self.models[segment]
+        return model
+
+    @timed("predict")
+    def predict(
+        self,
+        input_data: pd.DataFrame,
+        date_col: str = "timestamp",
+        value_col: str = "value",
+        validate: bool = True,
+    ) -> pd.DataFrame:
+        """Forecast every segment in the input and score all of them in one pass."""
+        segments = [
+            (segment, data)
+            for segment, data in self._segments(input_data)
+            if segment in self.models
+        ]
+        unknown = set(input_data[self._segment_col].unique()) - set(self.models)
+        if unknown:
+            log.warning(f"no model for segments {sorted(unknown)}, skipped")
+
+        def _forecast(item):
+            segment, data = item
+            forecast = self._segment_model(segment)._forecast(
+                data, date_col, value_col, validate=validate
+            )
+            forecast[self._segment_col] = segment
+            return forecast
+
+        # Prophet's predict is mostly numpy, threads avoid pickling the models
+        with ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            forecasts = list(pool.map(_forecast, segments))
+        if not forecasts:
+            return pd.DataFrame()
+
+        data = pd.concat(forecasts, ignore_index=True)
+        data["anomaly"] = same_hour_anomalies(
+            data,
+            window=10,
+            min_periods=3,
+            threshold=2.5,
+            group_cols=[self._segment_col],
+        )
+        record_anomalies(self._kpi_name, data["anomaly"])
+        log.info("prediction completed.")
+        return data
+
+    def _artifact(self) -> dict:
+        segments = sorted(self.models)
+        return {
+            "segment_col": self._segment_col,
+            "index": {segment: i for i, segment in enumerate(segments)},
+            "models": [self.models[segment] for segment in segments],
+        }
+
+    def save(
+        self,
+    ) -> None:
+        self.version = ModelStore(self._kpi_name, "segmented").publish(self._artifact())
+        log.info(f"{len(self.models)} segment models saved")
+
+    @timed("load")
+    def load(
+        self,
+    ):
+        try:
+            artifact, self.version = ModelStore(self._kpi_name, "segmented").load()
+        except Exception as e:
+            log.exception("failed to load segment models!")
+            raise e
+
+        self._segment_col = artifact["segment_col"]
+        self.models = {
+            segment: artifact["models"][i] for segment, i in artifact["index"].items()
+        }
+        log.info(f"{len(self.models)} segment models loaded successfully")
+
+    def get_model(self):
+        return self.models
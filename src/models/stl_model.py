@@ -5,30 +5,158 @@ from statsmodels.tsa.arima.model import ARIMA
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 from shared.to_date import to_date, to_char
+from shared.split_data import split_data
+from shared.rollups import rollup
+from data_sources.series_store import SeriesStore
+from shared.anomaly_rules import flag_name, threshold_flags
 from datetime import datetime
 
 
-def split_data(
-    df: pd.DataFrame, split_date: datetime, split_col: str = "timestamp"
-) -> tuple[pd.DataFrame, pd.DataFrame]:
-    df_mask = df[split_col] < split_date
-    # print(f"mask is: {df_mask.head()}", f"mask not is: {~df_mask.head()}", sep="\n")
-    train_data = df[df_mask]
-    test_data = df[~df_mask]
-    return train_data.copy(deep=True), test_data.copy(deep=True)
+def train_stl_v1(
+    df: pd.DataFrame,
+    split_date: datetime,
+    daily: pd.DataFrame | None = None,
+    store: SeriesStore | None = None,
+) -> DecomposeResult:
+    """Daily-period decomposition (weekly, monthly, yearly) of the training range.
 
-
-def train_stl_v1(df: pd.DataFrame, split_date: datetime) -> DecomposeResult:
-    train_data, test_data = split_data(df, split_date)
-    train_data.set_index("DATE_H", inplace=True)
-    train_data.sort_index(inplace=True)
-
-    model = MSTL(train_data["CNT"], periods=(7, 30, 365))
+    The periods are in days, so the decomposition runs on daily means: the KPI
+    store's daily rollup when `store` is given, else the precomputed `daily` rollup,
+    else the hourly data aggregated here.
+    """
+    if daily is None and store is not None:
+        daily = store.rollup("D", end=split_date)
+    if daily is None:
+        train_data, test_data = split_data(df, split_date, "DATE_H")
+        daily = rollup(train_data, "D")
+    daily = daily[daily.index < pd.Timestamp(split_date).normalize()]
+
+    periods = tuple(p for p in (7, 30, 365) if 2 * p <= len(daily))
+    model = MSTL(daily["mean"], periods=periods)
     result = model.fit()
 
     return result
 
 
+def _to_hours(
+    component: pd.Series,
+    times: pd.DatetimeIndex,
+    center: pd.Timedelta = pd.Timedelta(hours=12),
+) -> np.ndarray:
+    """Interpolate a daily (or weekly) component, valued at the centre of each
+    period, at hourly times."""
+    centers = (component.index + center).as_unit("ns").asi8
+    return np.interp(times.as_unit("ns").asi8, centers, component.to_numpy())
+
+
+def _seasonal_frame(result: DecomposeResult, unit: str) -> pd.DataFrame:
+    """Seasonal components as a frame, named seasonal_<period><unit>."""
+    seasonal = result.seasonal
+    if isinstance(seasonal, pd.Series):
+        seasonal = seasonal.to_frame()
+    return seasonal.rename(
+        columns=lambda col: f"{col}{unit}" if col.startswith("seasonal_") else col
+    )
+
+
+def decompose_multiscale(
+    df: pd.DataFrame,
+    short_periods: tuple = (24, 24 * 7),
+    long_periods: tuple = (30,),
+    yearly_weeks: int = 52,
+    daily: pd.DataFrame | None = None,
+    weekly: pd.DataFrame | None = None,
+) -> DecomposeResult:
+    """MSTL cascade from weekly to daily to hourly rollups, each scale fitted on the
+    coarsest data that still resolves its periods.
+
+    The yearly period is fitted on weekly means (52 points per cycle instead of 8760
+    hours); its trend and seasonal are interpolated to days and hours and removed.
+    The long periods (in days) are fitted on the remaining daily means, and the short
+    ones (in hours) on the remaining hourly series. Scales without two full cycles
+    of history are left out.
+
+    Args:
+        df (pd.DataFrame): hourly data with DATE_H and CNT columns.
+        short_periods (tuple): periods in hours fitted on the hourly data.
+        long_periods (tuple): periods in days fitted on the daily rollup.
+        yearly_weeks (int): yearly period in weeks fitted on the weekly rollup, 0 to
+            leave it out.
+        daily (pd.DataFrame, optional): precomputed daily rollup (see shared.rollups
+            and SeriesStore.rollup).
+        weekly (pd.DataFrame, optional): precomputed weekly rollup.
+
+    Returns:
+        DecomposeResult: hourly observed, trend, seasonal (one column per period,
+        named seasonal_<n>w, seasonal_<n>d and seasonal_<n>) and resid, indexed like
+        `df`.
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(df["DATE_H"]))
+    observed = pd.Series(df["CNT"].to_numpy(dtype=float), index=times, name="CNT")
+    first, last = times.min(), times.max()
+    if daily is None:
+        daily = rollup(df, "D")
+    if weekly is None:
+        weekly = rollup(df, "W")
+    daily = daily[(daily.index >= first.normalize()) & (daily.index <= last)]
+    weekly = weekly[
+        (weekly.index >= first.normalize() - pd.Timedelta(days=6))
+        & (weekly.index <= last)
+    ]
+
+    # the hourly MSTL fits whatever trend the coarser scales leave
+    trend = pd.Series(0.0, index=times)
+    seasonal = []
+    daily_mean = daily["mean"]
+
+    # MSTL needs two cycles of a period
+    if yearly_weeks and 2 * yearly_weeks <= len(weekly):
+        center = pd.Timedelta(days=3.5)
+        yearly = MSTL(weekly["mean"], periods=(yearly_weeks,)).fit()
+        days = daily.index + pd.Timedelta(hours=12)
+        yearly_seasonal = _seasonal_frame(yearly, "w")
+        daily_mean = daily_mean - _to_hours(yearly.trend, days, center)
+        trend += _to_hours(yearly.trend, times, center)
+        for col in yearly_seasonal:
+            daily_mean = daily_mean - _to_hours(yearly_seasonal[col], days, center)
+        seasonal.append(
+            pd.DataFrame(
+                {
+                    col: _to_hours(yearly_seasonal[col], times, center)
+                    for col in yearly_seasonal
+                },
+                index=times,
+            )
+        )
+
+    long_periods = tuple(p for p in long_periods if 2 * p <= len(daily))
+    if long_periods:
+        long = MSTL(daily_mean, periods=long_periods).fit()
+        long_seasonal = _seasonal_frame(long, "d")
+        trend += _to_hours(long.trend, times)
+        seasonal.append(
+            pd.DataFrame(
+                {col: _to_hours(long_seasonal[col], times) for col in long_seasonal},
+                index=times,
+            )
+        )
+
+    long_hourly = pd.concat(seasonal, axis=1) if seasonal else pd.DataFrame(index=times)
+    short = MSTL(
+        observed - trend - long_hourly.sum(axis=1), periods=short_periods
+    ).fit()
+    short_seasonal = short.seasonal
+    if isinstance(short_seasonal, pd.Series):
+        short_seasonal = short_seasonal.to_frame()
+
+    return DecomposeResult(
+        observed,
+        pd.concat([short_seasonal, long_hourly], axis=1),
+        trend + short.trend,
+        short.resid,
+    )
+
+
 def predict_stl_v1(): ...
 
 
@@ -121,7 +249,57 @@ def train_stl_6g():
     fig.show()
 
 
-def stl_arima_anomaly(df, split_date, arima_order=(1, 0, 1), threshold_sigma=4):
+def fit_stl_arima(
+    train_data: pd.DataFrame, arima_order=(1, 0, 1), daily=None, weekly=None
+) -> dict:
+    """Decompose the training data and fit ARIMA on the residuals.
+
+    Returns:
+        dict: last trend value, summed seasonal profile, fitted ARIMA and the last
+        training timestamp, all `forecast_stl_arima` needs, plus the std of the
+        training residuals to scale forecast errors with.
+    """
+    # 1. STL decomposition on training data; yearly on weekly, monthly on daily rollups
+    res = decompose_multiscale(train_data, daily=daily, weekly=weekly)
+
+    # 2. Fit ARIMA on residuals; positional, the hourly index of gappy data has no
+    # frequency to forecast with
+    arima_model = ARIMA(res.resid.to_numpy(), order=arima_order)
+    return {
+        "trend": res.trend.iloc[-1],
+        "seasonal": res.seasonal.sum(axis=1).values,
+        "arima": arima_model.fit(),
+        "end": res.observed.index[-1],
+        "resid_std": float(res.resid.std()),
+    }
+
+
+def forecast_stl_arima(fitted: dict, n_forecast: int) -> np.ndarray:
+    """Fitted values of the `n_forecast` hours following the training data."""
+    # 3. Forecast residuals into pred horizon
+    resid_forecast = fitted["arima"].forecast(steps=n_forecast)
+
+    # 4. Extend trend + seasonal
+    trend_future = np.repeat(fitted["trend"], n_forecast)  # constant trend
+    seasonal_sum = fitted["seasonal"]
+    seasonal_future = np.tile(
+        seasonal_sum, int(np.ceil(n_forecast / len(seasonal_sum)))
+    )[:n_forecast]
+
+    # 5. Build predictions
+    return trend_future + seasonal_future + np.asarray(resid_forecast)
+
+
+def stl_arima_anomaly(
+    df,
+    split_date,
+    arima_order=(1, 0, 1),
+    threshold_sigma=4,
+    thresholds=None,
+    daily=None,
+    weekly=None,
+    store: SeriesStore | None = None,
+):
     """
     STL + ARIMA anomaly detection pipeline.
 
@@ -130,6 +308,12 @@ def stl_arima_anomaly(df, split_date, arima_order=(1, 0, 1), threshold_sigma=4):
         split_date (str or pd.Timestamp): date to split train/test.
         arima_order (tuple): ARIMA(p,d,q) order for residual modeling.
         threshold_sigma (float): threshold multiplier for anomaly detection.
+        thresholds (list, optional): extra sigma multipliers, each adds a signed
+            `anomaly_t<threshold>` column computed from the same `score`.
+        daily (pd.DataFrame, optional): precomputed daily rollup of the KPI.
+        weekly (pd.DataFrame, optional): precomputed weekly rollup of the KPI.
+        store (SeriesStore, optional): the KPI's store; its rollups of the training
+            range are read instead of aggregating the hourly data.
 
     Returns:
         pred_data (pd.DataFrame): prediction horizon with anomalies labeled.
@@ -141,39 +325,35 @@ def stl_arima_anomaly(df, split_date, arima_order=(1, 0, 1), threshold_sigma=4):
     df["DATE_H"] = pd.to_datetime(df["DATE_H"])
 
     # Split train/pred
-    train_data = df[df["DATE_H"] < pd.to_datetime(split_date)]
-    pred_data = df[df["DATE_H"] >= pd.to_datetime(split_date)].copy()
+    train_data, pred_data = split_data(df, pd.to_datetime(split_date), "DATE_H")
+    pred_data = pred_data.copy()
 
-    # 1. STL decomposition on training data
-    mstl = MSTL(train_data["CNT"], periods=[24, 24 * 7, 24 * 30, 24 * 365])
-    res = mstl.fit()
-
-    # 2. Fit ARIMA on residuals
-    arima_model = ARIMA(res.resid, order=arima_order)
-    arima_result = arima_model.fit()
-
-    # 3. Forecast residuals into pred horizon
-    n_forecast = len(pred_data)
-    resid_forecast = arima_result.forecast(steps=n_forecast)
+    if store is not None:
+        daily = store.rollup("D", end=split_date) if daily is None else daily
+        weekly = store.rollup("W", end=split_date) if weekly is None else weekly
 
-    # 4. Extend trend + seasonal
-    trend_future = np.repeat(res.trend.iloc[-1], n_forecast)  # constant trend
-    seasonal_sum = res.seasonal.sum(axis=1).values
-    seasonal_future = np.tile(
-        seasonal_sum, int(np.ceil(n_forecast / len(seasonal_sum)))
-    )[:n_forecast]
+    # 1-2. STL decomposition and ARIMA on its residuals
+    fitted = fit_stl_arima(train_data, arima_order, daily, weekly)
 
-    # 5. Build predictions
-    fitted_future = trend_future + seasonal_future + resid_forecast.values
+    # 3-5. Forecast the prediction horizon
+    fitted_future = forecast_stl_arima(fitted, len(pred_data))
 
-    # 6. Compute anomaly bounds
+    # 6. Compute anomaly bounds as a signed sigma score
     residual_error = pred_data["CNT"].values - fitted_future
-    threshold = threshold_sigma * residual_error.std()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = residual_error / residual_error.std()
 
     pred_data["fitted"] = fitted_future
-    pred_data["anomaly"] = 0
-    pred_data.loc[residual_error > threshold, "anomaly"] = 1
-    pred_data.loc[residual_error < -threshold, "anomaly"] = -1
+    pred_data["score"] = score
+    pred_data["anomaly"] = np.where(
+        np.abs(score) > threshold_sigma, np.sign(score), 0
+    ).astype(int)
+    if thresholds:
+        flags = threshold_flags(score, thresholds)
+        for i, t in enumerate(thresholds):
+            pred_data[flag_name(t)] = np.where(flags[:, i], np.sign(score), 0).astype(
+                int
+            )
 
     # 7. Plot results
     fig = go.Figure()
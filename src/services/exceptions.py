@@ -11,7 +11,29 @@ class KPINotFoundError(KPIError):
 
 
 class InvalidKPIDataError(KPIError):
-    """Raised when KPI input data is invalid."""
+    """Raised when KPI input data is invalid.
+
+    `report` holds the failed checks (see shared.validation).
+    """
+
+    def __init__(self, message: str, report: dict | None = None) -> None:
+        # both in args, so the error survives pickling across process pools
+        super().__init__(message, report)
+        self.message = message
+        self.report = report or {}
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class RouteBusyError(KPIError):
+    """Raised when a route's concurrency limit stays full until the deadline."""
+
+    pass
+
+
+class DeadlineExceededError(KPIError):
+    """Raised when a request's work does not finish before its deadline."""
 
     pass
 
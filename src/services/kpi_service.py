@@ -1,12 +1,23 @@
+import pandas as pd
+from shared.config_loader import get_config
 from shared.path_manager import PathManager
 from logger.logger import get_logger
+from shared.validation import validate_kpi_data
 from .exceptions import KPINotFoundError
+from .model_cache import ModelCache, model_cache
+from .result_cache import ResultCache, result_cache
 
 
 class KPIService:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache: ModelCache = model_cache,
+        results: ResultCache | None = result_cache,
+    ) -> None:
         self._path_mgr = PathManager()
         self._log = get_logger()
+        self._cache = cache
+        self._results = results
 
     def run_train(self, kpi_name: str):
         if self.kpi_exists(kpi_name):
@@ -14,6 +25,38 @@ class KPIService:
         else:
             raise KPINotFoundError(f"kpi {kpi_name} does not exists")
 
+    def run_detect(self, kpi_name: str, data: list[dict], **params) -> pd.DataFrame:
+        """Detect anomalies in `data`; `params` are passed to the model's predict.
+
+        Identical requests against the same model version are answered from the
+        result cache.
+
+        Raises:
+            InvalidKPIDataError: the payload failed validation, nothing was loaded.
+        """
+        if not self.kpi_exists(kpi_name):
+            raise KPINotFoundError(f"kpi {kpi_name} does not exists")
+
+        frame = pd.DataFrame(data)
+        # validated once, before the model is loaded; its predict skips validation.
+        # Segments of a segmented KPI repeat the same timestamps, each one is checked
+        # as a series of its own
+        segment_col = get_config(kpi_name)["data"].get("segment_col")
+        validate_kpi_data(frame, segment_col=segment_col)
+        model = self._cache.get(kpi_name)
+        version = getattr(model, "version", None)
+        if self._results is None or not self._results.cacheable(version):
+            return model.predict(frame, validate=False, **params)
+
+        key = self._results.key(
+            kpi_name, version, frame, {"model": type(model).__name__, **params}
+        )
+        result = self._results.get(kpi_name, version, key)
+        if result is None:
+            result = model.predict(frame, validate=False, **params)
+            self._results.put(kpi_name, version, key, result)
+        return result
+
     def kpi_exists(self, kpi_name: str):
         return self._path_mgr.dir_exists(f"kpis/{kpi_name}")
 
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from logger.logger import get_logger
+from models.base_model import BaseModel
+from models.get_model import get_model
+from models.model_store import on_publish, store_stamp
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+COLD, LOADING, WARM, FAILED = "cold", "loading", "warm", "failed"
+
+# called as hook(kpi_name, version) when a cached model is replaced by a new version
+_version_hooks: list = []
+
+
+def on_new_version(hook) -> None:
+    """Register a callback run when the cache picks up a newly published version."""
+    _version_hooks.append(hook)
+
+
+class ModelCache:
+    """Serving cache of loaded KPI models with per-KPI warm-up status."""
+
+    def __init__(
+        self,
+        path_mgr: PathManager | None = None,
+        max_failed_share: float | None = None,
+    ) -> None:
+        """
+        :param max_failed_share: share of KPIs allowed to fail loading while the
+            cache still counts as ready, KPI_READY_MAX_FAILED or 0 (none) by default.
+        """
+        self._path_mgr = path_mgr or PathManager()
+        if max_failed_share is None:
+            max_failed_share = float(os.environ.get("KPI_READY_MAX_FAILED") or 0)
+        self.max_failed_share = max_failed_share
+        self._models: dict[str, BaseModel] = {}
+        # store stamp of each cached model, taken before it was loaded
+        self._stamps: dict[str, tuple] = {}
+        self._status: dict[str, dict] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warming = False
+        self._warmed_up = False
+
+    def list_kpis(self) -> list[str]:
+        """Every KPI that has a config, i.e. every KPI that can be served."""
+        return sorted(
+            path.parent.name for path in self._path_mgr.kpi_dir.glob("*/config.yaml")
+        )
+
+    def _kpi_lock(self, kpi_name: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(kpi_name, threading.Lock())
+
+    def _load(self, kpi_name: str) -> BaseModel:
+        self._status[kpi_name] = {"state": LOADING, "load_seconds": None}
+        started = time.perf_counter()
+        # taken first, so a publish during the load is picked up by the next get
+        stamp = store_stamp(kpi_name, self._path_mgr)
+        previous = getattr(self._models.get(kpi_name), "version", None)
+        try:
+            model = get_model(kpi_name)
+            model.load()
+        except Exception as e:
+            self._status[kpi_name] = {
+                "state": FAILED,
+                "load_seconds": time.perf_counter() - started,
+                "error": str(e),
+            }
+            raise e
+
+        self._models[kpi_name] = model
+        self._stamps[kpi_name] = stamp
+        self._status[kpi_name] = {
+            "state": WARM,
+            "load_seconds": time.perf_counter() - started,
+        }
+        if previous is not None and model.version != previous:
+            log.info(f"{kpi_name} model {previous} replaced by {model.version}")
+            for hook in _version_hooks:
+                try:
+                    hook(kpi_name, model.version)
+                except Exception:
+                    log.exception(f"new version hook {hook} failed for {kpi_name}")
+        return model
+
+    def load(self, kpi_name: str) -> BaseModel:
+        """Load the latest model of a KPI into the cache, replacing any cached one."""
+        with self._kpi_lock(kpi_name):
+            return self._load(kpi_name)
+
+    def _current(self, kpi_name: str) -> BaseModel | None:
+        """Cached model, if the store has not been published to since it was loaded."""
+        model = self._models.get(kpi_name)
+        if model is None:
+            return None
+        if self._stamps.get(kpi_name) != store_stamp(kpi_name, self._path_mgr):
+            return None
+        return model
+
+    def get(self, kpi_name: str) -> BaseModel:
+        """Cached model of a KPI, loaded on first use if warm-up has not reached it.
+
+        Models are published by other processes (train_kpi, other workers), so the
+        KPI's store stamp is checked on every call and a changed store is reloaded.
+        """
+        model = self._current(kpi_name)
+        if model is not None:
+            return model
+        with self._kpi_lock(kpi_name):
+            # another request may have loaded it while we waited for the lock
+            model = self._current(kpi_name)
+            return model if model is not None else self._load(kpi_name)
+
+    def evict(self, kpi_name: str, *args) -> None:
+        """Drop a KPI's cached model, the next request loads the latest version.
+
+        Registered as a model store publish hook, hence the ignored extra arguments.
+        """
+        with self._kpi_lock(kpi_name):
+            if self._models.pop(kpi_name, None) is not None:
+                log.info(f"cached model of {kpi_name} evicted")
+
+    def warm_up(
+        self, kpi_names: list[str] | None = None, max_workers: int | None = None
+    ) -> dict:
+        """Load the latest model of every KPI in parallel.
+
+        Failures are recorded in the status and do not stop the other KPIs.
+        """
+        kpi_names = self.list_kpis() if kpi_names is None else kpi_names
+        max_workers = (
+            max_workers or int(os.environ.get("KPI_WARMUP_WORKERS", 0)) or None
+        )
+
+        self._warming = True
+        for kpi_name in kpi_names:
+            self._status.setdefault(kpi_name, {"state": COLD, "load_seconds": None})
+
+        started = time.perf_counter()
+
+        def _warm(kpi_name: str):
+            try:
+                self.load(kpi_name)
+            except Exception as e:
+                # the loader already logged the traceback
+                log.warning(f"warm-up failed for {kpi_name}: {e}")
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(_warm, kpi_names))
+        finally:
+            self._warming = False
+            self._warmed_up = True
+
+        log.info(
+            f"warm-up of {len(kpi_names)} kpis done in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+        return self.status()
+
+    def status(self) -> dict:
+        return {kpi_name: dict(status) for kpi_name, status in self._status.items()}
+
+    def failures(self) -> dict:
+        """Error of every KPI whose model failed to load."""
+        return {
+            kpi_name: status.get("error")
+            for kpi_name, status in self._status.items()
+            if status["state"] == FAILED
+        }
+
+    def is_warm(self) -> bool:
+        """True once warm-up has run and no KPI is still cold or loading."""
+        if self._warming or not self._warmed_up:
+            return False
+        return all(s["state"] in (WARM, FAILED) for s in self._status.values())
+
+    def is_ready(self) -> bool:
+        """Warm, with no more failed KPIs than `max_failed_share` allows."""
+        if not self.is_warm():
+            return False
+        failed = len(self.failures())
+        return failed <= self.max_failed_share * len(self._status)
+
+
+model_cache = ModelCache()
+on_publish(model_cache.evict)
+
+
+def main():
+    print(model_cache.warm_up())
+    print(model_cache.is_ready())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from logger.logger import get_logger
+from services.exceptions import DeadlineExceededError, RouteBusyError
+from shared import metrics
+
+log = get_logger()
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.environ.get(name)
+    return default if value in (None, "") else float(value)
+
+
+class RouteLimit:
+    """Concurrency limit and deadline of one route.
+
+    Read from KPI_<ROUTE>_CONCURRENCY (0 = unlimited) and KPI_<ROUTE>_DEADLINE
+    (seconds, empty = none) when not given.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        concurrency: int | None = None,
+        deadline: float | None = None,
+    ) -> None:
+        prefix = f"KPI_{route.upper()}"
+        self.route = route
+        self.concurrency = int(
+            _env_float(f"{prefix}_CONCURRENCY", concurrency or 0) or 0
+        )
+        self.deadline = _env_float(f"{prefix}_DEADLINE", deadline)
+        self._slots: asyncio.Semaphore | None = None
+
+    @property
+    def slots(self) -> asyncio.Semaphore | None:
+        if self.concurrency and self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+
+# detection is short and frequent, training long and rare
+ROUTE_LIMITS = {
+    "detect": RouteLimit("detect", concurrency=16, deadline=30.0),
+    "train": RouteLimit("train", concurrency=1, deadline=None),
+}
+
+
+def _detect(kpi_name: str, data: list[dict]) -> list[dict]:
+    """Detection in a pool process, returned as JSON records to pickle less."""
+    from services.kpi_service import KPIService
+
+    result = KPIService().run_detect(kpi_name, data)
+    return json.loads(result.to_json(orient="records", date_format="iso"))
+
+
+def _train(kpi_name: str) -> None:
+    from services.kpi_service import KPIService
+
+    KPIService().run_train(kpi_name)
+
+
+def _init_pool_process() -> None:
+    # drop the counts inherited from the parent, they are already in its registry
+    metrics.REGISTRY.drain()
+
+
+def _collecting(func, *args):
+    """Run `func` in a pool process, returned with the metrics it recorded."""
+    result = func(*args)
+    return result, metrics.REGISTRY.drain() if metrics.is_enabled() else {}
+
+
+class Offloader:
+    """Runs CPU-bound model work on a process pool awaited from async handlers.
+
+    The event loop only waits, so health and metrics keep answering while every pool
+    process is busy with Prophet or ARIMA. Each route has a concurrency limit (a
+    request waits for a slot, at most until its deadline) and a deadline. When a
+    request runs out of time or is cancelled, its task is cancelled if it has not
+    started; a task already running in a pool process finishes and its result is
+    dropped.
+
+    The pool is started by `start` (or `start_after`), once the models are loaded:
+    forked processes share the models already loaded in this one. Until then the
+    work runs on a thread pool, as it always does with KPI_INFERENCE_WORKERS=0.
+    """
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        if max_workers is None and os.environ.get("KPI_INFERENCE_WORKERS"):
+            max_workers = int(os.environ["KPI_INFERENCE_WORKERS"])
+        self.max_workers = max_workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._threads: ThreadPoolExecutor | None = None
+        # tasks submitted to the thread pool and not finished, counted on the loop
+        self._threaded = 0
+        # set while start_after waits for the thread pool to drain before forking
+        self._starting: asyncio.Event | None = None
+        self._warned = False
+
+    def start(self, serving_processes: int = 1) -> None:
+        """Fork the pool processes.
+
+        Args:
+            serving_processes (int): processes serving the API on this host, each
+                with its own pool; without KPI_INFERENCE_WORKERS the CPUs are split
+                between them.
+        """
+        if self._pool is not None:
+            return
+        if self.max_workers is None:
+            self.max_workers = max((os.cpu_count() or 1) // serving_processes, 1)
+        if not self.max_workers:
+            return
+
+        context = multiprocessing.get_context("fork") if hasattr(os, "fork") else None
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_pool_process,
+        )
+        # the executor forks its processes on the first task; make that happen now,
+        # not in the middle of serving a request
+        self._pool.submit(os.getpid).result()
+        log.info(f"inference pool started with {self.max_workers} processes")
+
+    async def start_after(self, ready, serving_processes: int = 1) -> None:
+        """Start the pool from the event loop thread once `ready` (the warm-up) is done.
+
+        A forked child only gets the forking thread; a lock another thread holds at
+        that moment (loguru's handler lock, a logging or allocator lock) stays held in
+        the child forever. So the fork waits until no task runs on the thread pool,
+        new requests wait for the fork instead of starting more threaded work, and it
+        happens on the loop thread between callbacks.
+        """
+        await ready
+        self._starting = asyncio.Event()
+        try:
+            while self._threaded:
+                await asyncio.sleep(0.01)
+            self.start(serving_processes)
+        finally:
+            self._starting.set()
+            self._starting = None
+
+    def _thread_done(self, future) -> None:
+        self._threaded -= 1
+
+    async def _execute(self, route: str, func, *args):
+        starting = self._starting
+        if self._pool is None and starting is not None:
+            await starting.wait()
+
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            if self.max_workers != 0 and not self._warned:
+                self._warned = True
+                log.warning(
+                    f"inference pool not started, {route} runs on the thread pool"
+                )
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(thread_name_prefix="offload")
+            future = self._threads.submit(func, *args)
+            self._threaded += 1
+            # counted until the thread really finishes, a cancelled await does not
+            # stop it
+            future.add_done_callback(
+                lambda f: loop.call_soon_threadsafe(self._thread_done, f)
+            )
+            return await asyncio.wrap_future(future)
+
+        result, recorded = await loop.run_in_executor(
+            self._pool, _collecting, func, *args
+        )
+        metrics.REGISTRY.merge(recorded)
+        return result
+
+    async def run(self, route: str, func, *args, timeout: float | None = None):
+        """Run `func(*args)` off the event loop within the route's limits.
+
+        Args:
+            route (str): key of ROUTE_LIMITS.
+            timeout (float, optional): the request's own deadline in seconds, capped
+                by the route's deadline.
+
+        Raises:
+            RouteBusyError: no slot of the route freed up before the deadline.
+            DeadlineExceededError: the work did not finish before the deadline.
+        """
+        limit = ROUTE_LIMITS[route]
+        deadline = min(
+            (t for t in (timeout, limit.deadline) if t is not None), default=None
+        )
+        started = time.monotonic()
+
+        slots = limit.slots
+        if slots is not None:
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout=deadline)
+            except asyncio.TimeoutError:
+                raise RouteBusyError(f"{route}: {limit.concurrency} requests running")
+
+        try:
+            remaining = None
+            if deadline is not None:
+                remaining = max(deadline - (time.monotonic() - started), 0)
+            # wait_for cancels the task on timeout or when the request is cancelled
+            return await asyncio.wait_for(
+                self._execute(route, func, *args), timeout=remaining
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f"{route}: deadline of {deadline}s exceeded")
+        finally:
+            if slots is not None:
+                slots.release()
+
+    async def detect(self, kpi_name: str, data: list[dict], timeout=None):
+        return await self.run("detect", _detect, kpi_name, data, timeout=timeout)
+
+    async def train(self, kpi_name: str, timeout=None):
+        return await self.run("train", _train, kpi_name, timeout=timeout)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+
+offloader = Offloader()
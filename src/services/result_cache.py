@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from logger.logger import get_logger
+from models.model_store import on_publish
+from services.model_cache import on_new_version
+from shared import metrics
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+CACHE_LOOKUPS = metrics.REGISTRY.counter(
+    "kpi_result_cache_total",
+    "Detection result cache lookups by tier that answered.",
+    ("kpi", "tier"),
+)
+
+
+def input_hash(data: pd.DataFrame) -> str:
+    """Content hash of an input window: column names, dtypes and every value."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in data.columns]).encode())
+    digest.update(json.dumps([str(t) for t in data.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Detection results keyed by what they are computed from.
+
+    A key is the hash of (KPI, model version, input window, detector params), so the
+    same request against the same model is answered without predicting again. The
+    first tier is an in-memory LRU, the second pickled results on disk shared by all
+    workers, pruned least recently used first past its size limit. Results of an
+    unversioned model are never cached. A new model version, published in this
+    process or picked up by the model cache from another one, drops the KPI's entries
+    of older versions from both tiers.
+    """
+
+    def __init__(
+        self,
+        max_entries: int | None = None,
+        disk_dir: Path | None = None,
+        disk: bool | None = None,
+        max_disk_mb: float | None = None,
+    ) -> None:
+        """
+        :param max_entries: results kept in memory, KPI_RESULT_CACHE_SIZE or 256.
+        :param disk_dir: directory of the disk tier, data/result_cache by default.
+        :param disk: keep the disk tier, KPI_RESULT_CACHE_DISK (default 1).
+        :param max_disk_mb: size limit of the disk tier, KPI_RESULT_CACHE_DISK_MB or
+            512.
+        """
+        self.max_entries = max_entries or int(
+            os.environ.get("KPI_RESULT_CACHE_SIZE", 256)
+        )
+        if disk is None:
+            disk = os.environ.get("KPI_RESULT_CACHE_DISK", "1") == "1"
+        self.disk_dir = (
+            Path(disk_dir or PathManager().data_dir / "result_cache") if disk else None
+        )
+        self.max_disk_bytes = int(
+            (max_disk_mb or float(os.environ.get("KPI_RESULT_CACHE_DISK_MB", 512)))
+            * 2**20
+        )
+        # bytes this process believes the disk tier holds, rescanned when pruning
+        self._disk_bytes: int | None = None
+        # key -> (kpi_name, version, result)
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        kpi_name: str, version: str, data: pd.DataFrame, params: dict | None = None
+    ) -> str:
+        payload = json.dumps(
+            {
+                "kpi": kpi_name,
+                "version": version,
+                "input": input_hash(data),
+                "params": params or {},
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(version: str | None) -> bool:
+        # a legacy artifact can be overwritten in place without a new version
+        return version not in (None, "legacy")
+
+    def _path(self, kpi_name: str, version: str, key: str) -> Path:
+        return self.disk_dir / kpi_name / version / f"{key}.pkl"
+
+    def get(self, kpi_name: str, version: str, key: str) -> pd.DataFrame | None:
+        """Cached result (a copy, callers may modify it) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            self._count(kpi_name, "memory")
+            return entry[2].copy()
+
+        if self.disk_dir is not None:
+            try:
+                result = pd.read_pickle(self._path(kpi_name, version, key))
+            except FileNotFoundError:
+                pass
+            else:
+                # the file's mtime is its last use, pruning goes by it
+                self._touch(self._path(kpi_name, version, key))
+                self._remember(key, kpi_name, version, result)
+                self._count(kpi_name, "disk")
+                return result.copy()
+
+        self._count(kpi_name, "miss")
+        return None
+
+    def put(self, kpi_name: str, version: str, key: str, result: pd.DataFrame) -> None:
+        result = result.copy()
+        self._remember(key, kpi_name, version, result)
+        if self.disk_dir is not None:
+            path = self._path(kpi_name, version, key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            result.to_pickle(tmp)
+            os.replace(tmp, path)
+            self._grow_disk(path.stat().st_size)
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _grow_disk(self, size: int) -> None:
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(f.stat().st_size for f, _ in self._disk_files())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+
+    def _disk_files(self) -> list:
+        files = []
+        for path in self.disk_dir.glob("*/*/*.pkl"):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                # removed by another worker
+                continue
+        return files
+
+    def _prune_disk(self) -> None:
+        """Remove the least recently used results until the tier is at 90% of its limit.
+
+        Every worker may prune; the files are rescanned, so the total is exact.
+        """
+        files = sorted(self._disk_files(), key=lambda f: f[1].st_mtime_ns)
+        total = sum(stat.st_size for _, stat in files)
+        target = 0.9 * self.max_disk_bytes
+        removed = 0
+        for path, stat in files:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+        self._disk_bytes = total
+        log.info(f"result cache disk tier pruned: {removed} results removed")
+
+    def _remember(self, key: str, kpi_name: str, version: str, result) -> None:
+        with self._lock:
+            self._entries[key] = (kpi_name, version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, kpi_name: str, tier: str) -> None:
+        if metrics.is_enabled():
+            CACHE_LOOKUPS.inc(kpi_name, tier)
+
+    def invalidate(self, kpi_name: str, keep_version: str | None = None) -> None:
+        """Drop the KPI's results, except those computed by `keep_version`."""
+        with self._lock:
+            stale = [
+                key
+                for key, (kpi, version, _) in self._entries.items()
+                if kpi == kpi_name and version != keep_version
+            ]
+            for key in stale:
+                del self._entries[key]
+
+        removed = 0
+        if self.disk_dir is not None and (self.disk_dir / kpi_name).is_dir():
+            for version_dir in (self.disk_dir / kpi_name).iterdir():
+                if version_dir.name != keep_version:
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    removed += 1
+        log.info(
+            f"result cache of {kpi_name}: {len(stale)} entries and "
+            f"{removed} version dirs invalidated"
+        )
+
+    def on_publish(self, kpi_name: str, model_type: str, version: str) -> None:
+        self.invalidate(kpi_name, keep_version=version)
+
+    def on_new_version(self, kpi_name: str, version: str) -> None:
+        self.invalidate(kpi_name, keep_version=version)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+result_cache = ResultCache()
+on_publish(result_cache.on_publish)
+on_new_version(result_cache.on_new_version)
+
+
+def main():
+    data = pd.DataFrame({"DATE_H": ["2025-01-01 00:00:00"], "CNT": [1]})
+    key = ResultCache.key("kpi_a", "v1", data)
+    print(key, result_cache.get("kpi_a", "v1", key))
+
+
+if __name__ == "__main__":
+    main()
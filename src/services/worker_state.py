@@ -0,0 +1,127 @@
+import asyncio
+import multiprocessing
+import os
+import time
+
+# per-worker slot in the shared board
+PID, STARTED, HEARTBEAT, IN_FLIGHT, HANDLED, REJECTED = range(6)
+FIELDS = 6
+
+
+class WorkerBoard:
+    """Per-worker counters in shared memory, readable from every worker and the parent.
+
+    The board is allocated before the workers are forked, so all of them see the same
+    memory; each worker only writes its own slot.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self._values = multiprocessing.RawArray("d", workers * FIELDS)
+
+    def _at(self, slot: int, field: int) -> int:
+        return slot * FIELDS + field
+
+    def get(self, slot: int, field: int) -> float:
+        return self._values[self._at(slot, field)]
+
+    def set(self, slot: int, field: int, value: float) -> None:
+        self._values[self._at(slot, field)] = value
+
+    def add(self, slot: int, field: int, value: float = 1) -> None:
+        # only the worker owning the slot writes it, from its event loop thread
+        self._values[self._at(slot, field)] += value
+
+    def reset(self, slot: int, pid: int) -> None:
+        now = time.time()
+        for field, value in enumerate([pid, now, now, 0, 0, 0]):
+            self.set(slot, field, value)
+
+    def snapshot(self, stale_after: float) -> list[dict]:
+        now = time.time()
+        workers = []
+        for slot in range(self.workers):
+            heartbeat = self.get(slot, HEARTBEAT)
+            workers.append(
+                {
+                    "slot": slot,
+                    "pid": int(self.get(slot, PID)),
+                    "healthy": heartbeat > 0 and now - heartbeat < stale_after,
+                    "heartbeat_age": round(now - heartbeat, 3) if heartbeat else None,
+                    "uptime": round(now - self.get(slot, STARTED), 3),
+                    "in_flight": int(self.get(slot, IN_FLIGHT)),
+                    "handled": int(self.get(slot, HANDLED)),
+                    "rejected": int(self.get(slot, REJECTED)),
+                }
+            )
+        return workers
+
+
+class WorkerState:
+    """Admission control and health of the current serving process.
+
+    In single-process mode there is no board and no limit unless KPI_MAX_PENDING is
+    set; the prefork server configures every worker after forking it.
+    """
+
+    def __init__(self) -> None:
+        self.board: WorkerBoard | None = None
+        self.slot = 0
+        self.max_pending = int(os.environ.get("KPI_MAX_PENDING", 0))
+        self.heartbeat_interval = 1.0
+        self.stale_after = 10.0
+        self.in_flight = 0
+
+    def configure(
+        self,
+        board: WorkerBoard,
+        slot: int,
+        max_pending: int,
+        heartbeat_interval: float = 1.0,
+        stale_after: float = 10.0,
+    ) -> None:
+        self.board = board
+        self.slot = slot
+        self.max_pending = max_pending
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.in_flight = 0
+        board.reset(slot, os.getpid())
+
+    def try_acquire(self) -> bool:
+        """Admit a request, or refuse it when `max_pending` requests are in flight."""
+        if self.max_pending and self.in_flight >= self.max_pending:
+            if self.board is not None:
+                self.board.add(self.slot, REJECTED)
+            return False
+        self.in_flight += 1
+        if self.board is not None:
+            self.board.set(self.slot, IN_FLIGHT, self.in_flight)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self.board is not None:
+            self.board.set(self.slot, IN_FLIGHT, self.in_flight)
+            self.board.add(self.slot, HANDLED)
+
+    async def heartbeat(self) -> None:
+        """Beat from the event loop, so a worker stuck in a handler stops beating."""
+        while True:
+            self.board.set(self.slot, HEARTBEAT, time.time())
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def workers(self) -> list[dict]:
+        if self.board is None:
+            return [
+                {
+                    "slot": 0,
+                    "pid": os.getpid(),
+                    "healthy": True,
+                    "in_flight": self.in_flight,
+                }
+            ]
+        return self.board.snapshot(self.stale_after)
+
+
+worker_state = WorkerState()
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+
+def same_hour_zscores(
+    data: pd.DataFrame,
+    residual_col: str = "residual",
+    time_col: str = "ds",
+    windows: list = (10,),
+    min_periods: int = 3,
+    group_cols: list | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Z-scores of every residual against its same-hour history, for several windows.
+
+    The rows are ordered once; every window then gathers the previous residuals of
+    each row with one fancy index and takes a two-pass mean and std over them. Running
+    sums would be cheaper but lose all precision when the residuals are large next
+    to their spread.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: z-scores and history sizes, both of shape
+        (len(data), len(windows)) and aligned with `data`.
+    """
+    times = data[time_col]
+    keys = [data[col].to_numpy() for col in (group_cols or [])]
+    keys.append(times.dt.hour.to_numpy())
+
+    # order rows by group, hour, time; a group id changes at every new key combination
+    order = np.lexsort([times.to_numpy(), *reversed(keys)])
+    n = len(order)
+    new_group = np.zeros(n, dtype=bool)
+    if n:
+        new_group[0] = True
+    for key in keys:
+        sorted_key = key[order]
+        new_group[1:] |= sorted_key[1:] != sorted_key[:-1]
+
+    index = np.arange(n)
+    group_start = np.maximum.accumulate(np.where(new_group, index, 0))
+
+    residual = data[residual_col].to_numpy(dtype=float)[order]
+
+    zscores = np.empty((n, len(windows)))
+    counts = np.empty((n, len(windows)), dtype=np.int64)
+    for i, window in enumerate(windows):
+        # (n, window) positions of the previous residuals, masked outside the group
+        previous = index[:, None] - np.arange(1, window + 1)
+        valid = previous >= group_start[:, None]
+        history = np.where(valid, residual[np.maximum(previous, 0)], 0.0)
+        count = valid.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = history.sum(axis=1) / count
+            spread = np.where(valid, history - mean[:, None], 0.0)
+            std = np.sqrt((spread * spread).sum(axis=1) / (count - 1))
+            zscore = np.where(std > 0, (residual - mean) / std, 0.0)
+        zscore[count < min_periods] = 0.0
+        zscores[order, i] = zscore
+        counts[order, i] = count
+    return zscores, counts
+
+
+def same_hour_zscore(
+    data: pd.DataFrame,
+    residual_col: str = "residual",
+    time_col: str = "ds",
+    window: int = 10,
+    min_periods: int = 3,
+    group_cols: list | None = None,
+) -> tuple[pd.Series, pd.Series]:
+    """Z-score of every residual against the residuals of the same hour on earlier days.
+
+    For each row the mean and standard deviation of the previous `window` residuals
+    with the same hour (and the same `group_cols` values) are computed for all rows at
+    once, so the whole frame is scored in one pass instead of one mask per row.
+
+    Args:
+        data (pd.DataFrame): frame with a residual and a timestamp column.
+        residual_col (str): residual column.
+        time_col (str): timestamp column.
+        window (int): number of earlier same-hour residuals to compare against.
+        min_periods (int): fewer earlier residuals than this gives no score.
+        group_cols (list, optional): extra columns (e.g. a segment) to group by.
+
+    Returns:
+        tuple[pd.Series, pd.Series]: the z-scores (0 where the std is 0) and the
+        number of earlier residuals each score is based on, both aligned with `data`.
+    """
+    zscores, counts = same_hour_zscores(
+        data, residual_col, time_col, [window], min_periods, group_cols
+    )
+    return (
+        pd.Series(zscores[:, 0], index=data.index, name="zscore"),
+        pd.Series(counts[:, 0], index=data.index, name="history"),
+    )
+
+
+def same_hour_anomalies(
+    data: pd.DataFrame,
+    residual_col: str = "residual",
+    time_col: str = "ds",
+    window: int = 10,
+    min_periods: int = 3,
+    threshold: float = 2.5,
+    group_cols: list | None = None,
+) -> pd.Series:
+    """Flag residuals more than `threshold` standard deviations from their same-hour
+    history (1 = anomaly, 0 = normal). See `same_hour_zscore`."""
+    zscore, history = same_hour_zscore(
+        data, residual_col, time_col, window, min_periods, group_cols
+    )
+    flags = (zscore.abs() > threshold) & (history >= min_periods)
+    return flags.astype(int).rename("anomaly")
+
+
+def threshold_flags(
+    scores: np.ndarray, thresholds: list, valid: np.ndarray | None = None
+) -> np.ndarray:
+    """Compare a score matrix against every threshold at once.
+
+    Args:
+        scores (np.ndarray): raw scores, shape (n,) or (n, k).
+        thresholds (list): thresholds on the absolute score.
+        valid (np.ndarray, optional): mask of scores that may be flagged at all.
+
+    Returns:
+        np.ndarray: boolean flags of shape scores.shape + (len(thresholds),).
+    """
+    flags = np.abs(scores)[..., None] > np.asarray(thresholds, dtype=float)
+    if valid is not None:
+        flags &= np.asarray(valid)[..., None]
+    return flags
+
+
+def flag_name(threshold: float, window: int | None = None) -> str:
+    """Column name of the flags of one threshold (and window) setting."""
+    if window is None:
+        return f"anomaly_t{threshold:g}"
+    return f"anomaly_w{window}_t{threshold:g}"
+
+
+def same_hour_sweep(
+    data: pd.DataFrame,
+    windows: list,
+    thresholds: list,
+    residual_col: str = "residual",
+    time_col: str = "ds",
+    min_periods: int = 3,
+    group_cols: list | None = None,
+) -> pd.DataFrame:
+    """Same-hour anomaly flags for every (window, threshold) pair in one pass.
+
+    Returns:
+        pd.DataFrame: one int column per pair, named by `flag_name`.
+    """
+    zscores, counts = same_hour_zscores(
+        data, residual_col, time_col, windows, min_periods, group_cols
+    )
+    flags = threshold_flags(zscores, thresholds, counts >= min_periods)
+    return pd.DataFrame(
+        flags.reshape(len(data), -1).astype(int),
+        index=data.index,
+        columns=[flag_name(t, w) for w in windows for t in thresholds],
+    )
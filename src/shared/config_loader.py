@@ -1,6 +1,8 @@
+import os
+import uuid
 from os.path import join
 from sys import exception
-from yaml import safe_load
+from yaml import safe_dump, safe_load
 from shared.path_manager import PathManager
 from logger.logger import get_logger
 
@@ -28,6 +30,23 @@ def get_config(
         log.exception(f"some error occured while loading the {kpi_name} config.")
 
 
+def save_config(kpi_name: str, config: dict) -> None:
+    """Replace a KPI's config atomically, readers never see a half-written file."""
+    config_path = PathManager().kpi_config(kpi_name)
+    tmp = config_path.with_name(f".{config_path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w") as file:
+        safe_dump(config, file, sort_keys=False)
+    os.replace(tmp, config_path)
+    log.info(f"{kpi_name} config saved")
+
+
+def set_model_params(kpi_name: str, params: dict) -> None:
+    """Write `params` to `model.params` of a KPI's config, passed on to its model."""
+    config = get_config(kpi_name) or {}
+    config.setdefault("model", {})["params"] = params
+    save_config(kpi_name, config)
+
+
 def main():
     print(f"config loader dir is: {get_config('kpi_a')}")
 
@@ -1,11 +1,14 @@
 import pandas as pd
 from shared.path_manager import PathManager
+from shared.metrics import timed
 
 
+@timed("fill_range")
 def fill_range(
     df: pd.DataFrame, time_col: str = "DATE_H", value_col: str = "CNT"
 ) -> pd.DataFrame:
-    df.rename(columns={time_col: "timestamp", value_col: "value"}, inplace=True)
+    # rename returns a new frame so the caller's data (often a slice) is left untouched
+    df = df.rename(columns={time_col: "timestamp", value_col: "value"})
     df["timestamp"] = pd.to_datetime(df["timestamp"])
     df = df.set_index("timestamp")
 
@@ -0,0 +1,355 @@
+import numpy as np
+import pandas as pd
+
+from shared.fill_range import fill_range
+from shared.lean import HOUR_NS, fill_hours
+from shared.validation import ValidationReport, validate_arrays, validate_kpi_data
+
+# names accepted by the `data.backend` key of a KPI config
+BACKENDS = ("pandas", "polars", "arrow")
+
+# layouts the arrow csv reader parses as ISO 8601, tried in turn on text timestamps
+_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+# numpy dtype names of `data.dtypes` -> polars dtype names
+_POLARS_DTYPES = {
+    "float32": "Float32",
+    "float64": "Float64",
+    "int8": "Int8",
+    "int16": "Int16",
+    "int32": "Int32",
+    "int64": "Int64",
+    "uint8": "UInt8",
+    "uint16": "UInt16",
+    "uint32": "UInt32",
+    "uint64": "UInt64",
+}
+
+
+def _polars():
+    try:
+        import polars as pl
+    except ImportError as e:
+        raise ImportError("the polars backend needs polars: pip install polars") from e
+    return pl
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv  # noqa: F401, used as pa.csv
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError("the arrow backend needs pyarrow: pip install pyarrow") from e
+    return pa, pc, ds
+
+
+class FrameBackend:
+    """Dataframe engine the data path runs on, from the csv read to the model input.
+
+    Frames stay in the backend's own type through read, validation and gap-fill;
+    `to_pandas` is called once, on the filled grid a model takes as its input.
+    """
+
+    name = "pandas"
+
+    def read_csv(
+        self,
+        path,
+        time_col: str = "DATE_H",
+        start=None,
+        end=None,
+        columns: list | None = None,
+        dtype: dict | None = None,
+    ):
+        """Read a KPI csv with `time_col` parsed, keeping start <= time < end."""
+        data = pd.read_csv(path, parse_dates=[time_col], usecols=columns, dtype=dtype)
+        keep = pd.Series(True, index=data.index)
+        if start is not None:
+            keep &= data[time_col] >= pd.Timestamp(start)
+        if end is not None:
+            keep &= data[time_col] < pd.Timestamp(end)
+        return data if keep.all() else data[keep].reset_index(drop=True)
+
+    def fill_range(self, frame, time_col: str = "DATE_H", value_col: str = "CNT"):
+        """Zero-filled hourly timestamp/value frame of whole days, like `fill_range`."""
+        return fill_range(frame, time_col, value_col)
+
+    def collect(self, frame):
+        """Run the pending work of a lazy frame, so it is not repeated per use."""
+        return frame
+
+    def to_pandas(self, frame) -> pd.DataFrame:
+        return frame
+
+    def validate(
+        self, frame, time_col: str = "DATE_H", value_col: str = "CNT", **kwargs
+    ) -> ValidationReport:
+        """`validate_kpi_data` on the backend's frame, see `shared.validation`."""
+        return validate_kpi_data(frame, time_col, value_col, **kwargs)
+
+
+class PolarsBackend(FrameBackend):
+    """Polars lazy frames: the csv scan, filters and gap-fill join form one query
+    plan that is optimized (filters pushed into the scan, the shared scan run
+    once) and executed on all cores when collected."""
+
+    name = "polars"
+
+    def read_csv(
+        self,
+        path,
+        time_col: str = "DATE_H",
+        start=None,
+        end=None,
+        columns: list | None = None,
+        dtype: dict | None = None,
+    ):
+        pl = _polars()
+        overrides = {
+            col: getattr(pl, _POLARS_DTYPES.get(str(name), str(name)))
+            for col, name in (dtype or {}).items()
+        }
+        frame = pl.scan_csv(path, schema_overrides=overrides or None).with_columns(
+            pl.col(time_col).str.to_datetime(time_unit="ns", strict=False)
+        )
+        if start is not None:
+            frame = frame.filter(pl.col(time_col) >= pd.Timestamp(start))
+        if end is not None:
+            frame = frame.filter(pl.col(time_col) < pd.Timestamp(end))
+        return frame if columns is None else frame.select(columns)
+
+    def fill_range(self, frame, time_col: str = "DATE_H", value_col: str = "CNT"):
+        pl = _polars()
+        frame = frame.lazy().select(
+            pl.col(time_col).cast(pl.Datetime("ns")).alias("timestamp"),
+            pl.col(value_col).alias("value"),
+        )
+        day = pl.col("timestamp").dt.truncate("1d")
+        grid = frame.select(
+            pl.datetime_ranges(
+                day.min(),
+                day.max() + pl.duration(hours=23),
+                interval="1h",
+                time_unit="ns",
+            )
+            .explode()
+            .alias("timestamp")
+        )
+        return (
+            grid.join(frame, on="timestamp", how="left")
+            .with_columns(pl.col("value").fill_null(0))
+            .sort("timestamp")
+        )
+
+    def collect(self, frame):
+        pl = _polars()
+        return frame.collect() if isinstance(frame, pl.LazyFrame) else frame
+
+    def to_pandas(self, frame) -> pd.DataFrame:
+        return self.collect(frame).to_pandas()
+
+    def validate(
+        self, frame, time_col: str = "DATE_H", value_col: str = "CNT", **kwargs
+    ) -> ValidationReport:
+        pl = _polars()
+        frame = frame.lazy()
+        missing = [c for c in (time_col, value_col) if c not in frame.collect_schema()]
+        if missing:
+            return _missing_columns(missing, **kwargs)
+
+        data = frame.select(time_col, value_col).collect()
+        times = data[time_col]
+        if not times.dtype.is_temporal():
+            times = times.str.to_datetime(time_unit="ns", strict=False)
+        bad_times = times.is_null().to_numpy()
+        times = times.dt.epoch("ns").fill_null(0).to_numpy()
+
+        values = data[value_col]
+        if values.dtype.is_numeric():
+            non_numeric = np.zeros(len(values), dtype=bool)
+        else:
+            parsed = values.cast(pl.Float64, strict=False)
+            non_numeric = (parsed.is_null() & values.is_not_null()).to_numpy()
+            values = parsed
+        values = values.cast(pl.Float64).fill_null(np.nan).to_numpy()
+        return validate_arrays(times, bad_times, values, non_numeric, **kwargs)
+
+
+class ArrowBackend(FrameBackend):
+    """pyarrow tables: the csv is parsed by a multithreaded streaming scan that applies
+    the window filter batch by batch and the gap-fill runs on numpy views of the
+    columns."""
+
+    name = "arrow"
+
+    def read_csv(
+        self,
+        path,
+        time_col: str = "DATE_H",
+        start=None,
+        end=None,
+        columns: list | None = None,
+        dtype: dict | None = None,
+    ):
+        pa, pc, ds = _pyarrow()
+        types = {
+            col: pa.from_numpy_dtype(np.dtype(t)) for col, t in (dtype or {}).items()
+        }
+        types[time_col] = pa.timestamp("ns")
+        convert = pa.csv.ConvertOptions(column_types=types)
+
+        condition = None
+        for bound, op in ((start, pc.greater_equal), (end, pc.less)):
+            if bound is not None:
+                bound = pa.scalar(pd.Timestamp(bound).as_unit("ns"), pa.timestamp("ns"))
+                expr = op(pc.field(time_col), bound)
+                condition = expr if condition is None else condition & expr
+
+        csv_format = ds.CsvFileFormat(convert_options=convert)
+        try:
+            return ds.dataset(path, format=csv_format).to_table(
+                columns=columns, filter=condition
+            )
+        except pa.ArrowInvalid:
+            pass
+
+        # an unparseable timestamp fails the typed scan; read the column as text and
+        # parse it with nulls for the bad values, which `validate` then reports
+        types[time_col] = pa.string()
+        convert = pa.csv.ConvertOptions(column_types=types)
+        csv_format = ds.CsvFileFormat(convert_options=convert)
+        table = ds.dataset(path, format=csv_format).to_table(columns=columns)
+        parsed = [
+            pc.strptime(table[time_col], format=f, unit="ns", error_is_null=True)
+            for f in _TIME_FORMATS
+        ]
+        table = table.set_column(
+            table.column_names.index(time_col), time_col, pc.coalesce(*parsed)
+        )
+        if condition is None:
+            return table
+        # rows without a timestamp are kept, so they are not lost from validation
+        return table.filter(condition | pc.field(time_col).is_null())
+
+    @staticmethod
+    def _times(table, time_col: str) -> np.ndarray:
+        pa, pc, _ = _pyarrow()
+        times = table[time_col].cast(pa.timestamp("ns")).cast(pa.int64())
+        return pc.fill_null(times, 0).to_numpy()
+
+    def fill_range(self, frame, time_col: str = "DATE_H", value_col: str = "CNT"):
+        pa, _, _ = _pyarrow()
+        values = frame[value_col].to_numpy()
+        start, grid = fill_hours(self._times(frame, time_col), values, values.dtype)
+        hours = start + np.arange(len(grid), dtype=np.int64) * HOUR_NS
+        return pa.table(
+            {"timestamp": pa.array(hours, pa.timestamp("ns")), "value": grid}
+        )
+
+    def to_pandas(self, frame) -> pd.DataFrame:
+        return frame.to_pandas()
+
+    def validate(
+        self, frame, time_col: str = "DATE_H", value_col: str = "CNT", **kwargs
+    ) -> ValidationReport:
+        pa, pc, _ = _pyarrow()
+        missing = [c for c in (time_col, value_col) if c not in frame.column_names]
+        if missing:
+            return _missing_columns(missing, **kwargs)
+
+        times = frame[time_col]
+        if not pa.types.is_timestamp(times.type):
+            # strings and other types are parsed the way the pandas path does
+            return validate_kpi_data(
+                self.to_pandas(frame.select([time_col, value_col])),
+                time_col,
+                value_col,
+                **kwargs,
+            )
+        bad_times = pc.is_null(times).to_numpy(zero_copy_only=False)
+        times = self._times(frame, time_col)
+
+        values = frame[value_col]
+        if not (pa.types.is_integer(values.type) or pa.types.is_floating(values.type)):
+            return validate_kpi_data(
+                self.to_pandas(frame.select([time_col, value_col])),
+                time_col,
+                value_col,
+                **kwargs,
+            )
+        values = values.cast(pa.float64()).to_numpy()
+        non_numeric = np.zeros(len(values), dtype=bool)
+        return validate_arrays(times, bad_times, values, non_numeric, **kwargs)
+
+
+def _missing_columns(missing: list, raise_errors: bool = True, **kwargs):
+    report = ValidationReport(0)
+    report.error("missing_columns", len(missing), missing)
+    return report.raise_if_invalid() if raise_errors else report
+
+
+_BACKEND_TYPES = {
+    "pandas": FrameBackend,
+    "polars": PolarsBackend,
+    "arrow": ArrowBackend,
+}
+
+
+def get_backend(name: str | None = "pandas") -> FrameBackend:
+    """Backend of a `data.backend` config value, pandas when not set."""
+    name = name or "pandas"
+    if name not in _BACKEND_TYPES:
+        raise ValueError(
+            f"unknown dataframe backend {name}, expected one of {BACKENDS}"
+        )
+    return _BACKEND_TYPES[name]()
+
+
+def backend_of(frame) -> FrameBackend:
+    """Backend a frame belongs to, told apart by its type's module so neither
+    polars nor pyarrow has to be imported to recognise a pandas frame."""
+    module = type(frame).__module__.split(".")[0]
+    return get_backend({"polars": "polars", "pyarrow": "arrow"}.get(module, "pandas"))
+
+
+def as_pandas(frame) -> pd.DataFrame:
+    """`frame` as pandas, for code without a polars or arrow path."""
+    if isinstance(frame, pd.DataFrame):
+        return frame
+    return backend_of(frame).to_pandas(frame)
+
+
+def available_backends() -> list[str]:
+    """Backends whose library is installed."""
+    available = []
+    for name in BACKENDS:
+        try:
+            if name == "polars":
+                _polars()
+            elif name == "arrow":
+                _pyarrow()
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def main():
+    hours = pd.date_range("2025-01-01", periods=24 * 7, freq="h")
+    data = pd.DataFrame({"DATE_H": hours, "CNT": np.arange(len(hours))}).iloc[::2]
+    for name in available_backends():
+        backend = get_backend(name)
+        if name == "arrow":
+            frame = _pyarrow()[0].Table.from_pandas(data, preserve_index=False)
+        elif name == "polars":
+            frame = _polars().from_pandas(data)
+        else:
+            frame = data
+        filled = backend.to_pandas(backend.fill_range(frame))
+        print(name, len(filled), int(filled["value"].sum()))
+
+
+if __name__ == "__main__":
+    main()
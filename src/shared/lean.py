@@ -0,0 +1,96 @@
+import os
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from logger.logger import get_logger
+
+log = get_logger()
+
+HOUR_NS = 3_600_000_000_000
+DAY_NS = 24 * HOUR_NS
+
+
+def epoch_ns(times) -> np.ndarray:
+    """Timestamps as int64 epoch nanoseconds, without a copy when already datetime64[ns]."""
+    if isinstance(times, pd.Series) and pd.api.types.is_datetime64_dtype(times):
+        return times.dt.as_unit("ns").to_numpy().view(np.int64)
+    return pd.DatetimeIndex(pd.to_datetime(times)).as_unit("ns").asi8
+
+
+def fill_hours(
+    times: np.ndarray,
+    values: np.ndarray,
+    dtype: str = "float32",
+) -> tuple[int, np.ndarray]:
+    """Place hourly points on a zero-filled grid of whole days, like `fill_range`.
+
+    The grid is allocated once per call and handed out as is (it becomes the `y`
+    column of the frames built from it), so it is never reused: a later call would
+    overwrite the values of a frame still in use, e.g. a cached detection result or
+    a concurrent request's frame on the same cached model.
+
+    Args:
+        times (np.ndarray): int64 epoch ns of the points, in any order.
+        values (np.ndarray): values of the points.
+        dtype (str): dtype of the grid.
+
+    Returns:
+        tuple[int, np.ndarray]: epoch ns of the first grid hour and the grid values.
+    """
+    start = times.min() // DAY_NS * DAY_NS
+    n = int((times.max() // DAY_NS * DAY_NS + DAY_NS - start) // HOUR_NS)
+    grid = np.zeros(n, dtype=dtype)
+    # points off the hourly grid land on the hour they fall in, later points win
+    grid[(times - start) // HOUR_NS] = values
+    return int(start), grid
+
+
+class StagePeaks:
+    """Peak traced memory of every pipeline stage, measured with tracemalloc.
+
+    Tracing slows allocations down, so it only starts when `enabled` (or
+    KPI_TRACE_MEMORY=1); otherwise `stage` is a no-op.
+    """
+
+    def __init__(self, enabled: bool | None = None) -> None:
+        if enabled is None:
+            enabled = os.environ.get("KPI_TRACE_MEMORY", "0") == "1"
+        self.enabled = enabled
+        self.peaks: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peaks[name] = max(self.peaks.get(name, 0), peak - before)
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{name}: {peak / 2**20:.2f} MiB" for name, peak in self.peaks.items()
+        )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-01-01", periods=24 * 365, freq="h")
+    keep = rng.random(len(times)) > 0.01
+    start, grid = fill_hours(
+        epoch_ns(pd.Series(times[keep])), rng.random(keep.sum()).astype("float32")
+    )
+    print(pd.Timestamp(start), grid.dtype, len(grid), grid.nbytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+import pandas as pd
+
+# Metrics are off unless KPI_METRICS=1; when off, every instrumented call only pays
+# for one flag check.
+_enabled = os.environ.get("KPI_METRICS", "0") == "1"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # per label set: ([bucket counts..., +Inf count], sum)
+        self._values: dict[tuple, tuple[list, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(label_values, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, (counts, total) in values.items():
+                own, own_total = self._values.get(key, ([0] * len(counts), 0.0))
+                merged = [a + b for a, b in zip(own, counts)]
+                self._values[key] = (merged, own_total + total)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """Values recorded since the last drain, by metric name, and reset them.
+
+        Pool processes drain after every task and the parent merges what they return,
+        so work offloaded to them still shows up in the parent's /metrics.
+        """
+        drained = {name: metric.drain() for name, metric in self._metrics.items()}
+        return {name: values for name, values in drained.items() if values}
+
+    def merge(self, drained: dict) -> None:
+        for name, values in drained.items():
+            if name in self._metrics:
+                self._metrics[name].merge(values)
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "kpi_stage_seconds", "Latency of pipeline stages.", ("stage", "kpi")
+)
+STAGE_ROWS = REGISTRY.counter(
+    "kpi_stage_rows_total", "Rows returned by pipeline stages.", ("stage", "kpi")
+)
+ANOMALIES = REGISTRY.counter(
+    "kpi_anomalies_total", "Anomalies flagged by predictions.", ("kpi",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "kpi_http_request_seconds",
+    "Latency of API requests.",
+    ("method", "route", "status"),
+)
+
+
+def timed(stage: str):
+    """Record latency and returned row count of a pipeline stage.
+
+    The KPI label is taken from the `_kpi_name` attribute of the first argument, so
+    methods of KPI-bound objects are labelled automatically.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            kpi = getattr(args[0], "_kpi_name", "") if args else ""
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage, kpi)
+            if isinstance(result, pd.DataFrame):
+                STAGE_ROWS.inc(stage, kpi, amount=len(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_anomalies(kpi_name: str, flags) -> None:
+    """Count the non-zero anomaly flags of a prediction."""
+    if _enabled:
+        ANOMALIES.inc(kpi_name, amount=int((flags != 0).sum()))
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    HTTP_SECONDS.observe(seconds, method, route, str(status))
+
+
+def main():
+    enable()
+
+    @timed("demo")
+    def demo():
+        return pd.DataFrame({"a": range(10)})
+
+    demo()
+    print(REGISTRY.render())
+
+
+if __name__ == "__main__":
+    main()
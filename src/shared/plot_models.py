@@ -1,5 +1,194 @@
-import plotly.graph_objects as go
+import html
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
+
+from logger.logger import get_logger
+
+log = get_logger()
+
+# above this many points a trace is drawn with WebGL instead of SVG
+WEBGL_THRESHOLD = 5000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept; every bucket in between keeps the point
+    forming the largest triangle with the previously kept point and the mean of the
+    next bucket, which preserves peaks and dips far better than striding.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Increasing x values (e.g. epoch nanoseconds).
+    y : np.ndarray
+        Values, NaN is treated as 0 for the selection only.
+    n_out : int
+        Number of points to keep.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def downsample_indices(
+    times: np.ndarray | pd.Series,
+    values: np.ndarray | pd.Series,
+    max_points: int | None,
+    keep: np.ndarray | None = None,
+) -> np.ndarray:
+    """LTTB indices of a series plus every position flagged in `keep` (e.g. anomalies)."""
+    n = len(values)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    x = np.asarray(times)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").astype(np.int64)
+    index = lttb_indices(x, np.asarray(values, dtype=float), max_points)
+    if keep is not None and keep.any():
+        index = np.union1d(index, np.flatnonzero(keep))
+    return index
+
+
+def _trace(n_points: int):
+    return go.Scattergl if n_points > WEBGL_THRESHOLD else go.Scatter
+
+
+def forecast_figure(
+    df: pd.DataFrame,
+    timestamp_col: str | None = "ds",
+    value_col: str = "y",
+    pred_col: str = "yhat",
+    anomaly_col: str = "anomaly",
+    upper_col: str | None = "yhat_upper",
+    lower_col: str | None = "yhat_lower",
+    title: str = "Forecast vs Actual",
+    max_points: int | None = 2000,
+    band_name: str = "Confidence Interval",
+) -> go.Figure:
+    """
+    Build the forecast figure of a KPI without modifying `df`.
+
+    Series longer than `max_points` are downsampled with LTTB; every anomaly point is
+    kept regardless.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data containing actual, predicted, anomaly flags, and bounds.
+    timestamp_col : str, optional
+        Name of timestamp column, None to use the index.
+    upper_col, lower_col : str, optional
+        Bounds drawn as a grey band, None to draw no band.
+    max_points : int, optional
+        Points drawn per line, None to draw everything.
+    """
+    times = df.index if timestamp_col is None else df[timestamp_col]
+    order = None
+    if not times.is_monotonic_increasing:
+        order = np.argsort(np.asarray(times), kind="stable")
+
+    def column(values):
+        values = np.asarray(values)
+        return values if order is None else values[order]
+
+    x = column(times)
+    y = column(df[value_col])
+    flags = column(df[anomaly_col]) if anomaly_col in df.columns else None
+    # works for [0,1] or [-1,0,1]
+    anomalies = np.isin(flags, [1, -1]) if flags is not None else None
+
+    index = downsample_indices(x, y, max_points, anomalies)
+    trace = _trace(len(index))
+    fig = go.Figure()
+
+    if upper_col is not None and lower_col is not None:
+        fig.add_trace(
+            trace(
+                x=x[index],
+                y=column(df[lower_col])[index],
+                mode="lines",
+                line=dict(color="rgba(255,255,255,0)"),
+                hoverinfo="skip",
+                showlegend=False,
+            )
+        )
+        fig.add_trace(
+            trace(
+                x=x[index],
+                y=column(df[upper_col])[index],
+                mode="lines",
+                fill="tonexty",
+                fillcolor="rgba(128,128,128,0.2)",
+                line=dict(color="rgba(255,255,255,0)"),
+                hoverinfo="skip",
+                name=band_name,
+            )
+        )
+
+    fig.add_trace(
+        trace(
+            x=x[index],
+            y=y[index],
+            mode="lines",
+            name="Actual",
+            line=dict(color="blue"),
+        )
+    )
+    fig.add_trace(
+        trace(
+            x=x[index],
+            y=column(df[pred_col])[index],
+            mode="lines",
+            name="Predicted",
+            line=dict(color="green", dash="dash"),
+        )
+    )
+
+    if anomalies is not None:
+        fig.add_trace(
+            _trace(int(anomalies.sum()))(
+                x=x[anomalies],
+                y=y[anomalies],
+                mode="markers",
+                marker=dict(color="red", size=8, symbol="circle"),
+                name="Anomaly",
+            )
+        )
+
+    fig.update_layout(
+        title=title,
+        xaxis_title="Time",
+        yaxis_title="Value",
+        template="plotly_white",
+        hovermode="x unified",
+        legend=dict(x=0, y=1, bgcolor="rgba(255,255,255,0)"),
+    )
+    return fig
 
 
 def plot_forecast(
@@ -11,7 +200,9 @@ def plot_forecast(
     upper_col: str = "yhat_upper",
     lower_col: str = "yhat_lower",
     title: str = "Forecast vs Actual",
-):
+    max_points: int | None = 2000,
+    show: bool = True,
+) -> go.Figure:
     """
     Plot actual values, predicted values, anomalies, and forecast intervals interactively.
 
@@ -33,65 +224,111 @@ def plot_forecast(
         Name of lower bound column.
     title : str, optional
         Plot title.
+    max_points : int, optional
+        Points drawn per line, see `forecast_figure`.
+    show : bool, optional
+        Open the figure; set False to only build it (e.g. for export).
     """
-    df.sort_values(by=timestamp_col, inplace=True)
-    fig = go.Figure()
-
-    # Actual values
-    fig.add_trace(
-        go.Scatter(
-            x=df[timestamp_col],
-            y=df[value_col],
-            mode="lines",
-            name="Actual",
-            line=dict(color="blue"),
-        )
+    fig = forecast_figure(
+        df,
+        timestamp_col,
+        value_col,
+        pred_col,
+        anomaly_col,
+        upper_col,
+        lower_col,
+        title,
+        max_points,
     )
+    if show:
+        fig.show()
+    return fig
 
-    # Predicted values
-    fig.add_trace(
-        go.Scatter(
-            x=df[timestamp_col],
-            y=df[pred_col],
-            mode="lines",
-            name="Predicted",
-            line=dict(color="green", dash="dash"),
-        )
-    )
 
-    # Confidence interval (grey band)
-    fig.add_trace(
-        go.Scatter(
-            x=pd.concat([df[timestamp_col], df[timestamp_col][::-1]]),
-            y=pd.concat([df[upper_col], df[lower_col][::-1]]),
-            fill="toself",
-            fillcolor="rgba(128,128,128,0.2)",
-            line=dict(color="rgba(255,255,255,0)"),
-            hoverinfo="skip",
-            name="Confidence Interval",
-        )
-    )
+def save_figure(fig: go.Figure, path: Path, fmt: str = "html") -> Path:
+    """Write a figure as self-contained HTML (plotly.js embedded) or as PNG."""
+    path = Path(path).with_suffix(f".{fmt}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "html":
+        fig.write_html(path, include_plotlyjs=True, full_html=True)
+    elif fmt == "png":
+        # needs the optional kaleido package, plotly raises a clear error without it
+        fig.write_image(path, width=1400, height=500)
+    else:
+        raise ValueError(f"unsupported report format: {fmt}")
+    return path
 
-    # Anomalies (red dots)
-    anomaly_mask = df[anomaly_col].isin([1, -1])  # works for [0,1] or [-1,0,1]
-    fig.add_trace(
-        go.Scatter(
-            x=df.loc[anomaly_mask, timestamp_col],
-            y=df.loc[anomaly_mask, value_col],
-            mode="markers",
-            marker=dict(color="red", size=8, symbol="circle"),
-            name="Anomaly",
+
+def export_report(
+    forecasts: dict[str, pd.DataFrame],
+    out_dir: Path,
+    formats: tuple = ("html",),
+    **plot_kwargs,
+) -> Path:
+    """
+    Write one figure per KPI plus an index page, without opening a browser.
+
+    Parameters
+    ----------
+    forecasts : dict[str, pd.DataFrame]
+        Prediction frame of every KPI, keyed by KPI name.
+    out_dir : Path
+        Report directory.
+    formats : tuple
+        Any of "html" and "png".
+    plot_kwargs :
+        Passed to `forecast_figure`.
+    """
+    out_dir = Path(out_dir)
+    rows = []
+    for kpi_name, forecast in forecasts.items():
+        fig = forecast_figure(forecast, title=kpi_name, **plot_kwargs)
+        files = [save_figure(fig, out_dir / kpi_name, fmt) for fmt in formats]
+        n_anomalies = (
+            int(forecast["anomaly"].isin([1, -1]).sum())
+            if "anomaly" in forecast.columns
+            else 0
+        )
+        links = " ".join(
+            f'<a href="{html.escape(f.name)}">{f.suffix[1:]}</a>' for f in files
         )
+        rows.append(
+            f"<tr><td>{html.escape(kpi_name)}</td><td>{len(forecast)}</td>"
+            f"<td>{n_anomalies}</td><td>{links}</td></tr>"
+        )
+        log.info(f"report of {kpi_name} written")
+
+    index = out_dir / "index.html"
+    index.write_text(
+        "<html><head><title>KPI report</title></head><body>"
+        "<table><tr><th>KPI</th><th>points</th><th>anomalies</th><th>files</th></tr>"
+        + "".join(rows)
+        + "</table></body></html>"
     )
+    return index
 
-    # Layout
-    fig.update_layout(
-        title=title,
-        xaxis_title="Time",
-        yaxis_title="Value",
-        template="plotly_white",
-        hovermode="x unified",
-        legend=dict(x=0, y=1, bgcolor="rgba(255,255,255,0)"),
+
+def main():
+    from shared.path_manager import PathManager
+    from shared.synthetic_kpi import generate_series
+
+    data, _ = generate_series(periods=24 * 365, anomaly_rate=0.002, seed=1)
+    forecast = pd.DataFrame(
+        {
+            "ds": data["DATE_H"],
+            "y": data["CNT"],
+            "yhat": data["CNT"].rolling(24, min_periods=1).mean(),
+        }
     )
+    forecast["yhat_lower"] = forecast["yhat"] * 0.8
+    forecast["yhat_upper"] = forecast["yhat"] * 1.2
+    forecast["anomaly"] = (
+        (forecast["y"] < forecast["yhat_lower"])
+        | (forecast["y"] > forecast["yhat_upper"])
+    ).astype(int)
+
+    print(export_report({"synthetic": forecast}, PathManager().data_dir / "reports"))
+
 
-    fig.show()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logger.logger import get_logger
+from shared.file_lock import file_lock
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+# number of buckets of each seasonal key
+PERIODS = {"day": 24, "week": 24 * 7}
+
+
+def bucket_of(times, period: str = "day") -> np.ndarray:
+    """Hour of day (0-23) or hour of week (0-167, Monday 00:00 = 0) of each timestamp."""
+    times = pd.DatetimeIndex(times)
+    if period == "day":
+        return times.hour.to_numpy()
+    if period == "week":
+        return (times.dayofweek * 24 + times.hour).to_numpy()
+    raise ValueError(f"unknown period: {period}")
+
+
+class ResidualState:
+    """Rolling residual statistics of one KPI per hour of day (or hour of week).
+
+    Every bucket keeps its last `window` residuals in a ring buffer together with a
+    running mean and sum of squared deviations, updated Welford-style when a residual
+    enters and the oldest one leaves the window. Scoring a new point needs only the
+    point and this state, never the earlier history. The state is saved per KPI, so
+    it survives restarts.
+    """
+
+    def __init__(
+        self,
+        kpi_name: str,
+        window: int = 10,
+        min_periods: int = 3,
+        period: str = "day",
+        path_mgr: PathManager | None = None,
+    ) -> None:
+        """
+        :param kpi_name: KPI the state belongs to.
+        :param window: residuals kept per bucket.
+        :param min_periods: fewer residuals than this in a bucket gives no score.
+        :param period: "day" for hour-of-day buckets, "week" for hour-of-week buckets.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"unknown period: {period}")
+        self._kpi_name = kpi_name
+        self.window = window
+        self.min_periods = min_periods
+        self.period = period
+        self._path_mgr = path_mgr or PathManager()
+        self._reset()
+
+    def _reset(self) -> None:
+        buckets = PERIODS[self.period]
+        self.ring = np.zeros((buckets, self.window))
+        self.count = np.zeros(buckets, dtype=np.int64)
+        self.pos = np.zeros(buckets, dtype=np.int64)
+        self.mean = np.zeros(buckets)
+        self.m2 = np.zeros(buckets)
+        # latest timestamp (epoch ns) added to each bucket, older points are not added
+        self.last_time = np.full(buckets, np.iinfo(np.int64).min)
+
+    # ---- statistics ---- #
+    def _add(self, bucket: int, value: float) -> None:
+        n = self.count[bucket]
+        if n < self.window:
+            n += 1
+            delta = value - self.mean[bucket]
+            self.mean[bucket] += delta / n
+            self.m2[bucket] += delta * (value - self.mean[bucket])
+            self.count[bucket] = n
+        else:
+            # the oldest residual leaves the window as the new one enters
+            old = self.ring[bucket, self.pos[bucket]]
+            old_mean = self.mean[bucket]
+            self.mean[bucket] += (value - old) / n
+            self.m2[bucket] += (value - old) * (
+                value - self.mean[bucket] + old - old_mean
+            )
+
+        self.ring[bucket, self.pos[bucket]] = value
+        self.pos[bucket] = (self.pos[bucket] + 1) % self.window
+        if self.pos[bucket] == 0:
+            # recompute from the buffer once per lap so rounding errors don't build up
+            values = self.ring[bucket, : self.count[bucket]]
+            self.mean[bucket] = values.mean()
+            self.m2[bucket] = ((values - self.mean[bucket]) ** 2).sum()
+
+    def _zscore(self, bucket: int, value: float) -> tuple[float, int]:
+        n = int(self.count[bucket])
+        if n < self.min_periods:
+            return 0.0, n
+        std = np.sqrt(max(self.m2[bucket], 0.0) / (n - 1))
+        return ((value - self.mean[bucket]) / std if std > 0 else 0.0), n
+
+    # ---- scoring ---- #
+    def score(self, times, residuals, update: bool = True) -> pd.DataFrame:
+        """Z-score residuals against their bucket's state, then add them to it.
+
+        Points are processed in time order, so a batch gives the same scores as
+        sending its points one by one. Points older than the latest one already in
+        their bucket are scored but not added.
+
+        Returns:
+            pd.DataFrame: `zscore` and `history` (residuals the score is based on),
+            aligned with the input order.
+        """
+        times = pd.DatetimeIndex(times)
+        residuals = np.asarray(residuals, dtype=float)
+        buckets = bucket_of(times, self.period)
+        stamps = times.as_unit("ns").asi8
+
+        zscores = np.zeros(len(residuals))
+        history = np.zeros(len(residuals), dtype=np.int64)
+        for i in np.argsort(stamps, kind="stable"):
+            bucket, value = buckets[i], residuals[i]
+            if np.isnan(value):
+                history[i] = self.count[bucket]
+                continue
+            zscores[i], history[i] = self._zscore(bucket, value)
+            if update:
+                if stamps[i] > self.last_time[bucket]:
+                    self._add(bucket, value)
+                    self.last_time[bucket] = stamps[i]
+                else:
+                    log.warning(
+                        f"{times[i]} is not newer than {self._kpi_name}'s state"
+                    )
+
+        return pd.DataFrame({"zscore": zscores, "history": history})
+
+    def anomalies(self, times, residuals, threshold: float = 2.5) -> pd.DataFrame:
+        """`score` plus an `anomaly` flag, same rule as `same_hour_anomalies`."""
+        scores = self.score(times, residuals)
+        scores["anomaly"] = (
+            (scores["zscore"].abs() > threshold)
+            & (scores["history"] >= self.min_periods)
+        ).astype(int)
+        return scores
+
+    def seed(self, times, residuals) -> "ResidualState":
+        """Reset the state from a residual history (only its tail is kept)."""
+        self._reset()
+        self.score(times, residuals)
+        return self
+
+    # ---- persistence ---- #
+    @property
+    def path(self) -> Path:
+        return (
+            self._path_mgr.kpi_path(self._kpi_name)
+            / "state"
+            / f"residual_{self.period}.npz"
+        )
+
+    @classmethod
+    def lock(
+        cls,
+        kpi_name: str,
+        period: str = "day",
+        path_mgr: PathManager | None = None,
+    ):
+        """Inter-process lock of a KPI's state, held around load -> update -> save."""
+        path = cls(kpi_name, period=period, path_mgr=path_mgr).path
+        return file_lock(path.with_name(f".{path.name}.lock"))
+
+    def save(self) -> Path:
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as file:
+            np.savez(
+                file,
+                window=self.window,
+                min_periods=self.min_periods,
+                ring=self.ring,
+                count=self.count,
+                pos=self.pos,
+                mean=self.mean,
+                m2=self.m2,
+                last_time=self.last_time,
+            )
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(
+        cls,
+        kpi_name: str,
+        period: str = "day",
+        path_mgr: PathManager | None = None,
+    ) -> "ResidualState":
+        state = cls(kpi_name, period=period, path_mgr=path_mgr)
+        with np.load(state.path) as saved:
+            state.window = int(saved["window"])
+            state.min_periods = int(saved["min_periods"])
+            for name in ("ring", "count", "pos", "mean", "m2", "last_time"):
+                setattr(state, name, saved[name].copy())
+        return state
+
+
+def main():
+    from shared.anomaly_rules import same_hour_zscore
+
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-01-01", periods=24 * 60, freq="h")
+    residuals = rng.normal(size=len(times))
+
+    state = ResidualState("kpi_a")
+    streamed = pd.concat(
+        [state.score(times[i : i + 1], residuals[i : i + 1]) for i in range(len(times))]
+    )
+    batch, _ = same_hour_zscore(pd.DataFrame({"ds": times, "residual": residuals}))
+    print(np.abs(streamed["zscore"].to_numpy() - batch.to_numpy()).max())
+
+
+if __name__ == "__main__":
+    main()
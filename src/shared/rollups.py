@@ -0,0 +1,40 @@
+import pandas as pd
+
+AGGREGATES = ["sum", "mean", "min", "max", "count"]
+
+
+def rollup(
+    data: pd.DataFrame,
+    freq: str = "D",
+    time_col: str = "DATE_H",
+    value_col: str = "CNT",
+) -> pd.DataFrame:
+    """Aggregate hourly points into days ("D") or weeks starting Monday ("W").
+
+    Returns:
+        pd.DataFrame: sum/mean/min/max/count per period, indexed by period start.
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(data[time_col]))
+    periods = times.normalize()
+    if freq == "W":
+        periods = periods - pd.to_timedelta(times.dayofweek, unit="D")
+    elif freq != "D":
+        raise ValueError(f"unsupported rollup frequency: {freq}")
+
+    values = pd.Series(data[value_col].to_numpy(dtype=float), index=periods)
+    result = values.groupby(level=0, sort=True).agg(["sum", "min", "max", "count"])
+    result["mean"] = result["sum"] / result["count"]
+    result.index.name = "period"
+    return result[AGGREGATES]
+
+
+def main():
+    from shared.synthetic_kpi import generate_series
+
+    data, _ = generate_series(periods=24 * 60, seed=0)
+    print(rollup(data, "D").head())
+    print(rollup(data, "W").head())
+
+
+if __name__ == "__main__":
+    main()
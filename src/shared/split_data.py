@@ -1,14 +1,195 @@
+import numpy as np
 import pandas as pd
-from shared.to_date import to_date, to_char
 from datetime import datetime
+from typing import Iterator
+
+
+def _sorted_times(df: pd.DataFrame, split_col: str) -> tuple[pd.DataFrame, np.ndarray]:
+    """Return the frame sorted on `split_col` and its timestamps as int64 nanoseconds.
+
+    Already sorted frames (the common case for hourly KPI data) are returned as-is,
+    so no copy is made. Unsorted frames are sorted once.
+    """
+    if split_col in df.columns:
+        times = df[split_col]
+    elif df.index.name == split_col or split_col is None:
+        times = df.index.to_series()
+    else:
+        raise KeyError(f"column {split_col} not found in the data")
+
+    if not times.is_monotonic_increasing:
+        order = np.argsort(times.to_numpy(), kind="stable")
+        df = df.take(order)
+        times = times.take(order)
+
+    return df, pd.DatetimeIndex(times).as_unit("ns").asi8
+
+
+def _position(times: np.ndarray, date) -> int:
+    """Index of the first row whose timestamp is >= `date`."""
+    return int(np.searchsorted(times, pd.Timestamp(date).value, side="left"))
 
 
 def split_data(
     df: pd.DataFrame, split_date: datetime, split_col: str = "timestamp"
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
-    # print(df[split_col].head())
-    df_mask = df[split_col] < split_date
-    # print(f"mask is: {df_mask.head()}", f"mask not is: {~df_mask.head()}", sep="\n")
-    train_data = df[df_mask]
-    test_data = df[~df_mask]
-    return train_data.copy(deep=True), test_data.copy(deep=True)
+    """Split data into rows before and from `split_date`.
+
+    The split point is found with a binary search over the sorted timestamps and both
+    parts are positional slices of the input, so no row mask or deep copy is built.
+    Callers that want to modify a part in place should copy it first.
+
+    Args:
+        df (pd.DataFrame): data to split.
+        split_date (datetime): first timestamp of the second part.
+        split_col (str): timestamp column (or index name) to split on.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (rows < split_date, rows >= split_date)
+    """
+    df, times = _sorted_times(df, split_col)
+    pos = _position(times, split_date)
+    return df.iloc[:pos], df.iloc[pos:]
+
+
+def slice_window(
+    df: pd.DataFrame, start=None, end=None, split_col: str = "timestamp"
+) -> pd.DataFrame:
+    """Return the rows with start <= timestamp < end as a positional slice."""
+    df, times = _sorted_times(df, split_col)
+    lo = 0 if start is None else _position(times, start)
+    hi = len(times) if end is None else _position(times, end)
+    return df.iloc[lo:hi]
+
+
+def _window_bounds(
+    times: np.ndarray,
+    train_size: pd.Timedelta,
+    test_size: pd.Timedelta,
+    step: pd.Timedelta,
+    expanding: bool,
+) -> Iterator[tuple[int, int, int]]:
+    if len(times) == 0:
+        return
+
+    train_ns = pd.Timedelta(train_size).value
+    test_ns = pd.Timedelta(test_size).value
+    step_ns = pd.Timedelta(step).value if step is not None else test_ns
+    if step_ns <= 0:
+        raise ValueError("step must be a positive duration")
+
+    first = times[0]
+    cutoff = first + train_ns
+    while cutoff < times[-1]:
+        train_start = first if expanding else cutoff - train_ns
+        lo = int(np.searchsorted(times, train_start, side="left"))
+        mid = int(np.searchsorted(times, cutoff, side="left"))
+        hi = int(np.searchsorted(times, cutoff + test_ns, side="left"))
+        if mid > lo and hi > mid:
+            yield lo, mid, hi
+        cutoff += step_ns
+
+
+def rolling_windows(
+    df: pd.DataFrame,
+    train_size: pd.Timedelta,
+    test_size: pd.Timedelta,
+    step: pd.Timedelta | None = None,
+    split_col: str = "timestamp",
+) -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+    """Yield (train, test) slices of a fixed-length train window rolled over the data.
+
+    Args:
+        df (pd.DataFrame): data to cut.
+        train_size (pd.Timedelta): length of every train window.
+        test_size (pd.Timedelta): length of every test window.
+        step (pd.Timedelta, optional): distance between cutoffs, defaults to `test_size`.
+        split_col (str): timestamp column (or index name).
+    """
+    df, times = _sorted_times(df, split_col)
+    for lo, mid, hi in _window_bounds(times, train_size, test_size, step, False):
+        yield df.iloc[lo:mid], df.iloc[mid:hi]
+
+
+def expanding_windows(
+    df: pd.DataFrame,
+    initial_size: pd.Timedelta,
+    test_size: pd.Timedelta,
+    step: pd.Timedelta | None = None,
+    split_col: str = "timestamp",
+) -> Iterator[tuple[pd.DataFrame, pd.DataFrame]]:
+    """Yield (train, test) slices where the train window always starts at the first row.
+
+    Args:
+        df (pd.DataFrame): data to cut.
+        initial_size (pd.Timedelta): length of the first train window.
+        test_size (pd.Timedelta): length of every test window.
+        step (pd.Timedelta, optional): distance between cutoffs, defaults to `test_size`.
+        split_col (str): timestamp column (or index name).
+    """
+    df, times = _sorted_times(df, split_col)
+    for lo, mid, hi in _window_bounds(times, initial_size, test_size, step, True):
+        yield df.iloc[lo:mid], df.iloc[mid:hi]
+
+
+def _shared_bytes(part: pd.DataFrame, source: pd.DataFrame) -> int:
+    shared = 0
+    for col in part.columns:
+        values = part[col].to_numpy()
+        if np.shares_memory(values, source[col].to_numpy()):
+            shared += values.nbytes
+    return shared
+
+
+def split_memory_report(
+    df: pd.DataFrame, split_date: datetime, split_col: str = "timestamp"
+) -> dict:
+    """Compare the memory held by a mask + deep copy split against `split_data`.
+
+    Returns:
+        dict: bytes of the source frame, bytes a deep-copy split allocates, bytes
+        `split_data` allocates and the resulting saving.
+    """
+    source_bytes = int(df.memory_usage(index=True, deep=True).sum())
+
+    mask = df[split_col] < split_date
+    copied = (df[mask].copy(deep=True), df[~mask].copy(deep=True))
+    copy_bytes = int(
+        sum(part.memory_usage(index=True, deep=True).sum() for part in copied)
+        + mask.memory_usage(index=True, deep=True)
+    )
+    del copied, mask
+
+    parts = split_data(df, split_date, split_col)
+    view_bytes = int(
+        sum(
+            part.memory_usage(index=True, deep=True).sum() - _shared_bytes(part, df)
+            for part in parts
+        )
+    )
+
+    return {
+        "rows": len(df),
+        "source_bytes": source_bytes,
+        "deep_copy_bytes": copy_bytes,
+        "slice_bytes": view_bytes,
+        "saved_bytes": copy_bytes - view_bytes,
+    }
+
+
+def main():
+    hours = pd.date_range("2020-01-01", "2024-12-31 23:00", freq="h")
+    data = pd.DataFrame(
+        {"DATE_H": hours, "CNT": np.random.default_rng(0).poisson(100, len(hours))}
+    )
+    print(split_memory_report(data, datetime(2024, 6, 1), "DATE_H"))
+
+    for train, test in rolling_windows(
+        data, pd.Timedelta(days=365), pd.Timedelta(days=30), split_col="DATE_H"
+    ):
+        print(train["DATE_H"].iloc[0], test["DATE_H"].iloc[0], len(train), len(test))
+        break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import holidays
+import numpy as np
+import pandas as pd
+import yaml
+
+from logger.logger import get_logger
+from shared.path_manager import PathManager
+
+log = get_logger()
+
+ANOMALY_KINDS = ("spike", "dip", "level_shift")
+
+
+def iran_holidays(start, end) -> pd.DatetimeIndex:
+    """Iranian public holidays between `start` and `end` as midnight timestamps."""
+    years = range(pd.Timestamp(start).year, pd.Timestamp(end).year + 1)
+    days = holidays.country_holidays("IR", years=years)
+    return pd.DatetimeIndex(sorted(days)).normalize()
+
+
+def _inject_anomalies(
+    values: np.ndarray,
+    hours: pd.DatetimeIndex,
+    rate: float,
+    scale: float,
+    max_length: int,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """Inject anomalies into `values` in place and return their labelled windows."""
+    n_anomalies = rng.binomial(len(values), rate) if rate > 0 else 0
+    starts = np.sort(rng.choice(len(values), size=n_anomalies, replace=False))
+    lengths = rng.integers(1, max_length + 1, size=n_anomalies)
+    kinds = rng.choice(ANOMALY_KINDS, size=n_anomalies)
+
+    windows = []
+    last_end = -1
+    for start, length, kind in zip(starts, lengths, kinds):
+        # keep windows apart so every label is a separate event
+        if start <= last_end:
+            continue
+        end = min(start + length, len(values)) - 1
+        window = slice(start, end + 1)
+        level = max(values[window].mean(), 1.0)
+        if kind == "spike":
+            values[window] += scale * level
+        elif kind == "dip":
+            values[window] *= max(0.0, 1 - scale / 2)
+        else:
+            values[window] += scale / 2 * level * rng.choice((-1, 1))
+        windows.append({"start": hours[start], "end": hours[end], "kind": kind})
+        last_end = end
+
+    return pd.DataFrame(windows, columns=["start", "end", "kind"])
+
+
+def generate_series(
+    start: str = "2023-03-21",
+    periods: int = 24 * 365,
+    base_level: float = 500.0,
+    trend_per_year: float = 0.1,
+    daily_amplitude: float = 0.4,
+    weekly_amplitude: float = 0.15,
+    yearly_amplitude: float = 0.1,
+    holiday_effect: float = -0.3,
+    noise: float = 0.05,
+    gap_rate: float = 0.0,
+    outage_rate: float = 0.0,
+    anomaly_rate: float = 0.0,
+    anomaly_scale: float = 1.5,
+    anomaly_max_length: int = 6,
+    seed: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Generate one hourly KPI series in the DATE_H/CNT layout.
+
+    Seasonal amplitudes and effects are relative to the (trending) base level. The
+    weekly cycle dips on Friday, the Iranian weekend, and Iranian public holidays
+    scale the whole day by `holiday_effect`.
+
+    Args:
+        start (str): first hour of the series.
+        periods (int): number of hours.
+        base_level (float): mean count at the start of the series.
+        trend_per_year (float): relative level change per year.
+        daily_amplitude (float): relative size of the hour-of-day cycle.
+        weekly_amplitude (float): relative size of the Friday dip.
+        yearly_amplitude (float): relative size of the yearly cycle.
+        holiday_effect (float): relative level change on public holidays.
+        noise (float): relative standard deviation of the noise.
+        gap_rate (float): share of single hours dropped from the output.
+        outage_rate (float): chance per day of a missing block of hours.
+        anomaly_rate (float): chance per hour that an anomaly starts.
+        anomaly_scale (float): anomaly size relative to the local level.
+        anomaly_max_length (int): longest anomaly in hours.
+        seed (int, optional): random seed.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: the series (`DATE_H`, `CNT`) and the
+        labelled anomaly windows (`start`, `end`, `kind`).
+    """
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(start, periods=periods, freq="h")
+    years = (hours - hours[0]).total_seconds().to_numpy() / (365.25 * 86400)
+    hour = hours.hour.to_numpy()
+    day_of_year = hours.dayofyear.to_numpy()
+
+    level = base_level * (1 + trend_per_year * years)
+    shape = (
+        1
+        + daily_amplitude * np.sin(2 * np.pi * (hour - 8) / 24)
+        - weekly_amplitude * (hours.dayofweek.to_numpy() == 4)
+        + yearly_amplitude * np.sin(2 * np.pi * day_of_year / 365.25)
+    )
+    is_holiday = hours.normalize().isin(iran_holidays(hours[0], hours[-1]))
+    shape = shape * np.where(is_holiday, 1 + holiday_effect, 1.0)
+
+    values = np.clip(level * shape, 0, None)
+    values = values * (1 + noise * rng.standard_normal(periods))
+
+    labels = _inject_anomalies(
+        values, hours, anomaly_rate, anomaly_scale, anomaly_max_length, rng
+    )
+
+    keep = np.ones(periods, dtype=bool)
+    if gap_rate > 0:
+        keep &= rng.random(periods) >= gap_rate
+    if outage_rate > 0:
+        n_days = periods // 24
+        for day in np.flatnonzero(rng.random(n_days) < outage_rate):
+            first = day * 24 + rng.integers(0, 24)
+            keep[first : first + rng.integers(1, 12)] = False
+
+    data = pd.DataFrame(
+        {
+            "DATE_H": hours[keep],
+            "CNT": np.rint(np.clip(values[keep], 0, None)).astype(np.int64),
+        }
+    )
+    return data, labels
+
+
+def write_kpi(
+    kpi_name: str,
+    data: pd.DataFrame,
+    labels: pd.DataFrame | None = None,
+    model: str = "prophet",
+    path_mgr: PathManager | None = None,
+) -> None:
+    """Write a KPI's data (and labels) to the data dir with a ready `config.yaml`."""
+    path_mgr = path_mgr or PathManager()
+    path_mgr.data_dir.mkdir(parents=True, exist_ok=True)
+    data.to_csv(path_mgr.data_file(f"{kpi_name}.csv"), index=False)
+
+    config = {
+        "model": {"model": model},
+        "data": {
+            "data_type": "csv",
+            "data_source": f"{kpi_name}.csv",
+            # checked here, so windowed reads may stop early
+            "sorted": bool(data["DATE_H"].is_monotonic_increasing),
+        },
+    }
+    if labels is not None:
+        labels.to_csv(path_mgr.data_file(f"{kpi_name}_labels.csv"), index=False)
+        config["data"]["labels"] = f"{kpi_name}_labels.csv"
+
+    config_path = path_mgr.kpi_config(kpi_name)
+    config_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(config_path, "w") as file:
+        yaml.safe_dump(config, file, sort_keys=False)
+
+
+def _random_spec(rng: np.random.Generator) -> dict:
+    """Per-KPI parameters, varied so a workload is not many copies of one series."""
+    return {
+        "base_level": float(rng.lognormal(6, 1)),
+        "trend_per_year": float(rng.normal(0.05, 0.1)),
+        "daily_amplitude": float(rng.uniform(0.1, 0.6)),
+        "weekly_amplitude": float(rng.uniform(0.0, 0.3)),
+        "yearly_amplitude": float(rng.uniform(0.0, 0.2)),
+        "holiday_effect": float(rng.uniform(-0.5, 0.2)),
+        "noise": float(rng.uniform(0.02, 0.15)),
+    }
+
+
+def _generate_one(task: dict) -> str:
+    rng = np.random.default_rng(task["seed"])
+    data, labels = generate_series(
+        start=task["start"],
+        periods=task["periods"],
+        gap_rate=task["gap_rate"],
+        outage_rate=task["outage_rate"],
+        anomaly_rate=task["anomaly_rate"],
+        seed=task["seed"],
+        **_random_spec(rng),
+    )
+    write_kpi(task["kpi_name"], data, labels, task["model"], PathManager(task["env"]))
+    return task["kpi_name"]
+
+
+def generate_workload(
+    n_kpis: int = 1,
+    prefix: str = "synthetic",
+    start: str = "2023-03-21",
+    days: int = 365,
+    gap_rate: float = 0.001,
+    outage_rate: float = 0.01,
+    anomaly_rate: float = 0.002,
+    model: str = "prophet",
+    seed: int = 0,
+    env: str = "dev",
+    max_workers: int | None = None,
+) -> list[str]:
+    """Generate and write `n_kpis` synthetic KPIs named `<prefix>_<i>`.
+
+    Each KPI gets its own random seasonality, trend and noise, its injected anomaly
+    labels and a `config.yaml`. Large workloads are written on a process pool.
+
+    Returns:
+        list[str]: names of the written KPIs.
+    """
+    width = len(str(n_kpis - 1))
+    tasks = [
+        {
+            "kpi_name": f"{prefix}_{i:0{width}d}",
+            "seed": seed + i,
+            "start": start,
+            "periods": days * 24,
+            "gap_rate": gap_rate,
+            "outage_rate": outage_rate,
+            "anomaly_rate": anomaly_rate,
+            "model": model,
+            "env": env,
+        }
+        for i in range(n_kpis)
+    ]
+
+    if n_kpis == 1 or max_workers == 1:
+        names = [_generate_one(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            names = list(pool.map(_generate_one, tasks, chunksize=16))
+
+    log.info(f"{len(names)} synthetic kpis written to {PathManager(env).data_dir}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="write synthetic hourly KPIs")
+    parser.add_argument("--kpis", type=int, default=1)
+    parser.add_argument("--prefix", default="synthetic")
+    parser.add_argument("--start", default="2023-03-21")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--anomaly-rate", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env", default="dev", choices=["dev", "prod", "test"])
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    generate_workload(
+        n_kpis=args.kpis,
+        prefix=args.prefix,
+        start=args.start,
+        days=args.days,
+        anomaly_rate=args.anomaly_rate,
+        seed=args.seed,
+        env=args.env,
+        max_workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
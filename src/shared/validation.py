@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+
+from services.exceptions import InvalidKPIDataError
+
+# how many offending rows or timestamps a report quotes per check
+MAX_EXAMPLES = 5
+
+
+class ValidationReport:
+    """Outcome of `validate_kpi_data`: failed checks as errors or warnings.
+
+    Every check is a dict with its name, the number of offending rows and a few
+    examples. Errors make the data unusable; warnings describe what the
+    pre-processing will repair (sorting, zero-filling gaps).
+    """
+
+    def __init__(self, rows: int) -> None:
+        self.rows = rows
+        self.errors: list[dict] = []
+        self.warnings: list[dict] = []
+
+    def _add(self, checks: list, check: str, count: int, examples) -> None:
+        if count:
+            examples = [str(e) for e in list(examples)[:MAX_EXAMPLES]]
+            checks.append({"check": check, "count": int(count), "examples": examples})
+
+    def error(self, check: str, count: int, examples=()) -> None:
+        self._add(self.errors, check, count, examples)
+
+    def warn(self, check: str, count: int, examples=()) -> None:
+        self._add(self.warnings, check, count, examples)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "errors": self.errors, "warnings": self.warnings}
+
+    def raise_if_invalid(self) -> "ValidationReport":
+        if self.errors:
+            summary = ", ".join(f"{e['count']} {e['check']}" for e in self.errors)
+            raise InvalidKPIDataError(f"invalid KPI data: {summary}", self.to_dict())
+        return self
+
+
+def _parse_times(times: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Timestamps as int64 epoch ns and the mask of the unparseable ones."""
+    if not pd.api.types.is_datetime64_dtype(times):
+        times = pd.to_datetime(times, errors="coerce")
+    bad = times.isna().to_numpy()
+    return times.dt.as_unit("ns").to_numpy().view(np.int64), bad
+
+
+def _parse_values(values: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Values as float64 and the mask of present but non-numeric ones."""
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan), np.zeros(
+            len(values), dtype=bool
+        )
+    numeric = pd.to_numeric(values, errors="coerce")
+    non_numeric = numeric.isna().to_numpy() & values.notna().to_numpy()
+    return numeric.to_numpy(dtype=np.float64, na_value=np.nan), non_numeric
+
+
+def validate_kpi_data(
+    data: pd.DataFrame,
+    time_col: str = "DATE_H",
+    value_col: str = "CNT",
+    freq: str = "h",
+    allow_negative: bool = False,
+    raise_errors: bool = True,
+    segment_col: str | None = None,
+) -> ValidationReport:
+    """Check raw KPI data before any model work.
+
+    The columns are converted to int64 timestamps and float64 values once; every
+    check is then a vectorized pass over those arrays. Errors: missing columns, no
+    rows, unparseable timestamps, non-numeric, missing, infinite or negative values,
+    duplicate timestamps and timestamps off the `freq` grid. Warnings: unsorted rows
+    and gaps.
+
+    Args:
+        data (pd.DataFrame): raw KPI data.
+        allow_negative (bool): accept negative values (KPIs that are not counts).
+        raise_errors (bool): raise instead of returning a report with errors.
+        segment_col (str, optional): segment column of a segmented KPI; every
+            segment is a series of its own, so duplicates, order and gaps are
+            checked per segment.
+
+    Raises:
+        InvalidKPIDataError: with the report as `report`, if a check failed.
+    """
+    columns = (time_col, value_col) + ((segment_col,) if segment_col else ())
+    missing = [col for col in columns if col not in data.columns]
+    if missing:
+        report = ValidationReport(len(data))
+        report.error("missing_columns", len(missing), missing)
+        return report.raise_if_invalid() if raise_errors else report
+
+    times, bad_times = _parse_times(data[time_col])
+    values, non_numeric = _parse_values(data[value_col])
+    segments = pd.factorize(data[segment_col])[0] if segment_col else None
+    return validate_arrays(
+        times,
+        bad_times,
+        values,
+        non_numeric,
+        freq,
+        allow_negative,
+        raise_errors,
+        segments,
+    )
+
+
+def validate_arrays(
+    times: np.ndarray,
+    bad_times: np.ndarray,
+    values: np.ndarray,
+    non_numeric: np.ndarray,
+    freq: str = "h",
+    allow_negative: bool = False,
+    raise_errors: bool = True,
+    segments: np.ndarray | None = None,
+) -> ValidationReport:
+    """The checks of `validate_kpi_data` on already converted columns.
+
+    Lets dataframe backends other than pandas validate without building a pandas
+    frame first.
+
+    Args:
+        times (np.ndarray): int64 epoch ns, any value where `bad_times` is set.
+        bad_times (np.ndarray): mask of the unparseable timestamps.
+        values (np.ndarray): float64 values, NaN where missing or non-numeric.
+        non_numeric (np.ndarray): mask of the present but non-numeric values.
+        segments (np.ndarray, optional): integer segment code per row; the
+            timestamp checks then run per segment.
+    """
+    report = ValidationReport(len(times))
+    if not len(times):
+        report.error("empty", 1)
+        return report.raise_if_invalid() if raise_errors else report
+
+    rows = np.arange(len(times))
+
+    # ---- values ---- #
+    nan = np.isnan(values) & ~non_numeric
+    report.error("non_numeric_value", non_numeric.sum(), rows[non_numeric])
+    report.error("missing_value", nan.sum(), rows[nan])
+    infinite = np.isinf(values)
+    report.error("infinite_value", infinite.sum(), rows[infinite])
+    if not allow_negative:
+        negative = values < 0
+        report.error("negative_value", negative.sum(), rows[negative])
+
+    # ---- timestamps ---- #
+    report.error("bad_timestamp", bad_times.sum(), rows[bad_times])
+    valid = times[~bad_times]
+    if len(valid):
+        step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).value
+        off_grid = valid % step != 0
+        report.error(
+            "off_grid_timestamp",
+            off_grid.sum(),
+            pd.DatetimeIndex(valid[off_grid][:MAX_EXAMPLES]),
+        )
+
+        at = rows[~bad_times]
+        same = np.ones(len(valid) - 1, dtype=bool)
+        if segments is not None:
+            # rows of each segment together, in their original order
+            group = segments[~bad_times]
+            order = np.argsort(group, kind="stable")
+            valid, group, at = valid[order], group[order], at[order]
+            same = group[1:] == group[:-1]
+
+        diffs = np.diff(valid)
+        unsorted = same & (diffs < 0)
+        report.warn("unsorted", unsorted.sum(), at[1:][unsorted])
+        if unsorted.any():
+            if segments is None:
+                valid = np.sort(valid)
+            else:
+                order = np.lexsort((valid, group))
+                valid = valid[order]
+            diffs = np.diff(valid)
+
+        duplicate = same & (diffs == 0)
+        report.error(
+            "duplicate_timestamp",
+            duplicate.sum(),
+            pd.DatetimeIndex(np.unique(valid[1:][duplicate])[:MAX_EXAMPLES]),
+        )
+        gap = same & (diffs > step)
+        report.warn(
+            "gap",
+            (diffs[gap] // step - 1).sum(),
+            pd.DatetimeIndex(valid[:-1][gap][:MAX_EXAMPLES] + step),
+        )
+
+    return report.raise_if_invalid() if raise_errors else report
+
+
+def main():
+    data = pd.DataFrame(
+        {
+            "DATE_H": ["2025-01-01 00:00", "2025-01-01 01:00", "2025-01-01 01:00", "x"],
+            "CNT": [1, -2, "a", 4],
+        }
+    )
+    print(validate_kpi_data(data, raise_errors=False).to_dict())
+
+
+if __name__ == "__main__":
+    main()